@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""
+    Compares pricing analytics over Place run on the columnar view
+    (persistance.columns, needs numpy) with the loops over the objects
+    callers did before.
+
+    Usage (from the root of the repository):
+        python3 -m benchmarks.bench_analytics [number of places]
+"""
+import random
+import sys
+from benchmarks.bench_queries import best_time
+from model.place import Place
+from persistance.columns import Columns
+from persistance.file_storage import FileStorage
+
+filename = 'bench_storage.json'
+
+
+def mean_price_by_city(storage):
+    sums = {}
+    for place in storage.all('Place').values():
+        if place.max_guests >= 4:
+            total, count = sums.get(place.city, (0, 0))
+            sums[place.city] = (total + place.price_per_night, count + 1)
+    return {city: total / count for city, (total, count) in sums.items()}
+
+
+def price_stats(storage):
+    prices = [place.price_per_night for place in storage.all('Place').values()
+              if place.number_rooms >= 2 and -35 <= place.latitude <= -34]
+    return len(prices), sum(prices) / len(prices), min(prices), max(prices)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rand = random.Random(0)
+    storage = FileStorage(filename)
+    storage.add_many(
+        Place(f'Place {i}', f'Street {i}', f'host_{rand.randrange(5000)}',
+              rand.randrange(20, 1000), rand.randrange(1, 6),
+              rand.randrange(1, 4), f'city_{rand.randrange(200)}',
+              f'country_{rand.randrange(20)}', rand.randrange(1, 11),
+              latitude=rand.uniform(-36, -33),
+              longitude=rand.uniform(-58, -55))
+        for i in range(count))
+    columns = Columns(storage, 'Place')
+
+    built, found = best_time(lambda: len(columns), runs=1)
+    print(f'{count} places, view built in {built * 1e3:.1f} ms')
+    print(f'{"analytics":<32}{"loop (ms)":>12}{"columns (ms)":>14}')
+
+    looped, expected = best_time(lambda: mean_price_by_city(storage))
+    vectorized, found = best_time(lambda: columns.group_by(
+        'city', 'price_per_night', 'mean', where={'max_guests': {'>=': 4}}))
+    assert all(abs(found[city] - mean) < 1e-6
+               for city, mean in expected.items())
+    print(f'{"mean price by city":<32}{looped * 1e3:>12.1f}'
+          f'{vectorized * 1e3:>14.1f}')
+
+    looped, expected = best_time(lambda: price_stats(storage))
+    vectorized, found = best_time(lambda: columns.stats(
+        'price_per_night', where={'number_rooms': {'>=': 2},
+                                  'latitude': {'>=': -35, '<=': -34}}))
+    assert found['count'] == expected[0]
+    print(f'{"price stats in an area":<32}{looped * 1e3:>12.1f}'
+          f'{vectorized * 1e3:>14.1f}')
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""
+    Measures the memory taken by User, Place and Review objects: the bytes
+    allocated per object (tracemalloc, values included), the size of the
+    object itself (its slots, or its instance dict when it has one) and
+    the time taken to build them.
+
+    Given another checkout of the repository, its models are measured too,
+    as a baseline. Ex: the models before they stored their attributes in
+    __slots__ (commit 2959e35):
+        git worktree add /tmp/before 2959e35~1
+
+    Usage (from the root of the repository):
+        python3 -m benchmarks.bench_memory [number of objects] [checkout]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from model.place import Place
+from model.review import Review
+from model.user import User
+
+builders = {
+    'User': lambda i: User(f'user{i}@mail.com', 'Passw0rd!', 'Jane', 'Doe'),
+    'Place': lambda i: Place(f'Place {i}', f'Street {i}', f'host_{i}', 100,
+                             2, 1, 'city_id', 'country_id', 4),
+    'Review': lambda i: Review(f'user_{i}', f'place_{i}', i % 11,
+                               f'Review {i}'),
+}
+
+
+def allocated(build, count):
+    """ Bytes allocated per object while building `count` objects """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Without the list holding them
+    return (after - before - sys.getsizeof(objects)) / count, objects[0]
+
+
+def own_size(obj):
+    """ Bytes of the object itself, without the values it holds """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def build_time(build, count):
+    """ Seconds taken to build `count` objects (without tracemalloc) """
+    start = time.perf_counter()
+    for i in range(count):
+        build(i)
+    return time.perf_counter() - start
+
+
+def measure(count):
+    """ {class name: (allocated B/obj, object B, build time s)} """
+    results = {}
+    for classname, build in builders.items():
+        per_object, obj = allocated(build, count)
+        results[classname] = (per_object, own_size(obj),
+                              build_time(build, count))
+    return results
+
+
+def measure_checkout(checkout, count):
+    """
+        The measures of the models of another checkout: this script runs
+        again with that checkout's packages first in the path
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(checkout))
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), str(count), '--json'],
+        env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    if sys.argv[2:] == ['--json']:
+        print(json.dumps(measure(count)))
+        sys.exit()
+
+    results = measure(count)
+    baseline = measure_checkout(sys.argv[2], count) \
+        if len(sys.argv) > 2 else None
+    print(f'{count} objects of each class')
+    print(f'{"class":<10}{"allocated (B/obj)":>20}{"object (B)":>16}'
+          f'{"build (s)":>16}')
+    for classname, measures in results.items():
+        if baseline is None:
+            columns = (f'{measures[0]:.0f}', measures[1], f'{measures[2]:.2f}')
+        else:
+            before = baseline[classname]
+            columns = (f'{before[0]:.0f} -> {measures[0]:.0f}',
+                       f'{before[1]} -> {measures[1]}',
+                       f'{before[2]:.2f} -> {measures[2]:.2f}')
+        print(f'{classname:<10}{columns[0]:>20}{columns[1]:>16}'
+              f'{columns[2]:>16}')
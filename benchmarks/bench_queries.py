@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""
+    Compares listing searches on Place run through the storage's
+    indexes (storage.query) with the scan callers did before (filtering
+    all() in Python).
+
+    Usage (from the root of the repository):
+        python3 -m benchmarks.bench_queries [number of places]
+"""
+import random
+import sys
+import time
+from model import classes
+from model.place import Place
+from persistance.file_storage import FileStorage
+from persistance.query import Query
+
+filename = 'bench_storage.json'
+
+searches = {
+    'price 50-120, guests >= 4, rooms >= 2': {
+        'price_per_night': {'>=': 50, '<=': 120},
+        'max_guests': {'>=': 4}, 'number_rooms': {'>=': 2}},
+    'price 100-105': {'price_per_night': {'>=': 100, '<=': 105}},
+    'guests >= 9': {'max_guests': {'>=': 9}},
+    'rooms == 5, bathrooms >= 3': {
+        'number_rooms': 5, 'number_bathrooms': {'>=': 3}},
+}
+
+
+def best_time(function, runs=5):
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def scan(storage, where):
+    query = Query(classes['Place'], where)
+    return query.select(storage.all('Place').values())
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rand = random.Random(0)
+    storage = FileStorage(filename)
+    storage.add_many(
+        Place(f'Place {i}', f'Street {i}', 'host_id',
+              rand.randrange(20, 1000), rand.randrange(1, 6),
+              rand.randrange(1, 4), 'city_id', 'country_id',
+              rand.randrange(1, 11))
+        for i in range(count))
+
+    print(f'{count} places')
+    print(f'{"search":<40}{"found":>8}{"scan (ms)":>12}{"index (ms)":>12}')
+    for name, where in searches.items():
+        scanned, expected = best_time(lambda: scan(storage, where))
+        indexed, found = best_time(
+            lambda: storage.query('Place', where))
+        assert sorted(obj.id for obj in found) == \
+            sorted(obj.id for obj in expected)
+        print(f'{name:<40}{len(found):>8}{scanned * 1e3:>12.1f}'
+              f'{indexed * 1e3:>12.1f}')
+        print(f'    {storage.explain("Place", where)["index"]}')
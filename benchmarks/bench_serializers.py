@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""
+    Compares the size and speed of the FileStorage serializers.
+
+    Usage (from the root of the repository):
+        python3 -m benchmarks.bench_serializers [number of places]
+"""
+import os
+import sys
+import time
+from model.user import User
+from model.place import Place
+from model.review import Review
+from persistance.serializers import JSONSerializer, BinarySerializer
+
+filename = 'bench_storage'
+
+
+def sample_records(count):
+    """ Records of `count` places, with their host and a review each """
+    records = {}
+    for i in range(count):
+        host = User(f'host{i}@mail.com', 'x' * 64, 'John', 'Doe')
+        place = Place(f'Place {i}', f'Street {i}', host.id, 50 + i % 200,
+                      1 + i % 4, 1 + i % 3, 'city_id', 'country_id',
+                      2 + i % 6, description='A lovely place to stay',
+                      latitude=-34.9 + i / 1e5, longitude=-56.1)
+        review = Review(host.id, place.id, i % 11, 'Great stay')
+        for obj in (host, place, review):
+            records[obj.key] = obj.to_dict()
+    return records
+
+
+def bench(serializer, records):
+    start = time.perf_counter()
+    parts = [serializer.encode(key, record)
+             for key, record in records.items()]
+    document = serializer.document(parts)
+    encode = time.perf_counter() - start
+
+    mode = 'wb' if serializer.binary else 'w'
+    with open(filename, mode) as f:
+        f.write(document)
+    size = os.path.getsize(filename)
+
+    start = time.perf_counter()
+    with open(filename, 'rb' if serializer.binary else 'r') as f:
+        loaded = sum(1 for item in serializer.load(f))
+    load = time.perf_counter() - start
+    os.remove(filename)
+
+    assert loaded == len(records)
+    return size, encode, load
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    records = sample_records(count)
+    print(f'{len(records)} records')
+    print(f'{"serializer":<18}{"size (MB)":>12}{"encode (s)":>12}'
+          f'{"load (s)":>12}')
+    for serializer in (JSONSerializer(), BinarySerializer()):
+        size, encode, load = bench(serializer, records)
+        print(f'{type(serializer).__name__:<18}{size / 1e6:>12.2f}'
+              f'{encode:>12.2f}{load:>12.2f}')
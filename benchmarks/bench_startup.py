@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""
+    Measures the startup cost of a process using the AirBnB clone with
+    a large storage file: importing model and the services, and the first
+    use of the storage (when the file is actually loaded).
+
+    Usage (from the root of the repository):
+        python3 -m benchmarks.bench_startup [number of places]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.bench_serializers import sample_records
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+steps = {
+    'import model': 'import model',
+    'import services': 'import service.place_service, '
+                       'service.review_service, service.user_service',
+    'first storage use': 'import model; model.storage.count()',
+}
+
+child = '''
+import time
+start = time.perf_counter()
+{}
+print(time.perf_counter() - start)
+'''
+
+
+def measure(code, directory, runs=3):
+    """ Best time of `code` in a new interpreter started in `directory` """
+    env = dict(os.environ, PYTHONPATH=root)
+    env.pop('DB_STORAGE', None)
+    times = []
+    for i in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', child.format(code)], cwd=directory,
+            env=env, capture_output=True, text=True, check=True).stdout
+        times.append(float(output))
+    return min(times)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    records = sample_records(count)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'storage.json'), 'w') as f:
+            json.dump(records, f, indent=2)
+        size = os.path.getsize(os.path.join(directory, 'storage.json'))
+        print(f'{len(records)} records, {size / 1e6:.2f} MB')
+
+        for step, code in steps.items():
+            print(f'{step:<20}{measure(code, directory):>10.3f} s')
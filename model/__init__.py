@@ -4,6 +4,7 @@
     and it also defines key variables for the rest of the program.
 """
 import os
+import threading
 from model.user import User
 from model.amenity import Amenity
 from model.place import Place
@@ -20,12 +21,34 @@ classes = {
     'Review': Review
 }
 
-if os.environ.get('DB_STORAGE'):
-    storage = None
-else:
-    from persistance.file_storage import FileStorage
-    filename = 'storage.json'
-    storage = FileStorage(filename)
+filename = 'storage.json'
+_storage = None
+_storage_lock = threading.Lock()
 
-    if os.access(filename, os.F_OK):
-        storage.reload()
+
+def get_storage():
+    """
+        Returns the storage, creating it on first use. Its data is loaded
+        once, when it's created, so importing model (or the services)
+        doesn't read the storage file.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if os.environ.get('DB_STORAGE'):
+                    from persistance.db_storage import DataBaseStorage
+                    _storage = DataBaseStorage('storage.db')
+                else:
+                    from persistance.file_storage import FileStorage
+                    _storage = FileStorage(filename)
+                # Later `model.storage` lookups skip __getattr__
+                globals()['storage'] = _storage
+    return _storage
+
+
+def __getattr__(name):
+    """ Creates `storage` the first time it's used """
+    if name == 'storage':
+        return get_storage()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
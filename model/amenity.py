@@ -17,8 +17,12 @@ class Amenity(BaseModel):
         Methods:
             - constructor: Recreate a User object from a dictionary
             previously obtained with the `to_dict()` method
+
+        Names are unique.
     """
+    __slots__ = ('__name', )
     __required = ('name', )
+    __unique = {'name': None}
 
     def __init__(self, name):
         BaseModel.__init__(self)
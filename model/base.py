@@ -9,6 +9,9 @@ from abc import ABC, abstractclassmethod
 from datetime import datetime
 from uuid import uuid4
 
+# Previous value of an attribute that wasn't set
+MISSING = object()
+
 
 class BaseModel(ABC):
     """
@@ -22,32 +25,209 @@ class BaseModel(ABC):
         - to_dict: Returns a dictionary representation of the object
         with an attribute to indicate the class of the object
 
+        - record: Cached version of `to_dict()`, rebuilt only after an
+        attribute of the object is set or a list attribute is changed
+
+        - observe: Registers a function called after each attribute of the
+        object is set (used by storage to follow changes)
+
         - constructor: Build an instance of an object from a dictionary.
         User for deserialization
+
+        - unique: Fields whose values can't be repeated by two objects of
+        the class, declared in the class as `__unique`, mapped to the
+        function that normalizes their values (ex: str.lower) or None
+
+        - references: Fields holding the ID of an object of another class,
+        declared in the class as `__references`, mapped to that class name
+
+        - indexed: Fields storage keeps an index of (unique fields and
+        references), to find the objects holding a value without a scan
+
+        - ranges: Numeric fields storage keeps sorted, declared in the
+        class as `__ranges`, to find the objects in a range of values
+
+        - position: The (latitude, longitude) fields of the objects of the
+        class, declared in the class as `__position`, which storage keeps
+        a spatial index of. Empty if the class doesn't declare one
+
+        - text: Text fields whose words storage keeps a full-text index
+        of, declared in the class as `__text`
+
+        - attribute_names: The slots holding the objects' data. Objects
+        have no instance dict: each model class declares in `__slots__`
+        the (private) attributes its properties store values in
     """
 
+    # Objects keep their attributes in slots instead of an instance dict
+    # (each model class declares the ones its properties store values in),
+    # and can be weakly referenced (see DataBaseStorage)
+    __slots__ = ('id', 'created_at', 'updated_at', '__record', '__observer',
+                 '__weakref__')
+
+    # Attributes used internally, that aren't part of the object's data
+    __internal = ('_BaseModel__record', '_BaseModel__observer')
+
     def __init__(self):
+        object.__setattr__(self, '_BaseModel__observer', None)
+        object.__setattr__(self, '_BaseModel__record', None)
         self.id = str(uuid4())
         self.created_at = datetime.now()
         self.updated_at = self.created_at
 
+    def __setattr__(self, name, value):
+        observer = self.__observer
+        if observer is None:
+            object.__setattr__(self, name, value)
+            # Setting any attribute (through the property setters or
+            # directly, like updated_at) invalidates the cached record
+            object.__setattr__(self, '_BaseModel__record', None)
+            return
+
+        # Properties aren't reported, only the attribute their setter
+        # stores the value in
+        reported = not type(self).is_property(name)
+        old = getattr(self, name, MISSING) if reported else MISSING
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_BaseModel__record', None)
+        if reported:
+            observer(self, name, old)
+
+    def __delattr__(self, name):
+        object.__delattr__(self, name)
+        object.__setattr__(self, '_BaseModel__record', None)
+
+    def observe(self, observer):
+        """
+            Registers `observer(obj, name, old)` to be called after an
+            attribute of the object is set, with the (name mangled) name of
+            the attribute and its previous value (MISSING if it had none).
+            An object has a single observer: the storage that holds it.
+        """
+        object.__setattr__(self, '_BaseModel__observer', observer)
+
+    def unobserve(self, observer):
+        """ Unregisters `observer` if it's the object's observer """
+        if self.__observer == observer:
+            object.__setattr__(self, '_BaseModel__observer', None)
+
     def to_dict(self):
         """
             Returns an object's dictionary representation for serialization.
             Datetime objects are converted to string and an attribute is added
             to store the object's type
         """
+        # Lists are copied too: the record's must not be changed
+        return {
+            key: list(value) if type(value) is list else value
+            for key, value in self.record.items()
+        }
 
+    @property
+    def record(self):
+        """
+            Cached dictionary representation of the object (the one returned
+            by `to_dict()`). It's only rebuilt after an attribute is set or a
+            list attribute is changed in place, so the same dict is returned
+            while the object doesn't change: it must not be modified.
+        """
+        cached = self.__record
+        if cached is not None:
+            record, lists = cached
+            # Lists are copied into the record: one that differs from its
+            # copy was changed in place
+            for name, value in lists:
+                if getattr(self, name, None) != value:
+                    break
+            else:
+                return record
+
+        record = {}
+        lists = []
         # Need to parse keys since private attrs generate name mangling
-        obj_dict = {
-            key.replace(f'_{type(self).__name__}__', ''): self.__dict__[key]
-            for key in self.__dict__
-        }
+        fields = self.field_names()
+        for key, value in self.__items():
+            field = fields.get(key) or self.field_name(key)
+            if type(value) is list:
+                value = list(value)
+                lists.append((key, value))
+            record[field] = value
 
-        obj_dict['__class__'] = type(self).__name__
+        record['__class__'] = type(self).__name__
         for attr in ('created_at', 'updated_at'):
-            obj_dict[attr] = str(obj_dict.get(attr))
-        return obj_dict
+            record[attr] = str(record.get(attr))
+        object.__setattr__(self, '_BaseModel__record', (record, lists))
+        return record
+
+    def __items(self):
+        """
+            (Name mangled) names and values of the object's attributes, in
+            the order their classes declare them. Subclasses that don't
+            declare `__slots__` also keep attributes in an instance dict
+        """
+        for name in type(self).attribute_names():
+            value = getattr(self, name, MISSING)
+            if value is not MISSING:
+                yield name, value
+        # Copied: another thread may be caching its own record of the
+        # object at the same time
+        extra = getattr(self, '__dict__', None)
+        if extra:
+            yield from extra.copy().items()
+
+    @classmethod
+    def attribute_names(cls):
+        """
+            (Name mangled) names of the slots holding the data of the
+            objects of the class, from BaseModel's to the class's own
+        """
+        names = cls.__dict__.get('_BaseModel__attribute_names')
+        if names is None:
+            names = []
+            for klass in reversed(cls.__mro__):
+                slots = klass.__dict__.get('__slots__', ())
+                for slot in (slots,) if type(slots) is str else slots:
+                    # Private slot names are name mangled like attributes
+                    if slot.startswith('__') and not slot.endswith('__'):
+                        slot = f"_{klass.__name__.lstrip('_')}{slot}"
+                    if slot not in cls.__internal and \
+                            slot not in ('__dict__', '__weakref__'):
+                        names.append(slot)
+            names = tuple(names)
+            setattr(cls, '_BaseModel__attribute_names', names)
+        return names
+
+    @classmethod
+    def is_property(cls, name):
+        """ Whether `name` is a property of the class (not an attribute) """
+        properties = cls.__dict__.get('_BaseModel__properties')
+        if properties is None:
+            properties = {}
+            setattr(cls, '_BaseModel__properties', properties)
+        found = properties.get(name)
+        if found is None:
+            found = isinstance(getattr(cls, name, None), property)
+            properties[name] = found
+        return found
+
+    @classmethod
+    def field_names(cls):
+        """ Mapping of (name mangled) attribute names to field names """
+        fields = cls.__dict__.get('_BaseModel__fields')
+        if fields is None:
+            fields = {}
+            setattr(cls, '_BaseModel__fields', fields)
+        return fields
+
+    @classmethod
+    def field_name(cls, name):
+        """ Field name of a (name mangled) attribute name """
+        fields = cls.field_names()
+        field = fields.get(name)
+        if field is None:
+            field = name.replace(f'_{cls.__name__}__', '')
+            fields[name] = field
+        return field
 
     @classmethod
     def constructor(cls, dictionary):
@@ -84,14 +264,54 @@ class BaseModel(ABC):
         return new_instance
 
     def __eq__(self, obj):
-        if type(obj) is type(self) and self.__dict__ == obj.__dict__:
-            return True
-        return False
+        if type(obj) is not type(self):
+            return False
+        return self.__attributes() == obj.__attributes()
+
+    def __attributes(self):
+        """ The object's attributes, without the cached record """
+        return dict(self.__items())
 
     @classmethod
     def required(cls):
         return cls.__dict__[f"_{cls.__name__}__required"]
 
+    @classmethod
+    def unique(cls):
+        return cls.__dict__.get(f"_{cls.__name__}__unique", {})
+
+    @classmethod
+    def references(cls):
+        return cls.__dict__.get(f"_{cls.__name__}__references", {})
+
+    @classmethod
+    def indexed(cls):
+        indexed = cls.__dict__.get('_BaseModel__indexed')
+        if indexed is None:
+            indexed = (*cls.unique(), *cls.references())
+            setattr(cls, '_BaseModel__indexed', indexed)
+        return indexed
+
+    @classmethod
+    def ranges(cls):
+        return cls.__dict__.get(f"_{cls.__name__}__ranges", ())
+
+    @classmethod
+    def position(cls):
+        return cls.__dict__.get(f"_{cls.__name__}__position", ())
+
+    @classmethod
+    def text(cls):
+        return cls.__dict__.get(f"_{cls.__name__}__text", ())
+
+    @classmethod
+    def normalize(cls, field, value):
+        """ Normalized value of a unique field, as compared for uniqueness """
+        normalizer = cls.unique().get(field)
+        if normalizer is None or type(value) is not str:
+            return value
+        return normalizer(value)
+
     @property
     def key(self):
         return f"{type(self).__name__}_{self.id}"
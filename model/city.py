@@ -15,7 +15,11 @@ class City(BaseModel):
             - updated_at (datetime): datetime of last update
             - name (string): name of the city
             - country (string): Country ID
+
+        Cities are indexed by country.
     """
+    __slots__ = ('__name', '__country')
+    __references = {'country': 'Country'}
     __required = ('name', 'country')
 
     def __init__(self, name, country):
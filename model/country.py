@@ -17,8 +17,12 @@ class Country(BaseModel):
             - name (string): name of the country
             - iso (string): two letter code based on ISO 3166 Alpha-2
             - cities (list): list of registered cities in the country
+
+        ISO codes are unique, regardless of case.
     """
+    __slots__ = ('__name', '__iso', '__cities')
     __required = ('name', 'iso', 'cities')
+    __unique = {'iso': str.upper}
 
     def __init__(self, name, iso, cities=[]):
         BaseModel.__init__(self)
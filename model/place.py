@@ -3,6 +3,7 @@
     This module defines the Place Class for the AirBnB clone
 """
 from model.base import BaseModel
+from model import ratings as rating_aggregates
 
 
 class Place(BaseModel):
@@ -25,16 +26,33 @@ class Place(BaseModel):
             - max_guests (int): maximum number of guests the host allows
             - amenities (list): list of available amenities' ID
             - reviews (list): list of review IDs by other users
+            - ratings (list): number of reviews of each rating, from 0 to
+            10 (see model.ratings), kept up to date by ReviewService
 
         Methods:
             - constructor: Recreate a User object from a dictionary
             previously obtained with the `to_dict()` method
+
+        Places are indexed by host, city and country, sorted by price,
+        guests, rooms and bathrooms, and indexed by position and by the
+        words of their name and description.
     """
+    __slots__ = (
+        '__name', '__description', '__address', '__latitude', '__longitude',
+        '__city', '__country', '__host', '__price_per_night', '__max_guests',
+        '__number_rooms', '__number_bathrooms', '__amenities', '__reviews',
+        '__ratings'
+    )
+    __references = {'host': 'User', 'city': 'City', 'country': 'Country'}
+    __position = ('latitude', 'longitude')
+    __text = ('name', 'description')
+    __ranges = ('price_per_night', 'max_guests', 'number_rooms',
+                'number_bathrooms')
     __required = (
         'name', 'description', 'address', 'city', 'country',
         'latitude', 'longitude', 'host', 'price_per_night',
         'max_guests', 'number_rooms', 'number_bathrooms',
-        'amenities', 'reviews'
+        'amenities', 'reviews', 'ratings'
     )
 
     def __init__(self, name, address,
@@ -42,7 +60,8 @@ class Place(BaseModel):
                  number_rooms, number_bathrooms,
                  city, country,
                  max_guests, amenities=[], description='',
-                 latitude=33.33, longitude=33.33, reviews=[]):
+                 latitude=33.33, longitude=33.33, reviews=[],
+                 ratings=None):
 
         BaseModel.__init__(self)
         self.name = name
@@ -59,6 +78,7 @@ class Place(BaseModel):
         self.number_bathrooms = number_bathrooms
         self.amenities = amenities
         self.reviews = reviews
+        self.ratings = ratings
 
     @property
     def name(self):
@@ -209,3 +229,15 @@ class Place(BaseModel):
                 not all(type(review) is str for review in reviews):
             raise TypeError('place reviews must be a string')
         self.__reviews = reviews
+
+    @property
+    def ratings(self):
+        return self.__ratings
+
+    @ratings.setter
+    def ratings(self, ratings):
+        # Places saved before ratings were aggregated have none
+        if ratings is None:
+            ratings = rating_aggregates.empty()
+        rating_aggregates.check(ratings)
+        self.__ratings = ratings
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""
+    This module defines the rating aggregates kept by Place (of its
+    reviews) and User (of the reviews of the places they host): a
+    histogram of how many reviews gave each rating, from 0 to 10.
+
+    The count, sum and mean of the ratings follow from the histogram, so
+    they're read without looking any review up, and adding or removing
+    a rating only changes one of its entries.
+"""
+
+# Reviews are rated from 0 to 10
+RATINGS = range(11)
+
+
+def empty():
+    """ Histogram without ratings """
+    return [0 for rating in RATINGS]
+
+
+def check(histogram):
+    """ Raises TypeError unless it's a histogram of ratings """
+    if type(histogram) is not list or len(histogram) != len(RATINGS) or \
+            not all(type(count) is int and count >= 0
+                    for count in histogram):
+        raise TypeError('ratings must be a list of 11 non-negative ints '
+                        '(the number of reviews of each rating)')
+
+
+def changed(histogram, added=(), removed=()):
+    """
+        Copy of a histogram with some ratings added and others removed
+        (a copy: objects only see a list changed when it's set again)
+    """
+    histogram = list(histogram)
+    for rating in added:
+        histogram[rating] += 1
+    for rating in removed:
+        histogram[rating] -= 1
+    return histogram
+
+
+def merged(histogram, other, sign=1):
+    """ Copy of a histogram with the ratings of another added (or removed) """
+    return [count + sign * more for count, more in zip(histogram, other)]
+
+
+def summary(histogram):
+    """ Count, sum, mean (None without ratings) and histogram of ratings """
+    count = sum(histogram)
+    total = sum(rating * times for rating, times in zip(RATINGS, histogram))
+    return {
+        'count': count,
+        'sum': total,
+        'mean': total / count if count else None,
+        'histogram': list(histogram),
+    }
@@ -19,7 +19,13 @@ class Review(BaseModel):
             - place (string): place (ID) that's being reviewed
             - rating (int): rating of the review
             - comment (string): comment associated to the review
+
+        Reviews are indexed by user and place, and by the words of their
+        comment.
     """
+    __slots__ = ('__user', '__place', '__rating', '__comment')
+    __references = {'user': 'User', 'place': 'Place'}
+    __text = ('comment', )
     __required = ('user', 'place', 'rating', 'comment')
 
     def __init__(self, user, place, rating, comment):
@@ -3,6 +3,7 @@
     This module defines the User Class for the AirBnB clone
 """
 from model.base import BaseModel
+from model import ratings as rating_aggregates
 
 
 class User(BaseModel):
@@ -15,20 +16,30 @@ class User(BaseModel):
             - password (string): user hashed password using id as salt
             - first_name (string): User's first name
             - last_name (string): User's last name
+            - ratings (list): number of reviews of each rating, from 0 to
+            10, that the places hosted by the user got (see model.ratings)
 
         Methods:
             - constructor: Recreate a User object from a dictionary
             previously obtained with the `to_dict()` method
+
+        Emails are unique, regardless of case.
     """
-    __required = ('email', 'password', 'first_name', 'last_name')
+    __slots__ = (
+        '__email', '__password', '__first_name', '__last_name', '__ratings'
+    )
+    __required = ('email', 'password', 'first_name', 'last_name', 'ratings')
+    __unique = {'email': str.lower}
 
-    def __init__(self, email, password, first_name, last_name):
+    def __init__(self, email, password, first_name, last_name,
+                 ratings=None):
         BaseModel.__init__(self)
 
         self.email = email
         self.password = password
         self.first_name = first_name
         self.last_name = last_name
+        self.ratings = ratings
 
     @property
     def email(self):
@@ -70,3 +81,15 @@ class User(BaseModel):
         if type(surname) is not str:
             raise TypeError('last_name must be a string')
         self.__last_name = surname
+
+    @property
+    def ratings(self):
+        return self.__ratings
+
+    @ratings.setter
+    def ratings(self, ratings):
+        # Users saved before ratings were aggregated have none
+        if ratings is None:
+            ratings = rating_aggregates.empty()
+        rating_aggregates.check(ratings)
+        self.__ratings = ratings
@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+"""
+    This module defines the Columns class, a columnar view (NumPy arrays)
+    of the numeric fields and references of the objects of a model class,
+    for analytics that run vectorized instead of object by object.
+
+    NumPy is optional: it's only needed to build a Columns view.
+"""
+import operator
+from persistance.query import Query
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Columns:
+    """
+        Columnar view of the objects of a model class in a storage, one
+        row per object:
+            - numeric fields (the fields the class keeps sorted and its
+            position): float arrays
+            - references: int arrays of codes, each one standing for an
+            ID (see labels)
+
+        The arrays are built on first use, and rebuilt on the first use
+        after an object of the class is added, removed or changed: the
+        version of the class in storage (see Persistance.version) is
+        compared with the one they were built at. Storages that don't
+        report versions rebuild them on every use.
+
+        Methods:
+            - column: Array of a field
+            - labels: IDs of a reference, indexed by code
+            - mask: Boolean array of the rows matching some conditions
+            (see Query: ==, !=, <, <=, >, >= and in, on the fields of the
+            view)
+            - select: Keys of the rows matching some conditions
+            - group_by: Statistic of a column per value of a reference
+            - stats: Statistics of a column
+
+        Usage:
+            columns = Columns(storage, 'Place')
+            columns.group_by('city', 'price_per_night', 'mean',
+                             where={'max_guests': {'>=': 4}})
+    """
+    statistics = ('count', 'sum', 'mean', 'min', 'max')
+
+    def __init__(self, storage, classname):
+        if np is None:
+            raise ImportError('Columns needs numpy')
+        from model import classes
+
+        self.storage = storage
+        self.cls = classes[classname]
+        self.numeric = (*self.cls.ranges(), *self.cls.position())
+        self.coded = tuple(self.cls.references())
+        if not self.numeric and not self.coded:
+            raise ValueError(
+                f'{classname} objects have no numeric fields or references')
+        # (version of the class, arrays built at that version)
+        self.__built = None
+
+    def __len__(self):
+        return len(self.__current()['keys'])
+
+    def __current(self):
+        """ The arrays of the view, rebuilt if the objects changed """
+        version = self.storage.version(self.cls.__name__)
+        built = self.__built
+        if built is None or version is None or version != built[0]:
+            # Versions are read before the objects: a change made in
+            # between makes the next use rebuild them again
+            built = (version, self.__build())
+            # No lock of its own (storage's is taken while reading the
+            # objects, maybe inside a transaction): threads rebuilding at
+            # once only repeat work, and the pair is replaced at once
+            self.__built = built
+        return built[1]
+
+    def __build(self):
+        """ Arrays of the objects of the class, a column at a time """
+        objects = self.storage.all(self.cls.__name__)
+        rows = list(objects.values())
+
+        data = {'keys': list(objects)}
+        for field in self.numeric:
+            data[field] = np.fromiter(
+                map(operator.attrgetter(field), rows), dtype=np.float64,
+                count=len(rows))
+        for field in self.coded:
+            # Codes in order of first appearance
+            codes = {}
+            data[field] = np.fromiter(
+                (codes.setdefault(value, len(codes))
+                 for value in map(operator.attrgetter(field), rows)),
+                dtype=np.int64, count=len(rows))
+            data[field, 'codes'] = codes
+        return data
+
+    def check_field(self, field):
+        if field not in self.numeric and field not in self.coded:
+            raise ValueError(
+                f'{self.cls.__name__} has no column {field!r}, expected one '
+                f'of {self.numeric + self.coded}')
+
+    def keys(self):
+        """ Keys of the objects, in the order of the rows """
+        return list(self.__current()['keys'])
+
+    def column(self, field):
+        """ Array of a field (codes for a reference). Must not be changed """
+        self.check_field(field)
+        return self.__current()[field]
+
+    def labels(self, field):
+        """ IDs of a reference, indexed by their code """
+        self.check_field(field)
+        if field not in self.coded:
+            raise ValueError(f'{field!r} is not a reference')
+        return list(self.__current()[field, 'codes'])
+
+    def mask(self, where=None):
+        """ Boolean array of the rows that match `where` (see Query) """
+        return self.__mask(where, self.__current())
+
+    def __mask(self, where, data):
+        mask = np.ones(len(data['keys']), dtype=bool)
+        for field, op, value in Query(self.cls, where).predicates:
+            self.check_field(field)
+            column = data[field]
+            if field in self.coded:
+                codes = data[field, 'codes']
+                if op not in ('==', '!=', 'in'):
+                    raise ValueError(
+                        f"references can only be compared with '==', '!=' "
+                        f"or 'in', not {op!r}")
+                # IDs no object refers to get a code no row has
+                if op == 'in':
+                    value = [codes.get(item, -1) for item in value]
+                else:
+                    value = codes.get(value, -1)
+            if op == 'in':
+                mask &= np.isin(column, np.asarray(value, dtype=column.dtype))
+            else:
+                mask &= Query.operators[op](column, value)
+        return mask
+
+    def select(self, where=None):
+        """ Keys of the objects that match `where`, in the order of rows """
+        data = self.__current()
+        keys = data['keys']
+        return [keys[i] for i in np.flatnonzero(self.__mask(where, data))]
+
+    def group_by(self, field, column=None, statistic='count', where=None):
+        """
+            Dict of each ID of a reference (held by a matching object) to
+            a statistic (count, sum, mean, min or max) of a column of the
+            matching objects that hold it
+        """
+        if field not in self.coded:
+            raise ValueError(f'{field!r} is not a reference to group by')
+        if statistic not in self.statistics:
+            raise ValueError(f'statistic must be one of {self.statistics}')
+        if statistic != 'count' and column not in self.numeric:
+            raise ValueError(f'{statistic} needs a numeric column')
+
+        data = self.__current()
+        mask = self.__mask(where, data)
+        codes = data[field][mask]
+        size = len(data[field, 'codes'])
+        counts = np.bincount(codes, minlength=size)
+        if statistic == 'count':
+            result = counts
+        elif statistic in ('sum', 'mean'):
+            result = np.bincount(codes, weights=data[column][mask],
+                                 minlength=size)
+            if statistic == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = result / counts
+        else:
+            ufunc = np.minimum if statistic == 'min' else np.maximum
+            result = np.full(size, np.inf if statistic == 'min' else -np.inf)
+            ufunc.at(result, codes, data[column][mask])
+
+        labels = list(data[field, 'codes'])
+        return {labels[code]: result[code].item()
+                for code in np.flatnonzero(counts)}
+
+    def stats(self, column, where=None):
+        """
+            Count, sum, mean, standard deviation, min, median and max of a
+            column over the matching objects (None but count and sum
+            without any)
+        """
+        if column not in self.numeric:
+            raise ValueError(f'{column!r} is not a numeric column')
+        data = self.__current()
+        values = data[column][self.__mask(where, data)]
+        if not len(values):
+            return {'count': 0, 'sum': 0.0, 'mean': None, 'std': None,
+                    'min': None, 'median': None, 'max': None}
+        return {
+            'count': len(values),
+            'sum': values.sum().item(),
+            'mean': values.mean().item(),
+            'std': values.std().item(),
+            'min': values.min().item(),
+            'median': np.median(values).item(),
+            'max': values.max().item(),
+        }
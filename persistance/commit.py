@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+"""
+    This module defines GroupCommit and WriteBehind, which commit the
+    saves of FileStorage several at a time instead of one write each.
+"""
+import atexit
+import sys
+import threading
+import time
+
+
+class GroupCommit:
+    """
+        Commits the saves of several threads with a single write: a save
+        waits `delay` seconds for the saves of other threads before
+        calling `commit()`, and all of them are covered by that write.
+    """
+
+    def __init__(self, commit, delay):
+        self.__commit = commit
+        self.__delay = delay
+        self.__cond = threading.Condition()
+        self.__committing = False
+        # Saves requested so far and saves covered by a finished write
+        self.__requested = 0
+        self.__committed = 0
+
+    def save(self):
+        """ Returns once a write covering this save is finished """
+        with self.__cond:
+            self.__requested += 1
+            ticket = self.__requested
+            # Wait for a write that covers this save, or lead the next one
+            while self.__committing:
+                self.__cond.wait()
+                if self.__committed >= ticket:
+                    return
+            self.__committing = True
+
+        covered = 0
+        try:
+            # Give the saves of other threads a chance to join this write
+            time.sleep(self.__delay)
+            with self.__cond:
+                covered = self.__requested
+            self.__commit()
+        finally:
+            with self.__cond:
+                self.__committed = max(self.__committed, covered)
+                self.__committing = False
+                self.__cond.notify_all()
+
+
+class WriteBehind:
+    """
+        Writer thread committing saves in the background: save() only
+        marks the storage dirty and returns, and the writer waits `delay`
+        seconds for more saves before calling `commit()` once for all of
+        them. Once `max_pending` saves are waiting to be written, save()
+        blocks until the writer catches up.
+
+        The writer is started by the first save. `at_exit` (close() by
+        default) is then called at exit to write the pending saves.
+    """
+
+    def __init__(self, commit, delay, max_pending=1000, at_exit=None):
+        self.__commit = commit
+        self.__delay = delay
+        self.__max_pending = max_pending
+        self.__at_exit = at_exit or self.close
+        self.__writer = None
+        self.__cond = threading.Condition()
+        self.__closing = False
+        # Saves marked, taken by the writer for a write and covered by a
+        # finished write, and the save flush() waits for
+        self.__marked = 0
+        self.__taken = 0
+        self.__flushed = 0
+        self.__flush_target = 0
+
+    def save(self):
+        """
+            Hands a save to the writer thread. Returns False once closed:
+            the save must then be written right away.
+        """
+        with self.__cond:
+            if self.__closing:
+                return False
+            self.__marked += 1
+            if self.__writer is None:
+                self.__writer = threading.Thread(target=self.__run,
+                                                 daemon=True)
+                self.__writer.start()
+                atexit.register(self.__at_exit)
+            self.__cond.notify_all()
+
+            # Backpressure: don't let unwritten saves pile up
+            while self.__marked - self.__flushed > self.__max_pending:
+                self.__cond.wait()
+        return True
+
+    def __run(self):
+        """ Writer thread: commits the marked saves, a batch at a time """
+        cond = self.__cond
+        while True:
+            with cond:
+                while self.__marked == self.__taken and not self.__closing:
+                    cond.wait()
+                if self.__marked == self.__taken:
+                    return
+
+                # Debounce: give more saves a chance to join this write,
+                # unless someone is waiting for it
+                deadline = time.monotonic() + self.__delay
+                while not self.__closing and \
+                        self.__flush_target <= self.__flushed and \
+                        self.__marked - self.__flushed <= self.__max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    cond.wait(remaining)
+                covered = self.__taken = self.__marked
+
+            try:
+                self.__commit()
+            except Exception:
+                # The writer must outlive a failed write, or saves would
+                # wait for it forever. Storage still holds the changes:
+                # the next write covers them again.
+                sys.stderr.write("Couldn't write to file")
+            finally:
+                with cond:
+                    self.__flushed = covered
+                    cond.notify_all()
+
+    def flush(self):
+        """ Waits until every save made so far is written """
+        with self.__cond:
+            target = self.__marked
+            if self.__writer is not None and self.__flushed < target:
+                self.__flush_target = max(self.__flush_target, target)
+                self.__cond.notify_all()
+                while self.__flushed < target:
+                    self.__cond.wait()
+
+    def close(self):
+        """
+            Writes the pending saves and stops the writer thread. Saves
+            made afterwards are refused (see save).
+        """
+        with self.__cond:
+            writer = self.__writer
+            self.__closing = True
+            self.__cond.notify_all()
+        if writer is not None:
+            writer.join()
+            atexit.unregister(self.__at_exit)
+        with self.__cond:
+            self.__writer = None
@@ -0,0 +1,581 @@
+#!/usr/bin/python3
+"""
+    This module defines the DataBaseStorage class for persisting
+    objects to a SQLite database.
+"""
+import heapq
+import json
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from persistance.persistance import Persistance
+from model.base import BaseModel, MISSING
+
+
+class DataBaseStorage(Persistance):
+    """
+        DataBaseStorage class for persisting AirBnB objects in a
+        SQLite database, with one table per model class.
+
+        Objects handed out by get()/all() are kept in an identity map while
+        they're in use: it holds them weakly, so the ones nobody holds any
+        more are let go. Objects report their changes to storage, and the
+        ones added or changed are held until the next save(), which only
+        writes them (a list changed in place must be set again to be seen,
+        like the services do).
+
+        List fields (amenities, reviews, cities) are stored as JSON text in
+        columns declared as JSON, and decoded back when they're read.
+
+        References and unique fields are indexed, so find() and get_by()
+        only read the rows they select (unique fields compared normalized,
+        like User.email, are indexed by their normalized value).
+
+        Changes can be grouped with `with storage.transaction():`. The saves
+        requested inside the block are deferred to a single one (a single
+        SQL transaction) when the outermost block ends, and if the block
+        raises, the objects added, removed or changed inside it are
+        restored to their previous state (objects report their changes to
+        storage). Other threads wait for the whole block.
+
+        Each thread gets its own connection (SQLite connections can't be
+        shared across threads), all of them in WAL mode so that readers
+        don't block the writer.
+    """
+    column_types = {int: 'INTEGER', float: 'REAL', list: 'JSON'}
+    # SQLite functions normalizing text like the models' normalizers (only
+    # for ASCII text: SQLite doesn't change the case of other letters)
+    sql_normalizers = {str.lower: 'lower', str.upper: 'upper'}
+    batch_size = 500
+
+    def __init__(self, filename):
+        if not filename:
+            raise AttributeError('filename missing')
+        if type(filename) is not str:
+            raise TypeError('filename must be string')
+        self.__filename = filename
+        self.__local = threading.local()
+        self.__connections = []
+        self.__lock = threading.RLock()
+        self.__statements = {}
+        # Per-thread transaction state: the undo log of the changes made
+        # inside the transaction and whether a save was deferred
+        self.__transactions = threading.local()
+        # Loaded objects report their changes to this (a single bound
+        # method shared by all of them)
+        self.__observer = self.__changed
+        self.__objects = weakref.WeakValueDictionary()
+
+        conn = self.__connection()
+        # Class name -> columns of its table, and the ones holding JSON
+        self.__tables = {}
+        self.__json_columns = {}
+        for (name, ) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"):
+            self.__read_columns(conn, name)
+        # Tables created before their references were indexed
+        with conn:
+            for classname in self.__tables:
+                self.__create_indexes(conn, classname)
+        self.reload()
+
+    def __connection(self):
+        """ Returns the connection of the calling thread """
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            # Connections are only used by the thread that opened them,
+            # except by close(), which may run from any thread
+            conn = sqlite3.connect(self.__filename, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.__local.conn = conn
+            with self.__lock:
+                self.__connections.append(conn)
+        return conn
+
+    def close(self):
+        """ Closes the connections of every thread """
+        with self.__lock:
+            for conn in self.__connections:
+                conn.close()
+            self.__connections = []
+        self.__local = threading.local()
+
+    def __check_table(self, conn, classname, records):
+        """
+            Creates the table of a class, or adds the columns it lacks for
+            fields added to the model after it was created, typing them
+            after the first of `records` that holds them
+        """
+        if classname not in self.__tables:
+            self.__create_table(conn, classname, records[0])
+        known = {*self.__tables[classname], '__class__'}
+        missing = {}
+        for record in records:
+            if not record.keys() <= known:
+                for key, value in record.items():
+                    if key not in known:
+                        missing.setdefault(key, value)
+        if missing:
+            self.__add_columns(conn, classname, missing)
+
+    def __read_columns(self, conn, classname):
+        """ Reads the columns of the table of a class (and their types) """
+        columns = conn.execute(f'PRAGMA table_info("{classname}")').fetchall()
+        self.__tables[classname] = [row['name'] for row in columns]
+        self.__json_columns[classname] = [
+            row['name'] for row in columns if row['type'] == 'JSON']
+
+    def __column_type(self, column, value):
+        """ Column definition of a field, typed after one of its values """
+        if column == 'id':
+            return 'id TEXT PRIMARY KEY'
+        return f'"{column}" {self.column_types.get(type(value), "TEXT")}'
+
+    def __create_table(self, conn, classname, record):
+        """ Creates the table of a class, typing columns after `record` """
+        columns = [key for key in record if key != '__class__']
+        definitions = ', '.join(
+            self.__column_type(column, record[column]) for column in columns)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{classname}" '
+                     f'({definitions})')
+        # Another storage on the same file may have created it already
+        self.__read_columns(conn, classname)
+        self.__create_indexes(conn, classname)
+
+    def __add_columns(self, conn, classname, values):
+        """ Adds columns to the table of a class (typed after `values`) """
+        # Another storage on the same file may have added some already
+        self.__read_columns(conn, classname)
+        for column, value in values.items():
+            if column not in self.__tables[classname]:
+                conn.execute(f'ALTER TABLE "{classname}" ADD COLUMN '
+                             f'{self.__column_type(column, value)}')
+        self.__read_columns(conn, classname)
+        # The upsert lists the columns: it must be built again
+        self.__statements.pop((classname, 'upsert'), None)
+        self.__create_indexes(conn, classname)
+
+    def __create_indexes(self, conn, classname):
+        """
+            Indexes the columns of a class's references and unique fields
+            (see find() and get_by()). Unique fields compared normalized are
+            indexed by their normalized value.
+        """
+        from model import classes
+
+        cls = classes.get(classname)
+        if cls is None:
+            return
+        for field in cls.indexed():
+            column = self.__column(cls, field)
+            if field in self.__tables[classname] and column is not None:
+                conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{classname}_{field}" '
+                    f'ON "{classname}" ({column})')
+
+    def __column(self, cls, field):
+        """
+            SQL expression of the (normalized) value of a field, or None if
+            SQLite can't normalize it like the model does
+        """
+        normalizer = cls.unique().get(field)
+        if normalizer is None:
+            return f'"{field}"'
+        function = self.sql_normalizers.get(normalizer)
+        return None if function is None else f'{function}("{field}")'
+
+    def __statement(self, classname, kind):
+        """
+            Returns the SQL of a statement. The strings are built once per
+            class so sqlite3's per-connection statement cache reuses the
+            prepared statement on every call.
+        """
+        sql = self.__statements.get((classname, kind))
+        if sql is None:
+            columns = self.__tables[classname]
+            if kind == 'upsert':
+                sql = (f'INSERT OR REPLACE INTO "{classname}" ('
+                       + ', '.join(f'"{c}"' for c in columns)
+                       + ') VALUES (' + ', '.join('?' for c in columns) + ')')
+            elif kind == 'delete':
+                sql = f'DELETE FROM "{classname}" WHERE id = ?'
+            elif kind == 'get':
+                sql = f'SELECT * FROM "{classname}" WHERE id = ?'
+            else:
+                sql = f'SELECT * FROM "{classname}"'
+            self.__statements[(classname, kind)] = sql
+        return sql
+
+    @staticmethod
+    def split_key(key):
+        """ Splits an object key into its class name and ID """
+        classname, _, id = key.partition('_')
+        return classname, id
+
+    def reload(self):
+        """
+            Discards the objects loaded in memory and any uncommitted
+            changes. Objects are read back from the database on demand.
+        """
+        with self.__lock:
+            for obj in list(self.__objects.values()):
+                obj.unobserve(self.__observer)
+            self.__objects = weakref.WeakValueDictionary()
+            # Objects added or changed since the last save, and objects
+            # removed since then
+            self.__dirty = {}
+            self.__removed = {}
+
+    def __load(self, classname, row):
+        """ Builds (or returns the already loaded) object of a row """
+        from model import classes
+
+        key = f"{classname}_{row['id']}"
+        with self.__lock:
+            if key in self.__removed:
+                return None
+            obj = self.__objects.get(key)
+            if obj is None:
+                record = dict(row)
+                for column in self.__json_columns.get(classname, ()):
+                    if record.get(column) is not None:
+                        record[column] = json.loads(record[column])
+                record['__class__'] = classname
+                obj = classes[classname].constructor(record)
+                obj.observe(self.__observer)
+                self.__objects[key] = obj
+        return obj
+
+    def add(self, object):
+        """ Adds an element to storage without committing changes """
+        if not isinstance(object, BaseModel):
+            raise TypeError("trying to add to storage an object"
+                            " that's not derived from BaseModel")
+        with self.__lock:
+            self.__log(object.key)
+            previous = self.__objects.get(object.key)
+            if previous is not None and previous is not object:
+                previous.unobserve(self.__observer)
+            self.__objects[object.key] = object
+            self.__dirty[object.key] = object
+            self.__removed.pop(object.key, None)
+            object.observe(self.__observer)
+
+    def remove(self, object):
+        """ Removes an object from storage if found. Doesn't save changes """
+        if not self.get(object.key):
+            return
+        with self.__lock:
+            obj = self.__objects.get(object.key)
+            if obj is None:
+                return
+            self.__log(object.key)
+            self.__removed[object.key] = self.__objects.pop(object.key)
+            self.__dirty.pop(object.key, None)
+            obj.unobserve(self.__observer)
+
+    @contextmanager
+    def transaction(self):
+        """
+            Defers the saves made inside the block to a single save at the
+            end of the outermost block, and undoes the changes made inside
+            the block if it raises
+        """
+        local = self.__transactions
+        outermost = getattr(local, 'undo', None) is None
+        if outermost:
+            local.undo = []
+            local.pending = False
+        undo = local.undo
+        savepoint = len(undo)
+
+        # Transactions of different threads run one at a time, and saves
+        # wait for them, so they never write half of a transaction
+        with self.__lock:
+            try:
+                yield self
+            except BaseException:
+                # Changes made while rolling back aren't logged
+                local.undo = None
+                try:
+                    for entry in reversed(undo[savepoint:]):
+                        self.__undo(entry)
+                finally:
+                    del undo[savepoint:]
+                    if not outermost:
+                        local.undo = undo
+                raise
+
+            if outermost:
+                local.undo = None
+                if local.pending:
+                    self.save()
+
+    def __log(self, key):
+        """
+            Logs what `key` holds (a loaded object, whether it was saved,
+            a removed one or nothing) before it's added or removed inside a
+            transaction
+        """
+        undo = getattr(self.__transactions, 'undo', None)
+        if undo is not None:
+            undo.append((key, self.__objects.get(key), key in self.__dirty,
+                         self.__removed.get(key)))
+
+    def __changed(self, obj, name, old):
+        """
+            Holds a changed object until it's saved, and logs the change
+            inside a transaction
+        """
+        with self.__lock:
+            self.__dirty[obj.key] = obj
+            undo = getattr(self.__transactions, 'undo', None)
+            if undo is not None:
+                undo.append((obj, name, old))
+
+    def __undo(self, entry):
+        """ Reverts a change logged inside a transaction """
+        # (object, attribute, old value) or (key, loaded, dirty, removed)
+        if isinstance(entry[0], BaseModel):
+            obj, name, old = entry
+            if old is MISSING:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, old)
+            return
+
+        key, loaded, dirty, removed = entry
+        current = self.__objects.pop(key, None)
+        if current is not None and current is not loaded:
+            current.unobserve(self.__observer)
+        self.__dirty.pop(key, None)
+        self.__removed.pop(key, None)
+        if loaded is not None:
+            self.__objects[key] = loaded
+            loaded.observe(self.__observer)
+            if dirty:
+                self.__dirty[key] = loaded
+        if removed is not None:
+            self.__removed[key] = removed
+
+    def save(self):
+        """ Writes the added, changed and removed objects in a transaction """
+        if getattr(self.__transactions, 'undo', None) is not None:
+            # Inside a transaction: saved once it ends
+            self.__transactions.pending = True
+            return
+
+        conn = self.__connection()
+        with self.__lock:
+            changed = {}
+            for obj in self.__dirty.values():
+                changed.setdefault(type(obj).__name__, []).append(obj.record)
+
+            for classname, records in changed.items():
+                self.__check_table(conn, classname, records)
+
+            with conn:
+                for classname, records in changed.items():
+                    columns = self.__tables[classname]
+                    conn.executemany(
+                        self.__statement(classname, 'upsert'),
+                        (tuple(
+                            json.dumps(record.get(column))
+                            if type(record.get(column)) is list
+                            else record.get(column)
+                            for column in columns
+                        ) for record in records))
+                for key in self.__removed:
+                    classname, id = self.split_key(key)
+                    if classname in self.__tables:
+                        conn.execute(
+                            self.__statement(classname, 'delete'), (id, ))
+
+            # Saved objects are only held while they're in use
+            self.__dirty = {}
+            self.__removed = {}
+
+    def get(self, key):
+        """ Get a specific element from storage """
+        with self.__lock:
+            obj = self.__objects.get(key)
+            if obj is not None:
+                return obj
+            if key in self.__removed:
+                return None
+
+        classname, id = self.split_key(key)
+        if classname not in self.__tables:
+            return None
+
+        row = self.__connection().execute(
+            self.__statement(classname, 'get'), (id, )).fetchone()
+        if row is None:
+            return None
+        return self.__load(classname, row)
+
+    def get_many(self, keys):
+        """ Dict of the objects found with the given keys """
+        objects = {}
+        missing = {}
+        with self.__lock:
+            for key in keys:
+                obj = self.__objects.get(key)
+                if obj is not None:
+                    objects[key] = obj
+                elif key not in self.__removed:
+                    classname, id = self.split_key(key)
+                    if classname in self.__tables:
+                        missing.setdefault(classname, []).append(id)
+
+        # One query per class (and per batch of ids, since SQLite limits
+        # the number of parameters of a statement)
+        conn = self.__connection()
+        for classname, ids in missing.items():
+            for i in range(0, len(ids), self.batch_size):
+                batch = ids[i:i + self.batch_size]
+                sql = (f'SELECT * FROM "{classname}" WHERE id IN ('
+                       + ', '.join('?' for id in batch) + ')')
+                for row in conn.execute(sql, batch):
+                    obj = self.__load(classname, row)
+                    if obj is not None:
+                        objects[obj.key] = obj
+        return objects
+
+    def get_by(self, classname, field, value):
+        """
+            Object of a class whose unique field holds `value` (compared
+            normalized), or None. Selected through the field's index.
+        """
+        objects = self.__select(classname, field, value)
+        if objects is None:
+            return super().get_by(classname, field, value)
+        return next(iter(objects.values()), None)
+
+    def find(self, classname, field, value):
+        """
+            Dict of the objects of a class whose field holds `value`
+            (compared normalized), selected by the database
+        """
+        objects = self.__select(classname, field, value)
+        if objects is None:
+            return super().find(classname, field, value)
+        return objects
+
+    def __select(self, classname, field, value):
+        """
+            Dict of the objects of a class whose field holds `value`
+            (compared normalized), selected by the database through the
+            field's index. None when the database can't compare them (the
+            class must be scanned): values that aren't numbers or text,
+            and text with other than ASCII characters in a field compared
+            normalized.
+        """
+        from model import classes
+
+        cls = classes[classname]
+        column = self.__column(cls, field)
+        if column is None or type(value) not in (str, int, float):
+            return None
+        if cls.unique().get(field) and type(value) is str and \
+                not value.isascii():
+            return None
+        value = cls.normalize(field, value)
+
+        objects = {}
+        if classname in self.__tables:
+            if field not in self.__tables[classname]:
+                return None
+            sql = f'SELECT * FROM "{classname}" WHERE {column} = ?'
+            for row in self.__connection().execute(sql, (value, )):
+                obj = self.__load(classname, row)
+                if obj is not None:
+                    objects[obj.key] = obj
+
+        # Objects may have changed since they were saved
+        with self.__lock:
+            for key, obj in self.__dirty.items():
+                if type(obj).__name__ != classname:
+                    continue
+                if cls.normalize(field, getattr(obj, field, None)) == value:
+                    objects[key] = obj
+                else:
+                    objects.pop(key, None)
+        return objects
+
+    def all(self, classname=None, limit=None, after=None):
+        """
+            Returns all elements of a specific class in storage, or a page
+            of them (see Persistance.all)
+        """
+        from model import classes
+
+        if limit is not None or after is not None:
+            self.check_page(limit, after)
+            objects = {}
+            for name, id in self.page_classes(classname, after):
+                if limit is not None and len(objects) == limit:
+                    break
+                objects.update(self.__page(
+                    name, id, None if limit is None else limit - len(objects)))
+            return objects
+
+        if not classname:
+            objects = {}
+            for name in classes:
+                objects.update(self.all(name))
+            return objects
+
+        objects = {}
+        if classname in self.__tables:
+            for row in self.__connection().execute(
+                    self.__statement(classname, 'all')):
+                obj = self.__load(classname, row)
+                if obj is not None:
+                    objects[obj.key] = obj
+
+        # Objects added or changed but not saved yet
+        with self.__lock:
+            for key, obj in self.__dirty.items():
+                if type(obj).__name__ == classname:
+                    objects[key] = obj
+        return objects
+
+    def __page(self, classname, after, limit):
+        """
+            The first `limit` objects of a class by key whose ID follows
+            `after`, selected by the database through the primary key
+        """
+        prefix = f"{classname}_"
+        with self.__lock:
+            # Objects added but not saved yet are merged into the page, and
+            # rows removed but not saved yet are skipped
+            objects = {
+                key: obj for key, obj in self.__dirty.items()
+                if type(obj).__name__ == classname and
+                (after is None or key > prefix + after)
+            }
+            removed = sum(key.startswith(prefix) for key in self.__removed)
+
+        if classname in self.__tables:
+            sql = f'SELECT * FROM "{classname}"'
+            params = []
+            if after is not None:
+                sql += ' WHERE id > ?'
+                params.append(after)
+            sql += ' ORDER BY id'
+            if limit is not None:
+                # Enough rows to fill the page after skipping removed ones
+                sql += ' LIMIT ?'
+                params.append(limit + removed)
+            for row in self.__connection().execute(sql, params):
+                obj = self.__load(classname, row)
+                if obj is not None:
+                    objects[obj.key] = obj
+
+        keys = sorted(objects) if limit is None else \
+            heapq.nsmallest(limit, objects)
+        return {key: objects[key] for key in keys}
@@ -3,89 +3,974 @@
     This module defines the FileStorage class for persisting
     objects to a file in JSON format.
 """
-import json
+import itertools
 import os
 import sys
+import threading
+import zlib
+from contextlib import contextmanager, nullcontext
+from persistance.commit import GroupCommit, WriteBehind
+from persistance.files import FileLock, write_atomically
+from persistance.indexes import Indexes
+from persistance.journal import Journal
 from persistance.persistance import Persistance
-from model.base import BaseModel
+from persistance.query import Query
+from persistance.rwlock import RWLock
+from persistance.serializers import JSONSerializer
+from model.base import BaseModel, MISSING
 
 
 class FileStorage(Persistance):
     """
         FileStorage class for persisting AirBnB objects
         in a file.
+
+        Each save() rewrites the file atomically (see persistance.files),
+        re-encoding only the objects that changed since the previous one.
+        Options:
+            - journal: save() appends the changes to `<filename>.journal`
+            instead (see persistance.journal), folded into the snapshot by
+            compact() every `compact_after` saves. `fsync` sets the
+            durability of appends and snapshots ('always', 'batch' or
+            'none')
+            - shards: one file per model class (or N per class), so save()
+            only rewrites the files holding changed objects
+            - serializer: format of the snapshot files (JSONSerializer by
+            default, see persistance.serializers)
+            - group_commit / write_behind: saves of several threads written
+            together, by one of them or by a writer thread (see
+            persistance.commit)
+            - lazy: objects are built the first time they're read
+            - shared: several processes use the same files, coordinated by
+            a lock file; is_stale() and refresh() follow their saves
+
+        Saves made inside `with storage.transaction():` are deferred to the
+        end of the outermost block, whose changes are undone if it raises.
+
+        Objects report their changes to storage, which keeps them indexed
+        (see persistance.indexes) for get_by, find, query, near, nearest,
+        within, search and pages of all. Reads run concurrently, while
+        changes and whole transactions hold a reader/writer lock
+        exclusively.
     """
+    fsync_modes = Journal.fsync_modes
 
-    def __init__(self, filename):
+    def __init__(self, filename, journal=False, fsync='always',
+                 fsync_batch=32, fsync_interval=1.0, compact_after=1000,
+                 lazy=False, shards=None, serializer=None, group_commit=0,
+                 write_behind=None, max_pending=1000, shared=False):
         if not filename:
             raise AttributeError('filename missing')
         if type(filename) is not str:
             raise TypeError('filename must be string')
+        if fsync not in self.fsync_modes:
+            raise ValueError(f'fsync must be one of {self.fsync_modes}')
+        if shards is not None and (type(shards) is not int or shards < 1):
+            raise ValueError('shards must be a positive int')
+        if type(max_pending) is not int or max_pending < 1:
+            raise ValueError('max_pending must be a positive int')
+        if shared and not FileLock.available:
+            raise ValueError('shared mode needs fcntl file locking')
         self.__filename = filename
+        self.__journal = None
+        if journal:
+            self.__journal = Journal(self.journal_filename, fsync,
+                                     fsync_batch, fsync_interval)
+        self.__fsync = fsync
+        self.__compact_after = compact_after
+        self.__lazy = lazy
+        self.__shards = shards
+        self.__serializer = serializer or JSONSerializer()
+        self.__commit_lock = threading.RLock()
+        self.__group_commit = None
+        if group_commit:
+            self.__group_commit = GroupCommit(self.__commit, group_commit)
+        self.__write_behind = None
+        if write_behind is not None:
+            self.__write_behind = WriteBehind(
+                self.__commit, write_behind, max_pending, self.close)
+        self.__hydrate_lock = threading.Lock()
+        # Readers (get, all, saves encoding the objects) share it, while
+        # changes (add, remove, reload, transactions) hold it exclusively
+        self.__lock = RWLock()
+        # Per-thread transaction state: the undo log of the changes made
+        # inside the transaction and whether a save was deferred
+        self.__local = threading.local()
+        # Objects in storage report their changes to this (a single bound
+        # method shared by all of them)
+        self.__observer = self.__changed
+        self.__indexes = Indexes()
+
+        # Shared mode: the lock file and the generation of the files last
+        # read or written
+        self.__file_lock = FileLock(self.lock_filename) if shared else None
+        self.__generation = 0
+
+        # Records as they are on disk (snapshot + journal). Only kept in
+        # journal, sharded and shared modes, where they're used to find
+        # what changed on save.
+        self.__tracked = journal or bool(shards) or shared
+        self.__persisted = {}
+        # key -> (record, record encoded by the serializer)
+        self.__encoded = {}
+        self.__journal_entries = 0
+        # Objects by class name (see __reload)
+        self.__classes = {}
+
+        self.reload()
+
+    @property
+    def journal_filename(self):
+        return f"{self.__filename}.journal"
+
+    @property
+    def lock_filename(self):
+        return f"{self.__filename}.lock"
 
-        if os.access(filename, os.R_OK):
-            self.reload()
-        else:
-            self.__objects = {}
+    def shard_filename(self, key):
+        """ Returns the file holding the object of `key` when sharded """
+        classname = key.partition('_')[0]
+        if self.__shards == 1:
+            return self.__shard_path(classname)
+        # crc32 rather than hash(): it must be the same in every process
+        shard = zlib.crc32(key.encode('utf-8')) % self.__shards
+        return self.__shard_path(classname, shard)
+
+    def __shard_path(self, classname, shard=None):
+        root, ext = os.path.splitext(self.__filename)
+        if shard is None:
+            return f"{root}.{classname}{ext}"
+        return f"{root}.{classname}.{shard}{ext}"
+
+    def snapshot_filenames(self):
+        """ Returns the files the snapshot of the objects is written to """
+        from model import classes
+
+        if not self.__shards:
+            return [self.__filename]
+        if self.__shards == 1:
+            return [self.__shard_path(classname) for classname in classes]
+        return [self.__shard_path(classname, shard)
+                for classname in classes for shard in range(self.__shards)]
 
     def reload(self):
         """ Reload all objects into the self.__objects field """
-        from model import classes
+        with self.__commit_lock, self.__locked(), self.__lock.write():
+            self.__reload()
+            if self.__file_lock is not None:
+                self.__generation = self.__file_lock.generation()
+
+    def __locked(self, exclusive=False):
+        """
+            Holds the lock file in shared mode (nothing otherwise). Must be
+            held with the commit lock.
+        """
+        if self.__file_lock is None:
+            return nullcontext()
+        return self.__file_lock.hold(exclusive)
+
+    def __bump_generation(self):
+        """ Tells other processes the files are about to change """
+        generation = self.__file_lock.generation()
+        if generation != self.__generation:
+            # Another process saved since the files were last read
+            with self.__lock.write():
+                self.__merge()
+        self.__generation = generation + 1
+        self.__file_lock.set_generation(self.__generation)
+
+    def is_stale(self):
+        """
+            Whether another process saved since the files were last read
+            or written. Always False unless shared.
+        """
+        if self.__file_lock is None:
+            return False
+        return self.__file_lock.generation() != self.__generation
+
+    def refresh(self):
+        """
+            Reloads the files if another process saved since they were last
+            read or written, keeping the changes that weren't saved yet.
+            Returns whether they were reloaded.
+        """
+        if not self.is_stale():
+            return False
+        with self.__commit_lock, self.__locked(), self.__lock.write():
+            self.__merge()
+            self.__generation = self.__file_lock.generation()
+        return True
+
+    def __merge(self):
+        """
+            Reloads the files and applies the changes that weren't saved
+            yet on top. Objects that didn't change on either side are kept.
+        """
+        objects = dict(self.__objects)
+        raw = self.__raw
+        persisted = self.__persisted
+        removed = [key for key in persisted
+                   if key not in objects and key not in raw]
+
+        self.__reload()
+        for key, obj in objects.items():
+            record = obj.record
+            theirs = self.__persisted.get(key)
+            if persisted.get(key) is not record:
+                # Changed (or added) here and not saved yet. The record on
+                # disk stays in __persisted, so it's written on save.
+                self.__put(key, obj)
+            elif theirs is not None and theirs == record:
+                self.__put(key, obj)
+                self.__persisted[key] = record
+
+        for key in removed:
+            theirs = self.__persisted.get(key)
+            self.__unload(key)
+            if theirs is not None:
+                self.__persisted[key] = theirs
+
+    def __put(self, key, obj):
+        """ Puts an object in place of whatever `key` holds """
+        classname = type(obj).__name__
+        current = self.__objects.get(key)
+        if current is not None:
+            self.__indexes.remove(key, current)
+            if current is not obj:
+                current.unobserve(self.__observer)
+        self.__discard((key, ))
+        self.__objects[key] = obj
+        self.__classes.setdefault(classname, {})[key] = obj
+        self.__indexes.add(key, obj)
+        obj.observe(self.__observer)
+
+    def __reload(self):
+        # The objects dropped must stop reporting their changes, or setting
+        # an attribute of one would move the fresh object's index entries
+        # (__merge observes again the ones it keeps)
+        for objects in self.__classes.values():
+            for obj in objects.values():
+                obj.unobserve(self.__observer)
 
         # Important that this is done before trying to read from file:
         # ensures that storage.__objects is empty if no filename when
         # storage.reload() is called
         self.__objects = {}
-        try:
-            with open(self.__filename, "r", encoding="utf-8") as f:
-                reload = json.load(f)
+        self.__classes = {}
+        self.__raw = {}
+        self.__raw_classes = {}
+        self.__persisted = {}
+        self.__encoded = {}
+        self.__indexes.clear()
+        self.__journal_entries = 0
+        binary = self.__serializer.binary
+        for filename in self.snapshot_filenames():
+            try:
+                # Records are read one at a time, so neither the text of the
+                # file nor all of its records are ever held in memory at once
+                with open(filename, "rb" if binary else "r",
+                          encoding=None if binary else "utf-8") as f:
+                    for key, value in self.__serializer.load(f):
+                        self.__load(key, value)
+
+            except FileNotFoundError:
+                pass
+
+        if self.__journal is not None:
+            self.__journal_entries = self.__journal.replay(self.__load,
+                                                           self.__unload)
+        self.__indexes.build_ranges(itertools.chain(self.__objects.items(),
+                                                    self.__raw.items()))
+
+    def __load(self, key, value):
+        """ Builds the object of a record (or keeps the record if lazy) """
+        from model import classes
+
+        classname = value['__class__']
+        self.__unload(key)
+        if self.__lazy:
+            self.__raw[key] = value
+            self.__raw_classes.setdefault(classname, {})[key] = value
+            self.__indexes.add(key, value)
+            if self.__tracked:
+                self.__persisted[key] = value
+            return
+
+        obj = classes[classname].constructor(value)
+        obj.observe(self.__observer)
+        self.__objects[key] = obj
+        self.__classes.setdefault(classname, {})[key] = obj
+        self.__indexes.add(key, obj)
+        if self.__tracked:
+            self.__persisted[key] = obj.record
 
-            for key, value in reload.items():
-                obj_cls = classes[value['__class__']]
-                self.__objects[key] = obj_cls.constructor(value)
+    def __unload(self, key):
+        """ Forgets a key loaded from file """
+        obj = self.__objects.pop(key, None)
+        if obj is not None:
+            del self.__classes[type(obj).__name__][key]
+            self.__indexes.remove(key, obj)
+        value = self.__raw.pop(key, None)
+        if value is not None:
+            del self.__raw_classes[value['__class__']][key]
+            self.__indexes.remove(key, value)
+        self.__persisted.pop(key, None)
 
-        except FileNotFoundError:
-            pass
+    def __hydrate(self, keys):
+        """ Builds the objects of the raw records with the given keys """
+        from model import classes
+
+        with self.__hydrate_lock:
+            for key in keys:
+                # Another thread may have built it in the meantime
+                value = self.__raw.pop(key, None)
+                if value is None:
+                    continue
+                classname = value['__class__']
+                del self.__raw_classes[classname][key]
+
+                obj = classes[classname].constructor(value)
+                obj.observe(self.__observer)
+                self.__objects[key] = obj
+                self.__classes.setdefault(classname, {})[key] = obj
+
+                # The object's record is usually the same as the one read
+                # from file: keep the JSON text and the journal state
+                cached = self.__encoded.get(key)
+                if cached is not None and cached[0] is value and \
+                        obj.record == value:
+                    self.__encoded[key] = (obj.record, cached[1])
+                if self.__persisted.get(key) is value and \
+                        obj.record == value:
+                    self.__persisted[key] = obj.record
+
+    def __items(self):
+        """
+            Lists the built objects and the raw records, safely from the
+            objects being built by a warm-up thread
+        """
+        with self.__lock.read(), self.__hydrate_lock:
+            return list(self.__objects.items()), list(self.__raw.items())
+
+    def __discard(self, keys):
+        """ Drops the raw records of some keys without building objects """
+        with self.__hydrate_lock:
+            for key in keys:
+                value = self.__raw.pop(key, None)
+                if value is not None:
+                    del self.__raw_classes[value['__class__']][key]
+                    self.__indexes.remove(key, value)
+
+    def version(self, classname):
+        """
+            Number that changes every time an object of the class is
+            added, removed or changed (0 until one is loaded or added), so
+            views built from the objects can tell they're out of date
+        """
+        return self.__indexes.version(classname)
+
+    def warm_up(self, classnames=None, background=True, batch=1000):
+        """
+            Builds the objects of the given classes (all classes by
+            default) in the given order without waiting for them to be
+            used. Returns the started thread when `background` is True.
+        """
+        if classnames is None:
+            classnames = list(self.__raw_classes)
+
+        def hydrate():
+            for classname in classnames:
+                keys = list(self.__raw_classes.get(classname, {}))
+                # Small batches so requests don't wait behind the warm-up
+                for i in range(0, len(keys), batch):
+                    with self.__lock.read():
+                        self.__hydrate(keys[i:i + batch])
+
+        if not background:
+            return hydrate()
+        thread = threading.Thread(target=hydrate, daemon=True)
+        thread.start()
+        return thread
 
     def add(self, object):
         """ Adds an element to storage without committing changes """
         if not isinstance(object, BaseModel):
             raise TypeError("trying to add to storage an object"
                             " that's not derived from BaseModel")
-        self.__objects[f"{type(object).__name__}_{object.id}"] = object
+        classname = type(object).__name__
+        key = f"{classname}_{object.id}"
+        with self.__lock.write():
+            self.__log(key)
+            if key in self.__raw:
+                self.__discard((key, ))
+            previous = self.__objects.get(key)
+            if previous is not None:
+                self.__indexes.remove(key, previous)
+                if previous is not object:
+                    previous.unobserve(self.__observer)
+            self.__objects[key] = object
+            self.__classes.setdefault(classname, {})[key] = object
+            self.__indexes.add(key, object)
+            object.observe(self.__observer)
+
+    def add_many(self, objects):
+        """ Adds several objects to storage without committing changes """
+        objects = list(objects)
+        self.check_objects(objects)
+        keys = [f"{type(obj).__name__}_{obj.id}" for obj in objects]
+        with self.__lock.write():
+            for key in keys:
+                self.__log(key)
+            self.__discard([key for key in keys if key in self.__raw])
+
+            batch = {}
+            for key, obj in zip(keys, objects):
+                previous = self.__objects.get(key)
+                if previous is not None:
+                    self.__indexes.remove(key, previous, batch)
+                    if previous is not obj:
+                        previous.unobserve(self.__observer)
+                self.__objects[key] = obj
+                self.__classes.setdefault(type(obj).__name__, {})[key] = obj
+                self.__indexes.add(key, obj, batch)
+                obj.observe(self.__observer)
+            self.__indexes.apply(batch)
+
+    @contextmanager
+    def transaction(self):
+        """
+            Defers the saves made inside the block to a single save at the
+            end of the outermost block, and undoes the changes made inside
+            the block if it raises
+        """
+        local = self.__local
+        outermost = getattr(local, 'undo', None) is None
+        if outermost:
+            local.undo = []
+            local.pending = False
+        undo = local.undo
+        savepoint = len(undo)
+
+        # Transactions of different threads run one at a time, and saves
+        # wait for them, so they never write half of a transaction
+        with self.__lock.write():
+            try:
+                yield self
+            except BaseException:
+                # Changes made while rolling back aren't logged
+                local.undo = None
+                try:
+                    for entry in reversed(undo[savepoint:]):
+                        self.__undo(entry)
+                finally:
+                    del undo[savepoint:]
+                    if not outermost:
+                        local.undo = undo
+                raise
+
+        if outermost:
+            local.undo = None
+            if local.pending:
+                self.save()
+
+    def __log(self, key):
+        """
+            Logs what `key` holds (an object, a raw record or nothing) before
+            it's added or removed inside a transaction
+        """
+        undo = getattr(self.__local, 'undo', None)
+        if undo is not None:
+            undo.append((key, self.__objects.get(key) or self.__raw.get(key)))
+
+    def __changed(self, obj, name, old):
+        """
+            Moves the object to the entry of its new value in the index of
+            the field set, and logs the change inside a transaction. Holds
+            the storage's lock, so other threads never see an index half
+            updated (changes made inside a transaction are only seen once
+            it ends)
+        """
+        # Called for every attribute set: acquired without the overhead
+        # of a context manager
+        self.__lock.acquire_write()
+        try:
+            self.__indexes.changed(obj, name, old)
+            undo = getattr(self.__local, 'undo', None)
+            if undo is not None:
+                undo.append((obj, name, old))
+        finally:
+            self.__lock.release_write()
+
+    def __undo(self, entry):
+        """ Reverts a change logged inside a transaction """
+        if len(entry) == 3:
+            obj, name, old = entry
+            self.__indexes.touch(type(obj).__name__)
+            if old is MISSING:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, old)
+            return
+
+        key, previous = entry
+        classname = key.partition('_')[0]
+        obj = self.__objects.pop(key, None)
+        if obj is not None:
+            del self.__classes[classname][key]
+            self.__indexes.remove(key, obj)
+            obj.unobserve(self.__observer)
+        self.__discard((key, ))
+
+        if isinstance(previous, BaseModel):
+            self.__put(key, previous)
+        elif previous is not None:
+            self.__raw[key] = previous
+            self.__raw_classes.setdefault(classname, {})[key] = previous
+            self.__indexes.add(key, previous)
 
     def save(self):
         """ Saves uncommitted changes """
+        if getattr(self.__local, 'undo', None) is not None:
+            # Inside a transaction: saved once it ends
+            self.__local.pending = True
+            return
+
+        if self.__write_behind is not None and self.__write_behind.save():
+            return
+        if self.__group_commit is not None:
+            return self.__group_commit.save()
+        return self.__commit()
+
+    def flush(self):
+        """
+            Waits until every save made so far is written, and synced in
+            'batch' mode
+        """
+        if self.__write_behind is not None:
+            self.__write_behind.flush()
+        self.sync()
+
+    def close(self):
+        """
+            Writes (and syncs) the pending saves and stops the writer
+            thread. Saves made afterwards are written right away.
+        """
+        if self.__write_behind is not None:
+            self.__write_behind.close()
+        self.sync()
+
+    def __commit(self):
+        """ Writes the changes to disk, one thread at a time """
+        with self.__commit_lock, self.__locked(exclusive=True):
+            if self.__file_lock is not None:
+                self.__bump_generation()
+            if self.__journal is not None:
+                return self.__append()
+            self.__write_snapshot()
+
+    def __write_snapshot(self):
+        """ Rewrites the snapshot file (or the changed shard files) """
+        fsync = self.__fsync != 'none'
         try:
+            if self.__shards:
+                self.__write_shards(fsync=fsync)
+
             # Verify there are objects to save. If an empty file is created
             # this will raise an error when we try to reload the objects.
-            if self.__objects:
-                obj_dict = {}
-                for key, value in self.__objects.items():
-                    obj_dict[key] = value.to_dict()
+            elif self.__objects or self.__raw:
+                encoded = {}
+                # Objects can't change while they're encoded, but they can
+                # while the file is written
+                with self.__lock.read():
+                    document = self.__encode(self.__records(), encoded)
+                self.__write(self.__filename, document, fsync)
+                self.__encoded = encoded
+                if self.__tracked:
+                    self.__persisted = {
+                        key: record for key, (record, part) in encoded.items()
+                    }
 
-                with open(self.__filename, "w", encoding="utf-8") as f:
-                    json.dump(obj_dict, f, indent=2)
+        except Exception:
+            sys.stderr.write("Couldn't write to file")
 
+    def __write(self, filename, document, fsync=False):
+        """ Atomically replaces `filename` with `document` """
+        write_atomically(filename, document, self.__serializer.binary, fsync)
+
+    def __records(self):
+        """ Iterates over the (key, record) pairs of every object """
+        objects, raw = self.__items()
+        return itertools.chain(
+            ((key, value.record) for key, value in objects), raw
+        )
+
+    def __encode(self, records, encoded):
+        """
+            Returns the document of `records`. Only the records that changed
+            since the last save are encoded again. The encoded form of each
+            record is stored in `encoded`.
+        """
+        parts = []
+        for key, record in records:
+            cached = self.__encoded.get(key)
+            if cached is None or cached[0] is not record:
+                cached = (record, self.__serializer.encode(key, record))
+            encoded[key] = cached
+            parts.append(cached[1])
+
+        return self.__serializer.document(parts)
+
+    def __write_shards(self, force=False, fsync=False):
+        """
+            Rewrites the shard files holding an object that was added,
+            changed or removed since they were last written (all of them
+            when `force` is True). Emptied shard files are deleted.
+        """
+        shards = {}
+        dirty = set()
+        documents = {}
+        encoded = {}
+        persisted = {}
+        with self.__lock.read():
+            for key, record in self.__records():
+                filename = self.shard_filename(key)
+                shards.setdefault(filename, {})[key] = record
+                persisted[key] = record
+                if force or self.__persisted.get(key) is not record:
+                    dirty.add(filename)
+            for key in self.__persisted.keys() - persisted.keys():
+                dirty.add(self.shard_filename(key))
+
+            for filename, records in shards.items():
+                if filename in dirty:
+                    documents[filename] = self.__encode(
+                        records.items(), encoded)
+
+        for filename, records in shards.items():
+            if filename in documents:
+                self.__write(filename, documents[filename], fsync)
+            else:
+                for key in records:
+                    if key in self.__encoded:
+                        encoded[key] = self.__encoded[key]
+
+        for filename in dirty - shards.keys():
+            if os.access(filename, os.F_OK):
+                os.remove(filename)
+
+        self.__encoded = encoded
+        self.__persisted = persisted
+
+    def __append(self):
+        """ Appends the records changed since the last save to the journal """
+        changed = {}
+        with self.__lock.read():
+            objects, raw = self.__items()
+            for key, value in objects:
+                # Records are cached until the object changes, so an
+                # unchanged object still holds the very record that was
+                # persisted
+                record = value.record
+                if self.__persisted.get(key) is not record:
+                    changed[key] = record
+            removed = [key for key in self.__persisted
+                       if key not in self.__objects and key not in self.__raw]
+
+        if not changed and not removed:
+            return
+
+        try:
+            self.__journal.append(changed, removed)
         except Exception:
             sys.stderr.write("Couldn't write to file")
+            return
+
+        self.__persisted.update(changed)
+        for key in removed:
+            del self.__persisted[key]
+        self.__journal_entries += 1
+
+        if self.__journal_entries >= self.__compact_after:
+            self.compact()
+
+    def sync(self):
+        """
+            Fsyncs the journal appends not synced yet (in 'batch' mode, the
+            others sync every append or leave it to the operating system)
+        """
+        if self.__journal is not None:
+            self.__journal.sync()
+
+    def compact(self):
+        """
+            Writes a full snapshot of the current objects and truncates
+            the journal. Only meaningful in journal mode.
+        """
+        with self.__commit_lock, self.__locked(exclusive=True):
+            if self.__file_lock is not None:
+                self.__bump_generation()
+            self.__compact()
+
+    def __compact(self):
+        """ Writes the snapshot and removes the journal it folds in """
+        fsync = self.__fsync != 'none'
+        try:
+            if self.__shards:
+                self.__write_shards(force=True, fsync=fsync)
+            else:
+                encoded = {}
+                with self.__lock.read():
+                    document = self.__encode(self.__records(), encoded)
+                self.__write(self.__filename, document, fsync)
+                self.__encoded = encoded
+
+            # Only drop the journal once the snapshot is on disk
+            if self.__journal is not None:
+                self.__journal.remove()
+
+        except Exception:
+            sys.stderr.write("Couldn't write to file")
+            return
+
+        self.__persisted = {
+            key: record for key, (record, text) in self.__encoded.items()
+        }
+        self.__journal_entries = 0
 
     def remove(self, object):
         """ Removes an object from storage if found. Doesn't save changes """
-        if self.__objects.get(f"{type(object).__name__}_{object.id}"):
-            del self.__objects[f"{type(object).__name__}_{object.id}"]
+        classname = type(object).__name__
+        key = f"{classname}_{object.id}"
+        with self.__lock.write():
+            self.__log(key)
+            if key in self.__raw:
+                self.__discard((key, ))
+            obj = self.__objects.pop(key, None)
+            if obj is not None:
+                del self.__classes[classname][key]
+                self.__indexes.remove(key, obj)
+                obj.unobserve(self.__observer)
+
+    def remove_many(self, objects):
+        """ Removes several objects from storage. Doesn't save changes """
+        keys = [f"{type(obj).__name__}_{obj.id}" for obj in objects]
+        with self.__lock.write():
+            for key in keys:
+                self.__log(key)
+            self.__discard([key for key in keys if key in self.__raw])
+
+            batch = {}
+            for key in keys:
+                obj = self.__objects.pop(key, None)
+                if obj is not None:
+                    del self.__classes[type(obj).__name__][key]
+                    self.__indexes.remove(key, obj, batch)
+                    obj.unobserve(self.__observer)
+            self.__indexes.apply(batch)
 
     def get(self, key):
         """ Get a specific element from storage """
-        return self.__objects.get(key)
-
-    def all(self, classname=None):
-        """ Returns all elements of a specific class in storage """
-        if not classname:
-            return self.__objects
-
-        return dict(
-                filter(
-                    lambda x: type(x[1]).__name__ == classname,
-                    self.__objects.items())
-                )
+        with self.__lock.read():
+            obj = self.__objects.get(key)
+            if obj is None and key in self.__raw:
+                self.__hydrate((key, ))
+                obj = self.__objects.get(key)
+            return obj
+
+    def get_many(self, keys):
+        """ Dict of the objects found with the given keys """
+        keys = list(keys)
+        with self.__lock.read():
+            raw = [key for key in keys if key in self.__raw]
+            if raw:
+                # Built in a single pass
+                self.__hydrate(raw)
+            objects = self.__objects
+            return {key: objects[key] for key in keys if key in objects}
+
+    def get_by(self, classname, field, value):
+        """
+            Object of a class whose unique field holds `value` (compared
+            normalized), or None. Answered from the field's index.
+        """
+        from model import classes
+
+        cls = classes.get(classname)
+        if cls is None or field not in cls.indexed():
+            return super().get_by(classname, field, value)
+        with self.__lock.read():
+            keys = self.__indexes.keys(cls, field, value)
+            return self.get(next(iter(keys))) if keys else None
+
+    def find(self, classname, field, value):
+        """
+            Dict of the objects of a class whose field holds `value`.
+            Indexed fields are answered in the time of the result's size.
+        """
+        from model import classes
+
+        cls = classes.get(classname)
+        if cls is None or field not in cls.indexed():
+            return super().find(classname, field, value)
+        with self.__lock.read():
+            return self.get_many(list(self.__indexes.keys(cls, field, value)))
+
+    def near(self, classname, latitude, longitude, km):
+        """
+            List of (object, distance in km) of the objects of a class
+            within `km` of a point, nearest first. Only the cells of the
+            spatial index around the point are searched.
+        """
+        geo = self.__geo_index(classname)
+        if geo is None:
+            return super().near(classname, latitude, longitude, km)
+        with self.__lock.read():
+            return self.__with_objects(geo.radius(latitude, longitude, km))
+
+    def nearest(self, classname, latitude, longitude, k):
+        """ List of (object, distance in km) of the `k` nearest objects """
+        geo = self.__geo_index(classname)
+        if geo is None:
+            return super().nearest(classname, latitude, longitude, k)
+        with self.__lock.read():
+            return self.__with_objects(geo.nearest(latitude, longitude, k))
+
+    def within(self, classname, south, west, north, east):
+        """
+            Dict of the objects of a class inside a bounding box. Boxes
+            whose west side is east of their east side cross the
+            antimeridian.
+        """
+        geo = self.__geo_index(classname)
+        if geo is None:
+            return super().within(classname, south, west, north, east)
+        with self.__lock.read():
+            return self.get_many(geo.box(south, west, north, east))
+
+    def search(self, classname, text, mode='and', limit=10):
+        """
+            List of (object, score) of the best `limit` objects of a class
+            whose text fields hold every word of `text` (mode 'and') or
+            any of them (mode 'or'), best first (BM25). Only the objects
+            returned are read.
+        """
+        from model import classes
+
+        if not classes[classname].text():
+            # Raises ValueError
+            return super().search(classname, text, mode, limit)
+        with self.__lock.read():
+            found = self.__indexes.text(classname).search(text, mode, limit)
+            return self.__with_objects(found)
+
+    def __geo_index(self, classname):
+        """ Spatial index of a class, None if its objects have no position """
+        from model import classes
+
+        if not classes[classname].position():
+            return None
+        return self.__indexes.geo(classname)
+
+    def __with_objects(self, found):
+        """
+            (object, distance or score) of a list of (distance or score,
+            key), in the same order
+        """
+        objects = self.get_many(key for value, key in found)
+        return [(objects[key], value) for value, key in found
+                if key in objects]
+
+    def query(self, classname, where=None, order_by=None, limit=None):
+        """
+            List of the objects of a class matching `where`, sorted by
+            `order_by` and at most `limit` of them (see Query). Only the
+            objects found through the chosen index are read (see explain).
+        """
+        from model import classes
+
+        query = Query(classes[classname], where, order_by, limit)
+        with self.__lock.read():
+            plan, keys = self.__plan(query)
+            if keys is None:
+                return query.select(self.all(classname).values())
+            objects = self.get_many(keys).values()
+            return query.select(objects, skip=plan['index'])
+
+    def explain(self, classname, where=None, order_by=None, limit=None):
+        """ Plan query() would follow with the same arguments """
+        from model import classes
+
+        query = Query(classes[classname], where, order_by, limit)
+        with self.__lock.read():
+            return self.__plan(query)[0]
+
+    def __plan(self, query):
+        """
+            Chooses how to run a query: through the index that selects the
+            fewest objects, or a scan of the class when no index applies
+            (or no index selects fewer objects). Returns the plan and the
+            keys to read (None for a scan).
+        """
+        best = query.plan('scan', self.count(query.cls.__name__)), None
+        for access, predicates, rows, fetch in self.__indexes.accesses(
+                query, self.__holds):
+            if rows < best[0]['rows']:
+                best = query.plan(access, rows, predicates), fetch
+        plan, fetch = best
+        return plan, fetch() if fetch else None
+
+    def __holds(self, key):
+        """ Whether storage holds `key` (as an object or a raw record) """
+        return key in self.__objects or key in self.__raw
+
+    def all(self, classname=None, limit=None, after=None):
+        """
+            Returns all elements of a specific class in storage, or a page
+            of them (see Persistance.all) read from the sorted index of
+            the IDs of each class
+        """
+        if limit is not None or after is not None:
+            return self.__page(classname, limit, after)
+
+        with self.__lock.read():
+            if not classname:
+                if self.__raw:
+                    self.__hydrate(list(self.__raw))
+                # A copy: other threads may add or remove objects while
+                # the caller iterates it
+                return dict(self.__objects)
+
+            if self.__raw_classes.get(classname):
+                self.__hydrate(list(self.__raw_classes[classname]))
+
+            # Objects are also kept partitioned by class, so this only
+            # touches the objects of the requested class
+            return dict(self.__classes.get(classname, {}))
+
+    def __page(self, classname, limit, after):
+        """ First `limit` objects (of a class) whose key follows `after` """
+        self.check_page(limit, after)
+        with self.__lock.read():
+            keys = []
+            for name, id in self.page_classes(classname, after):
+                if limit is not None and len(keys) == limit:
+                    break
+                index = self.__indexes.sorted(name, 'id')
+                if index is not None:
+                    keys += index.keys(
+                        low=id, low_inclusive=False,
+                        limit=None if limit is None else limit - len(keys))
+
+            # Only the records of the page are built (in lazy mode)
+            raw = [key for key in keys if key in self.__raw]
+            if raw:
+                self.__hydrate(raw)
+            return {key: self.__objects[key] for key in keys}
+
+    def count(self, classname=None):
+        """ Returns the number of objects (of a given class) in storage """
+        with self.__lock.read():
+            if not classname:
+                return len(self.__objects) + len(self.__raw)
+            return len(self.__classes.get(classname, {})) + \
+                len(self.__raw_classes.get(classname, {}))
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""
+    This module defines the file helpers of FileStorage: atomic writes
+    of its snapshot files, and the FileLock its shared mode coordinates
+    processes with.
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where shared mode can't be used
+    fcntl = None
+
+
+def write_atomically(filename, document, binary=False, fsync=False):
+    """
+        Replaces `filename` with `document`: it's written to a temporary
+        file that's then renamed over `filename`, so a crash leaves either
+        the old or the new file. With `fsync`, the file and the rename are
+        flushed to disk too (otherwise it's still safe against the process
+        dying, but not against the machine going down).
+    """
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_filename, "wb" if binary else "w",
+                  encoding=None if binary else "utf-8") as f:
+            f.write(document)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.access(tmp_filename, os.F_OK):
+            os.remove(tmp_filename)
+        raise
+
+    if fsync:
+        # The rename itself is only durable once the directory is
+        fsync_directory(filename)
+
+
+def fsync_directory(filename):
+    """ Fsyncs the directory of a file, making its renames durable """
+    try:
+        fd = os.open(os.path.dirname(filename) or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Not every platform can fsync a directory
+        pass
+    finally:
+        os.close(fd)
+
+
+class FileLock:
+    """
+        Lock file shared by the processes using the same storage files.
+        Saves lock it exclusively and reloads share it, and it holds a
+        generation number bumped by every save, so a process can tell
+        another one saved without reading the storage files.
+
+        Not thread-safe: it's meant to be used holding a lock of the
+        process (FileStorage's commit lock), which also makes hold()
+        reentrant.
+    """
+    # Whether the platform has the file locking it needs
+    available = fcntl is not None
+
+    def __init__(self, filename):
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        self.__file = os.fdopen(fd, "r+b", buffering=0)
+        # How many times the lock is held by this process
+        self.__held = 0
+
+    @contextmanager
+    def hold(self, exclusive=False):
+        """ Locks the file (shared unless `exclusive`) for the block """
+        if self.__held:
+            self.__held += 1
+            try:
+                yield
+            finally:
+                self.__held -= 1
+            return
+
+        fcntl.flock(self.__file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self.__held = 1
+        try:
+            yield
+        finally:
+            self.__held = 0
+            fcntl.flock(self.__file, fcntl.LOCK_UN)
+
+    def generation(self):
+        """ The generation number in the file """
+        data = os.pread(self.__file.fileno(), 32, 0)
+        try:
+            return int(data)
+        except ValueError:
+            # New lock file
+            return 0
+
+    def set_generation(self, generation):
+        """ Writes a new generation number (hold the lock exclusively) """
+        os.pwrite(self.__file.fileno(), str(generation).encode().ljust(20), 0)
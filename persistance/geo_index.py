@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+"""
+    This module defines the GeoIndex class, the spatial index
+    FileStorage keeps for the position (latitude and longitude) of the
+    models that declare one, and the haversine distance it orders
+    results by.
+"""
+import heapq
+import math
+
+# Mean radius of the Earth
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """ Great-circle distance in km between two points (in degrees) """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+
+def check_point(latitude, longitude):
+    """ Raises TypeError/ValueError unless it's a valid position """
+    for value in (latitude, longitude):
+        if type(value) not in (int, float):
+            raise TypeError('latitude and longitude must be numbers')
+    if not -90 <= latitude <= 90:
+        raise ValueError('latitude must be between -90 and 90')
+    if not -180 <= longitude <= 180:
+        raise ValueError('longitude must be between -180 and 180')
+
+
+class GeoIndex:
+    """
+        Grid of cells of `cell` degrees of side, each one holding the keys
+        (and positions) of the points inside it.
+
+        A query only visits the cells that overlap its bounding box (or
+        the cells holding points, when the box covers more cells than
+        that), and checks the points inside them:
+            - box: keys of the points inside a bounding box. Boxes whose
+            west side is east of their east side cross the antimeridian.
+            - radius: (distance, key) of the points within some km of a
+            point, nearest first
+            - nearest: (distance, key) of the k points nearest to a point,
+            nearest first (radius searches, doubling the radius until k
+            points are found)
+
+        Usage:
+            index.add('Place_<id>', -34.9, -56.16)
+            index.radius(-34.9, -56.2, 10)
+    """
+
+    def __init__(self, cell=0.1):
+        if type(cell) not in (int, float) or cell <= 0:
+            raise ValueError('cell must be a positive number of degrees')
+        self.__cell = cell
+        # (row, column) -> {key: (latitude, longitude)}
+        self.__cells = {}
+        # key -> (row, column)
+        self.__positions = {}
+
+    def __len__(self):
+        return len(self.__positions)
+
+    def __cell_of(self, latitude, longitude):
+        return (math.floor(latitude / self.__cell),
+                math.floor(longitude / self.__cell))
+
+    def add(self, key, latitude, longitude):
+        """ Adds a point (or moves it if the key is already indexed) """
+        self.remove(key)
+        cell = self.__cell_of(latitude, longitude)
+        self.__cells.setdefault(cell, {})[key] = (latitude, longitude)
+        self.__positions[key] = cell
+
+    def remove(self, key):
+        cell = self.__positions.pop(key, None)
+        if cell is not None:
+            points = self.__cells[cell]
+            del points[key]
+            if not points:
+                del self.__cells[cell]
+
+    def __points(self, south, west, north, east):
+        """ Yields (key, (latitude, longitude)) of the points in a box """
+        if west > east:
+            # Crosses the antimeridian
+            yield from self.__points(south, west, north, 180)
+            yield from self.__points(south, -180, north, east)
+            return
+
+        (low_row, low_col) = self.__cell_of(south, west)
+        (high_row, high_col) = self.__cell_of(north, east)
+        rows = range(low_row, high_row + 1)
+        cols = range(low_col, high_col + 1)
+        if len(rows) * len(cols) <= len(self.__cells):
+            cells = ((row, col) for row in rows for col in cols)
+        else:
+            cells = (cell for cell in self.__cells
+                     if cell[0] in rows and cell[1] in cols)
+
+        for cell in cells:
+            for key, (lat, lon) in self.__cells.get(cell, {}).items():
+                if south <= lat <= north and west <= lon <= east:
+                    yield key, (lat, lon)
+
+    def box(self, south, west, north, east):
+        """ Keys of the points inside a bounding box """
+        check_point(south, west)
+        check_point(north, east)
+        return [key for key, point in self.__points(south, west, north, east)]
+
+    def radius(self, latitude, longitude, km):
+        """ (distance, key) of the points within `km`, nearest first """
+        check_point(latitude, longitude)
+        if type(km) not in (int, float) or km < 0:
+            raise ValueError('km must be a non-negative number')
+
+        # Bounding box of the circle
+        delta = km / KM_PER_DEGREE
+        south, north = latitude - delta, latitude + delta
+        if south <= -90 or north >= 90:
+            # Reaches a pole: every longitude
+            west, east = -180, 180
+        else:
+            cos = min(math.cos(math.radians(south)),
+                      math.cos(math.radians(north)))
+            spread = delta / cos
+            if spread >= 180:
+                west, east = -180, 180
+            else:
+                west = longitude - spread
+                east = longitude + spread
+                if west < -180:
+                    west += 360
+                if east > 180:
+                    east -= 360
+        south, north = max(south, -90), min(north, 90)
+
+        found = []
+        for key, (lat, lon) in self.__points(south, west, north, east):
+            distance = haversine(latitude, longitude, lat, lon)
+            if distance <= km:
+                found.append((distance, key))
+        found.sort()
+        return found
+
+    def nearest(self, latitude, longitude, k):
+        """ (distance, key) of the `k` points nearest to a point """
+        check_point(latitude, longitude)
+        if type(k) is not int or k < 1:
+            raise ValueError('k must be a positive int')
+
+        km = self.__cell * KM_PER_DEGREE
+        # Half the circumference: no point is farther than that
+        while km < math.pi * EARTH_RADIUS_KM:
+            found = self.radius(latitude, longitude, km)
+            if len(found) >= k:
+                # Every point out of the circle is farther than these
+                return found[:k]
+            km *= 2
+        return heapq.nsmallest(k, (
+            (haversine(latitude, longitude, lat, lon), key)
+            for key, (lat, lon) in self.__points(-90, -180, 90, 180)))
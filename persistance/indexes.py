@@ -0,0 +1,306 @@
+#!/usr/bin/python3
+"""
+    This module defines the Indexes class, which keeps the indexes
+    FileStorage answers lookups and queries from.
+"""
+import itertools
+from collections import namedtuple
+from persistance.sorted_index import SortedIndex
+from persistance.geo_index import GeoIndex
+from persistance.text_index import TextIndex
+from model.base import BaseModel, MISSING
+
+# What the indexes of its class hold for an object (or a raw record)
+Indexed = namedtuple('Indexed', 'classname values ranges position text')
+
+
+def indexed_values(item):
+    """
+        Indexed values of an object (or of a raw record): its class name,
+        the (field, normalized value) pairs of its indexed fields, the
+        (field, value) pairs of its sorted fields (its ID and numeric
+        fields), its position and its text (None if its class has none)
+    """
+    if isinstance(item, BaseModel):
+        cls = type(item)
+
+        def get(field):
+            return getattr(item, field, None)
+    else:
+        from model import classes
+
+        cls = classes[item['__class__']]
+        get = item.get
+
+    values = []
+    for field in cls.indexed():
+        value = get(field)
+        if value is not None:
+            values.append((field, cls.normalize(field, value)))
+    # IDs are kept sorted too, for pages (see FileStorage.all)
+    ranges = [('id', get('id'))] if type(get('id')) is str else []
+    for field in cls.ranges():
+        value = get(field)
+        if type(value) in (int, float):
+            ranges.append((field, value))
+    position = tuple(get(field) for field in cls.position()) or None
+    if position and any(type(value) not in (int, float)
+                        for value in position):
+        position = None
+    text = None
+    if cls.text():
+        text = '\n'.join(get(field) or '' for field in cls.text())
+    return Indexed(cls.__name__, values, ranges, position, text)
+
+
+class Indexes:
+    """
+        Indexes of the objects (and raw records) of each model class, by
+        key:
+            - a hash of the normalized values of the unique fields and
+            references (see BaseModel.indexed) to the keys holding them
+            - a SortedIndex of the IDs and of the numeric fields (see
+            BaseModel.ranges), built at once by build_ranges()
+            - a GeoIndex of the positions (see BaseModel.position)
+            - a TextIndex of the text fields (see BaseModel.text)
+
+        It also keeps a version of each class, changed whenever the
+        indexes of its objects are. Not thread-safe: FileStorage only
+        updates it holding its lock exclusively.
+    """
+    range_operators = ('==', '<', '<=', '>', '>=')
+
+    def __init__(self):
+        # Versions are never repeated, even across clear()
+        self.__next_version = itertools.count(1)
+        self.clear()
+
+    def clear(self):
+        """ Drops every entry, before the objects are loaded again """
+        self.__hashes = {}
+        # Built once every record is loaded (see build_ranges)
+        self.__ranges = None
+        self.__geo = {}
+        self.__text = {}
+        self.__versions = {}
+
+    def add(self, key, item, batch=None):
+        """
+            Adds the key of an object (or of a raw record) to the indexes
+            of its class, under the values of its indexed fields. Sorted
+            index entries are left in `batch` if given (see apply).
+        """
+        indexed = indexed_values(item)
+        classname = indexed.classname
+        self.touch(classname)
+        hashes = self.__hashes.setdefault(classname, {})
+        for field, value in indexed.values:
+            hashes.setdefault(field, {}).setdefault(value, {})[key] = None
+        if batch is not None:
+            for field, value in indexed.ranges:
+                batch.setdefault((classname, field), {})[value, key] = True
+        elif self.__ranges is not None:
+            for field, value in indexed.ranges:
+                self.__range_index(classname, field).add(value, key)
+        if indexed.position is not None:
+            self.__geo.setdefault(classname, GeoIndex()).add(
+                key, *indexed.position)
+        if indexed.text is not None:
+            self.__text.setdefault(classname, TextIndex()).add(
+                key, indexed.text)
+
+    def remove(self, key, item, batch=None):
+        """ Removes the key of an object (or of a raw record) from them """
+        indexed = indexed_values(item)
+        classname = indexed.classname
+        self.touch(classname)
+        for field, value in indexed.values:
+            self.__drop(classname, field, value, key)
+        if batch is not None:
+            for field, value in indexed.ranges:
+                batch.setdefault((classname, field), {})[value, key] = False
+        elif self.__ranges is not None:
+            for field, value in indexed.ranges:
+                self.__range_index(classname, field).remove(value, key)
+        if classname in self.__geo:
+            self.__geo[classname].remove(key)
+        if classname in self.__text:
+            self.__text[classname].remove(key)
+
+    def apply(self, batch):
+        """
+            Applies the sorted index entries left by a batch of changes:
+            {(classname, field): {(value, key): whether it was added last}}
+        """
+        if self.__ranges is None:
+            return
+        for (classname, field), entries in batch.items():
+            index = self.__range_index(classname, field)
+            index.remove_many(entries)
+            index.add_many(entry for entry, added in entries.items() if added)
+
+    def build_ranges(self, items):
+        """
+            Builds the sorted indexes of the loaded (key, object or record)
+            pairs at once (sorting them is faster than inserting them one
+            by one)
+        """
+        entries = {}
+        for key, item in items:
+            indexed = indexed_values(item)
+            for field, value in indexed.ranges:
+                entries.setdefault(indexed.classname, {}).setdefault(
+                    field, []).append((value, key))
+        self.__ranges = {
+            classname: {
+                field: SortedIndex(items) for field, items in fields.items()
+            }
+            for classname, fields in entries.items()
+        }
+
+    def changed(self, obj, name, old):
+        """
+            Moves an object to the entry of its new value in the index of
+            the attribute set (`name`, whose previous value was `old`)
+        """
+        cls = type(obj)
+        classname = cls.__name__
+        self.touch(classname)
+        field = cls.field_name(name)
+        if field in cls.indexed():
+            key = obj.key
+            if old is not MISSING and old is not None:
+                self.__drop(classname, field, cls.normalize(field, old), key)
+            value = getattr(obj, field, None)
+            if value is not None:
+                self.__hashes.setdefault(classname, {}).setdefault(
+                    field, {}).setdefault(
+                    cls.normalize(field, value), {})[key] = None
+        elif field in cls.ranges() and self.__ranges is not None:
+            index = self.__range_index(classname, field)
+            if type(old) in (int, float):
+                index.remove(old, obj.key)
+            value = getattr(obj, field, None)
+            if type(value) in (int, float):
+                index.add(value, obj.key)
+        elif field in cls.text():
+            self.__text.setdefault(classname, TextIndex()).add(
+                obj.key, indexed_values(obj).text)
+        elif field in cls.position():
+            geo = self.__geo.setdefault(classname, GeoIndex())
+            position = [getattr(obj, name, None) for name in cls.position()]
+            if all(type(value) in (int, float) for value in position):
+                geo.add(obj.key, *position)
+            else:
+                geo.remove(obj.key)
+
+    def touch(self, classname):
+        """ Gives a class a new version: its objects changed """
+        self.__versions[classname] = next(self.__next_version)
+
+    def version(self, classname):
+        """ Version of a class (0 until one of its objects is indexed) """
+        return self.__versions.get(classname, 0)
+
+    def keys(self, cls, field, value):
+        """ Keys under a (normalized) value in the index of a field """
+        return self.__hashes.get(cls.__name__, {}).get(field, {}).get(
+            cls.normalize(field, value), {})
+
+    def sorted(self, classname, field):
+        """ Sorted index of the IDs or a numeric field of a class, or None """
+        return (self.__ranges or {}).get(classname, {}).get(field)
+
+    def geo(self, classname):
+        """ Spatial index of a class (empty if nothing was indexed yet) """
+        return self.__geo.get(classname) or GeoIndex()
+
+    def text(self, classname):
+        """ Text index of a class (empty if nothing was indexed yet) """
+        return self.__text.get(classname) or TextIndex()
+
+    def accesses(self, query, exists):
+        """
+            Yields the indexes that can answer predicates of a query: the
+            access, the predicates answered, the number of objects selected
+            and a function returning their keys. `exists(key)` tells
+            whether storage holds a key (for predicates on the ID).
+        """
+        cls = query.cls
+        for predicate in query.predicates:
+            keys = self.__lookup(cls, predicate, exists)
+            if keys is not None:
+                access = 'key' if predicate[0] == 'id' else 'hash index'
+                yield access, [predicate], len(keys), lambda k=keys: k
+
+        # The range predicates of a field are answered together
+        for field in cls.ranges():
+            index = self.sorted(cls.__name__, field)
+            predicates = [
+                (name, op, value) for name, op, value in query.predicates
+                if name == field and op in self.range_operators and
+                type(value) in (int, float)
+            ]
+            if index is None or not predicates:
+                continue
+            bounds = self.range_bounds(predicates)
+            yield 'range index', predicates, index.count(**bounds), \
+                lambda index=index, bounds=bounds: index.keys(**bounds)
+
+    @staticmethod
+    def range_bounds(predicates):
+        """ Tightest bounds of a field's range predicates (SortedIndex) """
+        low = high = None
+        low_inclusive = high_inclusive = True
+        for field, op, value in predicates:
+            if op in ('==', '>', '>=') and (
+                    low is None or value > low or
+                    (value == low and op == '>')):
+                low, low_inclusive = value, op != '>'
+            if op in ('==', '<', '<=') and (
+                    high is None or value < high or
+                    (value == high and op == '<')):
+                high, high_inclusive = value, op != '<'
+        return {'low': low, 'high': high, 'low_inclusive': low_inclusive,
+                'high_inclusive': high_inclusive}
+
+    def __lookup(self, cls, predicate, exists):
+        """
+            Keys selected by the key or hash index that answers a predicate,
+            or None if none answers it
+        """
+        field, op, value = predicate
+        if op not in ('==', 'in'):
+            return None
+        values = (value, ) if op == '==' else value
+
+        classname = cls.__name__
+        if field == 'id':
+            keys = [f"{classname}_{id}" for id in values]
+            return [key for key in dict.fromkeys(keys) if exists(key)]
+
+        if field not in cls.indexed():
+            return None
+        index = self.__hashes.get(classname, {}).get(field, {})
+        keys = {}
+        for value in values:
+            try:
+                keys.update(index.get(value, {}))
+            except TypeError:
+                # Unhashable values aren't in the index
+                pass
+        return list(keys)
+
+    def __range_index(self, classname, field):
+        """ Sorted index of a numeric field """
+        return self.__ranges.setdefault(classname, {}).setdefault(
+            field, SortedIndex())
+
+    def __drop(self, classname, field, value, key):
+        """ Removes a key from the entry of a value in a hash index """
+        index = self.__hashes.get(classname, {}).get(field, {})
+        keys = index.get(value)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del index[value]
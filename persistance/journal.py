@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+"""
+    This module defines the Journal class, the append-only log of the
+    changes FileStorage saves in journal mode.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+
+class Journal:
+    """
+        JSON lines file with an entry per save: the records set and the
+        keys removed since the previous one. It's replayed on top of the
+        snapshot it follows, and removed once a new snapshot holds it.
+
+        `fsync` sets the durability of appends:
+            - 'always': fsync after every append
+            - 'batch': fsync every `batch` appends or every `interval`
+            seconds, whichever comes first (a timer syncs the last appends
+            when no other append follows them, and sync() syncs them right
+            away)
+            - 'none': leave flushing to the operating system
+    """
+    fsync_modes = ('always', 'batch', 'none')
+
+    def __init__(self, filename, fsync='always', batch=32, interval=1.0):
+        self.filename = filename
+        self.__fsync = fsync
+        self.__batch = batch
+        self.__interval = interval
+        # Appends and syncs (the timer's too) run one at a time
+        self.__lock = threading.Lock()
+        self.__unsynced = 0
+        self.__last_sync = time.monotonic()
+        # Batch mode: fsyncs the appends no append synced in time
+        self.__timer = None
+
+    def replay(self, load, unload):
+        """
+            Calls `load(key, record)` for the records set by each entry and
+            `unload(key)` for the keys it removed. Returns the number of
+            entries replayed.
+        """
+        entries = 0
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line means the process died while
+                        # appending: that save was never acknowledged
+                        break
+                    for key, value in entry['set'].items():
+                        load(key, value)
+                    for key in entry['del']:
+                        unload(key)
+                    entries += 1
+
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def append(self, changed, removed):
+        """
+            Appends an entry with the records changed ({key: record}) and
+            the keys removed. Raises OSError if it can't be written.
+        """
+        line = json.dumps({'set': changed, 'del': removed})
+        with self.__lock:
+            with open(self.filename, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                self.__unsynced += 1
+                if self.__should_sync():
+                    os.fsync(f.fileno())
+                    self.__unsynced = 0
+                    self.__last_sync = time.monotonic()
+                elif self.__fsync == 'batch':
+                    self.__sync_later()
+
+    def __should_sync(self):
+        """ Whether the entry just appended must be fsynced """
+        if self.__fsync == 'always':
+            return True
+        if self.__fsync == 'batch':
+            return self.__unsynced >= self.__batch or \
+                time.monotonic() - self.__last_sync >= self.__interval
+        return False
+
+    def __sync_later(self):
+        """
+            Schedules an fsync of the entries not synced yet for when
+            `interval` has passed since the last one, in case no other
+            append comes by then
+        """
+        if self.__timer is not None:
+            return
+        delay = self.__last_sync + self.__interval - time.monotonic()
+        self.__timer = threading.Timer(max(delay, 0), self.sync)
+        self.__timer.daemon = True
+        self.__timer.start()
+        # The timer doesn't keep the process alive: sync at exit instead
+        atexit.register(self.sync)
+
+    def sync(self):
+        """
+            Fsyncs the entries not synced yet (in 'batch' mode, the others
+            sync every append or leave it to the operating system)
+        """
+        with self.__lock:
+            timer, self.__timer = self.__timer, None
+            if timer is not None:
+                timer.cancel()
+                atexit.unregister(self.sync)
+            if self.__fsync != 'batch' or not self.__unsynced:
+                return
+            try:
+                # Not created if removed meanwhile
+                fd = os.open(self.filename, os.O_WRONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                sys.stderr.write("Couldn't write to file")
+                return
+            self.__unsynced = 0
+            self.__last_sync = time.monotonic()
+
+    def remove(self):
+        """ Deletes the file, once a snapshot holds its entries """
+        with self.__lock:
+            if os.access(self.filename, os.F_OK):
+                os.remove(self.filename)
+            self.__unsynced = 0
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+"""
+    This module defines an incremental parser for files holding
+    a single JSON object, like the ones written by FileStorage.
+"""
+import json
+import re
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+VALUE_START = '{["-0123456789tfn'
+
+
+def iter_items(f, chunk_size=1 << 16):
+    """
+        Yields the (key, value) pairs of the top-level JSON object in the
+        text file `f`, reading it `chunk_size` characters at a time.
+        Only the pair being parsed is held in memory, never the whole
+        document, so the memory needed doesn't grow with the file size.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def skip(buffer, pos):
+        return WHITESPACE.match(buffer, pos).end()
+
+    def read(buffer, pos):
+        """ Drops the consumed text and appends the next chunk """
+        chunk = f.read(chunk_size)
+        return buffer[pos:] + chunk, 0, not chunk
+
+    def decode(buffer, pos, eof):
+        """
+            Decodes the value starting at `pos`, reading more chunks until
+            it's complete. A value that ends right at the end of the buffer
+            may be cut short (e.g. a number), so it's parsed again with more
+            text unless the file is over.
+        """
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    return value, end, buffer, eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            buffer, pos, eof = read(buffer, pos)
+
+    def expect(buffer, pos, eof, chars):
+        """ Returns the position of the next character, one of `chars` """
+        pos = skip(buffer, pos)
+        while pos == len(buffer) and not eof:
+            buffer, pos, eof = read(buffer, pos)
+            pos = skip(buffer, pos)
+        if pos == len(buffer) or buffer[pos] not in chars:
+            raise json.JSONDecodeError(
+                f"Expecting one of {chars!r}", buffer, pos)
+        return buffer, pos, eof
+
+    buffer, pos, eof = read(buffer, pos)
+    if not buffer.strip() and eof:
+        return
+
+    buffer, pos, eof = expect(buffer, pos, eof, '{')
+    pos += 1
+    buffer, pos, eof = expect(buffer, pos, eof, '"}')
+    if buffer[pos] == '}':
+        return
+
+    while True:
+        key, pos, buffer, eof = decode(buffer, pos, eof)
+        buffer, pos, eof = expect(buffer, pos, eof, ':')
+        buffer, pos, eof = expect(buffer, pos + 1, eof, VALUE_START)
+        value, pos, buffer, eof = decode(buffer, pos, eof)
+        yield key, value
+
+        buffer, pos, eof = expect(buffer, pos, eof, ',}')
+        if buffer[pos] == '}':
+            return
+        buffer, pos, eof = expect(buffer, pos + 1, eof, '"')
+
+        # Drop what was already parsed once it's bigger than a chunk
+        if pos > chunk_size:
+            buffer, pos = buffer[pos:], 0
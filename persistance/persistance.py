@@ -4,7 +4,11 @@
     (FileStorage and DataBaseStorage).
 """
 
+import heapq
 from abc import ABC, abstractmethod
+from persistance.query import Query
+from persistance.geo_index import check_point, haversine
+from persistance.text_index import TextIndex
 
 
 class Persistance(ABC):
@@ -38,6 +42,243 @@ class Persistance(ABC):
         pass
 
     @abstractmethod
-    def all(self, cls):
-        """ Get all objects or all objects of a given class in storage """
+    def all(self, cls=None, limit=None, after=None):
+        """
+            Get all objects or all objects of a given class in storage.
+            Given `limit` or `after`, only a page of them: the first
+            `limit` objects by key whose key follows `after` (the last key
+            of the previous page).
+        """
         pass
+
+    def iter(self, cls=None, batch=100):
+        """
+            Yields the objects (of a given class) by key, reading them a
+            page of `batch` objects at a time. Pages start after the last
+            key read, so objects added or removed meanwhile don't make
+            others be skipped or seen twice.
+        """
+        if type(batch) is not int or batch < 1:
+            raise ValueError('batch must be a positive int')
+        after = None
+        while True:
+            page = self.all(cls, limit=batch, after=after)
+            yield from page.values()
+            if len(page) < batch:
+                return
+            after = next(reversed(page))
+
+    @staticmethod
+    def check_page(limit, after):
+        """ Raises TypeError/ValueError unless they're a valid page """
+        if limit is not None and (type(limit) is not int or limit < 0):
+            raise ValueError('limit must be a non-negative int')
+        if after is not None and type(after) is not str:
+            raise TypeError('after must be the key of an object')
+
+    @staticmethod
+    def page_classes(classname, after):
+        """
+            Yields (class name, id) for each class (all of them or the one
+            given) holding keys that follow `after`, in key order, with the
+            ID their keys must follow (None if all of them do)
+        """
+        from model import classes
+
+        if classname:
+            names = [classname]
+        else:
+            # Keys are '<class name>_<id>'
+            names = sorted(classes, key=lambda name: name + '_')
+        for name in names:
+            prefix = name + '_'
+            if after is None or after < prefix:
+                yield name, None
+            elif after.startswith(prefix):
+                yield name, after[len(prefix):]
+
+    def count(self, cls=None):
+        """ Number of objects or of objects of a given class in storage """
+        return len(self.all(cls))
+
+    @abstractmethod
+    def transaction(self):
+        """
+            Context in which the saves made inside the block are deferred
+            to a single one, and the changes made inside it are undone if
+            it raises. The services rely on it to apply their changes
+            atomically.
+        """
+        pass
+
+    def flush(self):
+        """ Waits until the saved changes are written. Nothing by default """
+        pass
+
+    def add_many(self, objects):
+        """ Adds several objects to the storage. Changes aren't committed """
+        objects = list(objects)
+        self.check_objects(objects)
+        for obj in objects:
+            self.add(obj)
+
+    def version(self, classname):
+        """
+            Number that changes every time an object of the class is
+            added, removed or changed, or None for storages that don't
+            follow the changes of their objects (views built from them
+            can't tell whether they're up to date)
+        """
+        return None
+
+    def get_many(self, keys):
+        """ Dict of the objects found with the given keys """
+        objects = {}
+        for key in keys:
+            obj = self.get(key)
+            if obj is not None:
+                objects[key] = obj
+        return objects
+
+    def get_by(self, classname, field, value):
+        """
+            Object of a class whose unique field holds `value` (compared
+            normalized), or None. Storages without indexes scan the class.
+        """
+        from model import classes
+
+        cls = classes[classname]
+        value = cls.normalize(field, value)
+        for obj in self.all(classname).values():
+            if cls.normalize(field, getattr(obj, field, None)) == value:
+                return obj
+        return None
+
+    def find(self, classname, field, value):
+        """
+            Dict of the objects of a class whose field holds `value`
+            (compared normalized). Storages without indexes scan the class.
+        """
+        from model import classes
+
+        cls = classes[classname]
+        value = cls.normalize(field, value)
+        return {
+            key: obj for key, obj in self.all(classname).items()
+            if cls.normalize(field, getattr(obj, field, None)) == value
+        }
+
+    def near(self, classname, latitude, longitude, km):
+        """
+            List of (object, distance in km) of the objects of a class
+            within `km` of a point, nearest first. Storages without a
+            spatial index scan the class.
+        """
+        check_point(latitude, longitude)
+        if type(km) not in (int, float) or km < 0:
+            raise ValueError('km must be a non-negative number')
+        found = [(obj, distance)
+                 for obj, distance in self.__distances(classname, latitude,
+                                                       longitude)
+                 if distance <= km]
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def nearest(self, classname, latitude, longitude, k):
+        """ List of (object, distance in km) of the `k` nearest objects """
+        check_point(latitude, longitude)
+        if type(k) is not int or k < 1:
+            raise ValueError('k must be a positive int')
+        return heapq.nsmallest(
+            k, self.__distances(classname, latitude, longitude),
+            key=lambda item: item[1])
+
+    def within(self, classname, south, west, north, east):
+        """
+            Dict of the objects of a class inside a bounding box. Boxes
+            whose west side is east of their east side cross the
+            antimeridian.
+        """
+        check_point(south, west)
+        check_point(north, east)
+        lat_field, lon_field = self.position_fields(classname)
+        found = {}
+        for key, obj in self.all(classname).items():
+            lat = getattr(obj, lat_field)
+            lon = getattr(obj, lon_field)
+            inside = west <= lon <= east if west <= east else \
+                lon >= west or lon <= east
+            if south <= lat <= north and inside:
+                found[key] = obj
+        return found
+
+    def search(self, classname, text, mode='and', limit=10):
+        """
+            List of (object, score) of the best `limit` objects of a class
+            whose text fields hold every word of `text` (mode 'and') or any
+            of them (mode 'or'), best first (BM25). Storages without a
+            full-text index index the whole class for each search.
+        """
+        from model import classes
+
+        fields = classes[classname].text()
+        if not fields:
+            raise ValueError(f'{classname} objects have no text fields')
+        objects = self.all(classname)
+        index = TextIndex()
+        for key, obj in objects.items():
+            index.add(key, '\n'.join(
+                getattr(obj, field) or '' for field in fields))
+        return [(objects[key], score)
+                for score, key in index.search(text, mode, limit)]
+
+    @staticmethod
+    def position_fields(classname):
+        """ (latitude, longitude) fields of a class. ValueError if none """
+        from model import classes
+
+        position = classes[classname].position()
+        if not position:
+            raise ValueError(f'{classname} objects have no position')
+        return position
+
+    def __distances(self, classname, latitude, longitude):
+        """ Yields (object, distance in km) of the objects of a class """
+        lat_field, lon_field = self.position_fields(classname)
+        for obj in self.all(classname).values():
+            yield obj, haversine(latitude, longitude,
+                                 getattr(obj, lat_field),
+                                 getattr(obj, lon_field))
+
+    def query(self, classname, where=None, order_by=None, limit=None):
+        """
+            List of the objects of a class matching `where`, sorted by
+            `order_by` and at most `limit` of them (see Query). Storages
+            without indexes scan the class.
+        """
+        from model import classes
+
+        query = Query(classes[classname], where, order_by, limit)
+        return query.select(self.all(classname).values())
+
+    def explain(self, classname, where=None, order_by=None, limit=None):
+        """ Plan query() would follow with the same arguments """
+        from model import classes
+
+        query = Query(classes[classname], where, order_by, limit)
+        return query.plan('scan', self.count(classname))
+
+    def remove_many(self, objects):
+        """ Removes several objects from the storage if found """
+        for obj in list(objects):
+            self.remove(obj)
+
+    @staticmethod
+    def check_objects(objects):
+        """ Raises TypeError unless every object derives from BaseModel """
+        from model.base import BaseModel
+
+        for obj in objects:
+            if not isinstance(obj, BaseModel):
+                raise TypeError("trying to add to storage an object"
+                                " that's not derived from BaseModel")
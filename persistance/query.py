@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+"""
+    This module defines the Query class: the filters, sorting and limit
+    of a storage.query() over the objects of a model class, and the plans
+    the storages describe with explain().
+
+    Usage:
+        storage.query('Place', where={
+            'city': city_id,
+            'price_per_night': {'>=': 50, '<=': 120},
+            'host': {'in': [host_id, other_host_id]}
+        }, order_by='-price_per_night', limit=10)
+"""
+import heapq
+import itertools
+import operator
+
+
+def contains(value, values):
+    return value in values
+
+
+class Query:
+    """
+        Query over the objects of a model class.
+        Attrs:
+            - cls: model class queried
+            - predicates: list of (field, operator, value). A value in
+            `where` is an equality, a dict maps operators to values: '==',
+            '!=', '<', '<=', '>', '>=' and 'in' (a list of values).
+            Values are compared normalized (see BaseModel.normalize).
+            - order: list of (field, descending) from `order_by`, a field
+            name (descending if it starts with '-') or a list of them
+            - limit: maximum number of objects returned, or None
+
+        Methods:
+            - matches: Whether an object satisfies every predicate
+            - select: Filters, sorts and limits objects
+            - plan: Description of how a storage runs the query
+    """
+    operators = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        'in': contains,
+    }
+
+    def __init__(self, cls, where=None, order_by=None, limit=None):
+        if where is None:
+            where = {}
+        if type(where) is not dict:
+            raise TypeError('where must be a dict of field conditions')
+        if limit is not None and (type(limit) is not int or limit < 0):
+            raise ValueError('limit must be a non-negative int')
+
+        self.cls = cls
+        self.fields = ('id', 'created_at', 'updated_at', *cls.required())
+        self.predicates = []
+        for field, condition in where.items():
+            self.check_field(field)
+            if type(condition) is not dict:
+                condition = {'==': condition}
+            for op, value in condition.items():
+                self.predicates.append(self.predicate(field, op, value))
+
+        if order_by is None:
+            order_by = []
+        elif type(order_by) is str:
+            order_by = [order_by]
+        self.order = []
+        for field in order_by:
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            self.check_field(field)
+            self.order.append((field, descending))
+        self.limit = limit
+
+    def check_field(self, field):
+        if field not in self.fields:
+            raise ValueError(
+                f'{self.cls.__name__} has no field {field!r} to query')
+
+    def predicate(self, field, op, value):
+        """ Checked (field, operator, normalized value) of a condition """
+        if op not in self.operators:
+            raise ValueError(f'unknown operator {op!r}, expected one of '
+                             f'{tuple(self.operators)}')
+        if op == 'in':
+            if type(value) not in (list, tuple, set, frozenset):
+                raise TypeError("'in' needs a list of values")
+            value = tuple(self.cls.normalize(field, item) for item in value)
+        else:
+            value = self.cls.normalize(field, value)
+        return field, op, value
+
+    def matches(self, obj, skip=()):
+        """ Whether `obj` satisfies every predicate (but those in `skip`) """
+        for predicate in self.predicates:
+            if predicate in skip:
+                continue
+            field, op, value = predicate
+            actual = self.cls.normalize(field, getattr(obj, field, None))
+            try:
+                if not self.operators[op](actual, value):
+                    return False
+            except TypeError:
+                # Not comparable (ex: None < 3)
+                return False
+        return True
+
+    def select(self, objects, skip=()):
+        """
+            List of the objects that match, sorted and limited. `skip` are
+            predicates the objects are known to satisfy (the index used).
+        """
+        found = (obj for obj in objects if self.matches(obj, skip))
+        if not self.order:
+            if self.limit is None:
+                return list(found)
+            return list(itertools.islice(found, self.limit))
+
+        if len(self.order) == 1 and self.limit is not None:
+            # Only the first `limit` objects are kept sorted
+            field, descending = self.order[0]
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            return pick(self.limit, found,
+                        key=operator.attrgetter(field))
+
+        found = list(found)
+        # Sorts are stable: sorting by the last field first leaves the
+        # objects sorted by all of them
+        for field, descending in reversed(self.order):
+            found.sort(key=operator.attrgetter(field), reverse=descending)
+        return found if self.limit is None else found[:self.limit]
+
+    def plan(self, access, rows, predicates=()):
+        """
+            Description of a plan: the access (an index or a scan), the
+            predicates answered by the index, the number of objects read,
+            and the predicates checked on them after
+        """
+        return {
+            'class': self.cls.__name__,
+            'access': access,
+            'index': list(predicates),
+            'rows': rows,
+            'filters': [p for p in self.predicates if p not in predicates],
+            'order_by': [('-' if descending else '') + field
+                         for field, descending in self.order],
+            'limit': self.limit,
+        }
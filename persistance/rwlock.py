@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""
+    This module defines the RWLock class, a reader/writer lock
+    used by FileStorage.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+        Reader/writer lock: any number of threads can hold it for reading
+        at once, while a thread holding it for writing excludes everyone
+        else.
+
+        Writers are preferred: once a writer is waiting, threads that
+        don't hold the lock yet wait for it before reading, so a steady
+        flow of readers can't starve writers.
+
+        The lock is reentrant: a thread holding it (for reading or
+        writing) can read again, and the writer can write again. A reader
+        can't upgrade to writing, since two readers doing so would wait
+        for each other forever: RuntimeError is raised instead.
+
+        Usage:
+            with lock.read():
+                ...
+            with lock.write():
+                ...
+    """
+
+    def __init__(self):
+        self.__cond = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = None
+        self.__writes = 0
+        self.__waiting_writers = 0
+        # Read holds of each thread
+        self.__local = threading.local()
+
+    def acquire_read(self):
+        reads = getattr(self.__local, 'reads', 0)
+        with self.__cond:
+            if not reads and self.__writer != threading.get_ident():
+                while self.__writer is not None or self.__waiting_writers:
+                    self.__cond.wait()
+            self.__readers += 1
+        self.__local.reads = reads + 1
+
+    def release_read(self):
+        reads = getattr(self.__local, 'reads', 0)
+        if not reads:
+            raise RuntimeError('cannot release un-acquired read lock')
+        self.__local.reads = reads - 1
+        with self.__cond:
+            self.__readers -= 1
+            if not self.__readers:
+                self.__cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self.__cond:
+            if self.__writer == me:
+                self.__writes += 1
+                return
+            if getattr(self.__local, 'reads', 0):
+                raise RuntimeError('cannot upgrade a read lock to write')
+
+            self.__waiting_writers += 1
+            try:
+                while self.__writer is not None or self.__readers:
+                    self.__cond.wait()
+            finally:
+                self.__waiting_writers -= 1
+            self.__writer = me
+            self.__writes = 1
+
+    def release_write(self):
+        with self.__cond:
+            if self.__writer != threading.get_ident():
+                raise RuntimeError('cannot release un-acquired write lock')
+            self.__writes -= 1
+            if not self.__writes:
+                self.__writer = None
+                self.__cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
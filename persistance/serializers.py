@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+"""
+    This module defines the serializers FileStorage can write its
+    snapshot files with: indented JSON (the default) and a compact
+    binary format.
+
+    Usage to convert a storage file from one format to the other:
+        python3 -m persistance.serializers storage.json storage.bin
+    Files ending in `.json` are read and written as JSON, any other
+    file as binary.
+"""
+import json
+import mmap
+import struct
+import sys
+from datetime import datetime, timedelta
+from uuid import UUID
+from persistance.json_stream import iter_items
+
+
+class JSONSerializer:
+    """
+        Indented JSON serializer. Documents are formatted exactly
+        like json.dump(records, f, indent=2).
+
+        Serializers encode each record on its own (so FileStorage can
+        cache the result until the object changes) and then join the
+        encoded records into a document.
+    """
+    binary = False
+
+    def encode(self, key, record):
+        """ Returns the encoded form of a single record """
+        text = json.dumps(record, indent=2).replace('\n', '\n  ')
+        return f'{json.dumps(key)}: {text}'
+
+    def document(self, parts):
+        """ Joins encoded records into a document """
+        if not parts:
+            return '{}'
+        return '{\n  ' + ',\n  '.join(parts) + '\n}'
+
+    def load(self, f):
+        """ Yields the (key, record) pairs of the document in file `f` """
+        return iter_items(f)
+
+
+class BinarySerializer:
+    """
+        Compact, row-oriented binary serializer.
+
+        A document starts with a header holding a field table for every
+        kind of record (its class and the names of its fields, in order),
+        followed by the rows. A row is the index of its table and the
+        values of its fields, each one prefixed by a type tag:
+            - UUID strings are stored as their 16 bytes
+            - datetime strings (as written by `str(datetime)`) as int64
+            microseconds since the epoch
+            - ints as int64, floats as float64
+            - other strings as their length and UTF-8 bytes
+        Field names, keys and `__class__` aren't repeated in each row: the
+        key of a record is its class name and ID.
+
+        Documents are read through a memoryview of the mapped file, so
+        values are decoded straight from the file without copying it.
+    """
+    binary = True
+    magic = b'AIRB\x01'
+
+    NONE, STR, UUID, INT, FLOAT, DATETIME, LIST, TRUE, FALSE, JSON = range(10)
+    EPOCH = datetime(1970, 1, 1)
+    MICROSECOND = timedelta(microseconds=1)
+
+    def __init__(self):
+        # (class name, field names) -> index of the table. Tables are
+        # kept for the life of the serializer, so encoded rows stay valid.
+        self.__tables = {}
+
+    @staticmethod
+    def varint(n):
+        """ Encodes an unsigned int in LEB128 """
+        out = bytearray()
+        while True:
+            byte = n & 0x7f
+            n >>= 7
+            if n:
+                out.append(byte | 0x80)
+            else:
+                out.append(byte)
+                return bytes(out)
+
+    @staticmethod
+    def read_varint(view, pos):
+        n = shift = 0
+        while True:
+            byte = view[pos]
+            pos += 1
+            n |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return n, pos
+            shift += 7
+
+    def encode_str(self, value):
+        data = value.encode('utf-8')
+        return self.varint(len(data)) + data
+
+    def encode_value(self, value):
+        """ Encodes a value with its type tag """
+        kind = type(value)
+        if value is None:
+            return bytes((self.NONE, ))
+        if kind is bool:
+            return bytes((self.TRUE if value else self.FALSE, ))
+        if kind is int and -(1 << 63) <= value < (1 << 63):
+            return bytes((self.INT, )) + struct.pack('<q', value)
+        if kind is float:
+            return bytes((self.FLOAT, )) + struct.pack('<d', value)
+        if kind is list:
+            return bytes((self.LIST, )) + self.varint(len(value)) + \
+                b''.join(self.encode_value(item) for item in value)
+        if kind is str:
+            if len(value) == 36 and value[8] == '-':
+                try:
+                    uuid = UUID(value)
+                    if str(uuid) == value:
+                        return bytes((self.UUID, )) + uuid.bytes
+                except ValueError:
+                    pass
+            if len(value) in (19, 26) and value[10] == ' ':
+                try:
+                    date = datetime.fromisoformat(value)
+                    if str(date) == value and date.tzinfo is None:
+                        micros = (date - self.EPOCH) // self.MICROSECOND
+                        return bytes((self.DATETIME, )) + \
+                            struct.pack('<q', micros)
+                except ValueError:
+                    pass
+            return bytes((self.STR, )) + self.encode_str(value)
+        return bytes((self.JSON, )) + self.encode_str(json.dumps(value))
+
+    def decode_value(self, view, pos):
+        """ Decodes the value at `pos`. Returns it and the next position """
+        tag = view[pos]
+        pos += 1
+        if tag == self.STR:
+            size, pos = self.read_varint(view, pos)
+            return str(view[pos:pos + size], 'utf-8'), pos + size
+        if tag == self.UUID:
+            digits = view[pos:pos + 16].hex()
+            return (f'{digits[:8]}-{digits[8:12]}-{digits[12:16]}-'
+                    f'{digits[16:20]}-{digits[20:]}'), pos + 16
+        if tag == self.DATETIME:
+            micros = struct.unpack_from('<q', view, pos)[0]
+            date = self.EPOCH + micros * self.MICROSECOND
+            return str(date), pos + 8
+        if tag == self.INT:
+            return struct.unpack_from('<q', view, pos)[0], pos + 8
+        if tag == self.FLOAT:
+            return struct.unpack_from('<d', view, pos)[0], pos + 8
+        if tag == self.LIST:
+            count, pos = self.read_varint(view, pos)
+            items = []
+            for i in range(count):
+                item, pos = self.decode_value(view, pos)
+                items.append(item)
+            return items, pos
+        if tag == self.NONE:
+            return None, pos
+        if tag == self.TRUE:
+            return True, pos
+        if tag == self.FALSE:
+            return False, pos
+        if tag == self.JSON:
+            size, pos = self.read_varint(view, pos)
+            return json.loads(str(view[pos:pos + size], 'utf-8')), pos + size
+        raise ValueError(f'unknown type tag {tag} at {pos - 1}')
+
+    def encode(self, key, record):
+        """ Returns the encoded row of a single record """
+        classname = record['__class__']
+        if key != f"{classname}_{record.get('id')}":
+            raise ValueError(f'key {key} is not <class>_<id>')
+        fields = tuple(field for field in record if field != '__class__')
+        table = self.__tables.setdefault(
+            (classname, fields), len(self.__tables))
+        return self.varint(table) + b''.join(
+            self.encode_value(record[field]) for field in fields)
+
+    def document(self, parts):
+        """ Joins encoded rows into a document, after the tables header """
+        header = [self.magic, self.varint(len(self.__tables))]
+        for (classname, fields), index in sorted(
+                self.__tables.items(), key=lambda item: item[1]):
+            header.append(self.encode_str(classname))
+            header.append(self.varint(len(fields)))
+            header.extend(self.encode_str(field) for field in fields)
+        header.append(self.varint(len(parts)))
+        return b''.join(header) + b''.join(parts)
+
+    def load(self, f):
+        """ Yields the (key, record) pairs of the document in file `f` """
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return
+        with mapped:
+            view = memoryview(mapped)
+            try:
+                yield from self.loads(view)
+            finally:
+                view.release()
+
+    def loads(self, view):
+        """ Yields the (key, record) pairs of a document held in memory """
+        view = memoryview(view)
+        if bytes(view[:len(self.magic)]) != self.magic:
+            raise ValueError('not a binary storage document')
+        pos = len(self.magic)
+
+        tables = []
+        count, pos = self.read_varint(view, pos)
+        for i in range(count):
+            size, pos = self.read_varint(view, pos)
+            classname = str(view[pos:pos + size], 'utf-8')
+            pos += size
+            nfields, pos = self.read_varint(view, pos)
+            fields = []
+            for j in range(nfields):
+                size, pos = self.read_varint(view, pos)
+                fields.append(str(view[pos:pos + size], 'utf-8'))
+                pos += size
+            tables.append((classname, fields))
+
+        rows, pos = self.read_varint(view, pos)
+        for i in range(rows):
+            table, pos = self.read_varint(view, pos)
+            classname, fields = tables[table]
+            record = {}
+            for field in fields:
+                record[field], pos = self.decode_value(view, pos)
+            record['__class__'] = classname
+            yield f"{classname}_{record['id']}", record
+
+
+def serializer_for(filename):
+    """ Serializer of a file, after its extension """
+    if filename.endswith('.json'):
+        return JSONSerializer()
+    return BinarySerializer()
+
+
+def convert(source, destination, source_serializer=None,
+            destination_serializer=None):
+    """
+        Converts the storage file `source` into `destination`, reading and
+        writing them with the given serializers (by default, after their
+        extensions). Returns the number of records converted.
+    """
+    reader = source_serializer or serializer_for(source)
+    writer = destination_serializer or serializer_for(destination)
+
+    parts = []
+    mode = 'rb' if reader.binary else 'r'
+    encoding = None if reader.binary else 'utf-8'
+    with open(source, mode, encoding=encoding) as f:
+        for key, record in reader.load(f):
+            parts.append(writer.encode(key, record))
+
+    mode = 'wb' if writer.binary else 'w'
+    encoding = None if writer.binary else 'utf-8'
+    with open(destination, mode, encoding=encoding) as f:
+        f.write(writer.document(parts))
+    return len(parts)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.stderr.write(
+            'Usage: python3 -m persistance.serializers SOURCE DESTINATION\n')
+        sys.exit(1)
+    count = convert(sys.argv[1], sys.argv[2])
+    print(f'{count} records converted')
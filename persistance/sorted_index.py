@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""
+    This module defines the SortedIndex class, the range index
+    FileStorage keeps for the numeric fields of the models.
+"""
+import heapq
+from bisect import bisect_left, insort
+
+
+class Last:
+    """ Compares greater than any key: bisects past every key of a value """
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+LAST = Last()
+
+
+class SortedIndex:
+    """
+        Sorted list of (value, key) entries, searched with bisect.
+
+        Adding or removing an entry costs O(log n) comparisons (plus moving
+        the entries after it, a memmove), and the keys of the values in a
+        range are found in O(log n + k). Keys break ties, so an entry is
+        found without walking the keys of the same value. Batches are
+        sorted and merged in O(n + m log m) instead.
+
+        Usage:
+            index.add(120, 'Place_<id>')
+            index.keys(50, 120)             # 50 <= value <= 120
+            index.keys(low=4, low_inclusive=False)      # value > 4
+    """
+
+    # Batches at least this big are merged instead of inserted one by one
+    batch = 32
+
+    def __init__(self, entries=()):
+        self.__entries = sorted(entries)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def add(self, value, key):
+        insort(self.__entries, (value, key))
+
+    def add_many(self, entries):
+        """ Adds (value, key) entries. Big batches are merged at once """
+        entries = sorted(entries)
+        if len(entries) < self.batch:
+            for entry in entries:
+                insort(self.__entries, entry)
+        else:
+            self.__entries = list(heapq.merge(self.__entries, entries))
+
+    def remove_many(self, entries):
+        """ Removes (value, key) entries. Big batches are filtered out """
+        entries = set(entries)
+        if len(entries) < self.batch:
+            for value, key in entries:
+                self.remove(value, key)
+        else:
+            self.__entries = [
+                entry for entry in self.__entries if entry not in entries]
+
+    def remove(self, value, key):
+        entries = self.__entries
+        i = bisect_left(entries, (value, key))
+        if i < len(entries) and entries[i] == (value, key):
+            del entries[i]
+
+    def bounds(self, low=None, high=None, low_inclusive=True,
+               high_inclusive=True):
+        """ Positions of the first and past the last entry in the range """
+        entries = self.__entries
+        start = 0
+        if low is not None:
+            # (low, ) sorts before every entry of `low`, (low, LAST) after
+            start = bisect_left(
+                entries, (low, ) if low_inclusive else (low, LAST))
+        end = len(entries)
+        if high is not None:
+            end = bisect_left(
+                entries, (high, LAST) if high_inclusive else (high, ))
+        return start, max(start, end)
+
+    def count(self, *args, **kwargs):
+        """ Number of entries in a range (same arguments as bounds) """
+        start, end = self.bounds(*args, **kwargs)
+        return end - start
+
+    def keys(self, *args, limit=None, **kwargs):
+        """ Keys of the (first `limit`) entries in a range, by value """
+        start, end = self.bounds(*args, **kwargs)
+        if limit is not None:
+            end = min(end, start + limit)
+        return [key for value, key in self.__entries[start:end]]
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+"""
+    This module defines the TextIndex class, the full-text index
+    FileStorage keeps for the text fields of the models, ranked with
+    BM25.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+        Terms of a text: its words, in lower case and without accents
+        (so 'Café' matches 'cafe')
+    """
+    if type(text) is not str:
+        return []
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return WORD.findall(text)
+
+
+class TextIndex:
+    """
+        Inverted index: each term maps to the keys of the documents holding
+        it and how many times they do (postings). Each document keeps its
+        terms too, so it can be removed or replaced without a scan.
+
+        search() only reads the postings of the terms searched, and
+        scores the documents holding them with BM25:
+            idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        where tf is how many times the document holds the term, dl is the
+        length of the document and avgdl the average length.
+
+        Usage:
+            index.add('Place_<id>', 'Cozy loft near the beach')
+            index.search('beach loft', mode='and', limit=10)
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        # term -> {key: term frequency}
+        self.__postings = {}
+        # key -> Counter of the document's terms, and its length
+        self.__documents = {}
+        self.__lengths = {}
+        self.__length = 0
+
+    def __len__(self):
+        return len(self.__documents)
+
+    def add(self, key, text):
+        """ Indexes the text of a document (replacing its previous text) """
+        self.remove(key)
+        terms = Counter(tokenize(text))
+        if not terms:
+            return
+        self.__documents[key] = terms
+        self.__lengths[key] = sum(terms.values())
+        self.__length += self.__lengths[key]
+        for term, frequency in terms.items():
+            self.__postings.setdefault(term, {})[key] = frequency
+
+    def remove(self, key):
+        terms = self.__documents.pop(key, None)
+        if terms is None:
+            return
+        self.__length -= self.__lengths.pop(key)
+        for term in terms:
+            postings = self.__postings[term]
+            del postings[key]
+            if not postings:
+                del self.__postings[term]
+
+    def search(self, text, mode='and', limit=10):
+        """
+            (score, key) of the best `limit` documents holding every term
+            of `text` (mode 'and') or any of them (mode 'or'), best first
+        """
+        if mode not in ('and', 'or'):
+            raise ValueError("mode must be 'and' or 'or'")
+        if limit is not None and (type(limit) is not int or limit < 0):
+            raise ValueError('limit must be a non-negative int')
+
+        terms = list(dict.fromkeys(tokenize(text)))
+        postings = [self.__postings.get(term, {}) for term in terms]
+        if not any(postings) or (mode == 'and' and not all(postings)):
+            return []
+
+        count = len(self.__documents)
+        k1, b = self.k1, self.b
+        # Part of the BM25 denominator that depends on the length of the
+        # document: tf + base + per_word * dl
+        base = k1 * (1 - b)
+        per_word = k1 * b * count / self.__length
+        lengths = self.__lengths
+
+        # Scores are accumulated one term at a time, reading only the
+        # postings of the terms searched
+        if mode == 'and':
+            # Intersected starting from the rarest term
+            postings = sorted(postings, key=len)
+            scores = dict.fromkeys((
+                key for key in postings[0]
+                if all(key in other for other in postings[1:])), 0)
+        else:
+            scores = {}
+        for posting in postings:
+            idf = math.log(1 + (count - len(posting) + 0.5) /
+                           (len(posting) + 0.5)) * (k1 + 1)
+            if mode == 'and':
+                for key in scores:
+                    tf = posting[key]
+                    scores[key] += idf * tf / (
+                        tf + base + per_word * lengths[key])
+            else:
+                get = scores.get
+                for key, tf in posting.items():
+                    scores[key] = get(key, 0) + idf * tf / (
+                        tf + base + per_word * lengths[key])
+
+        ranked = ((-score, key) for key, score in scores.items())
+        if limit is None:
+            return [(-score, key) for score, key in sorted(ranked)]
+        return [(-score, key) for score, key in heapq.nsmallest(limit, ranked)]
@@ -16,21 +16,29 @@ class AmenityService(ServiceBase):
     __service_class = Amenity
 
     @classmethod
-    def validate_name_is_unique(cls, name):
-        all = cls.all().values()
+    def get_by_name(cls, name):
+        return cls.get_by('name', name)
 
-        search_name = list(filter(lambda x: x.name == name, all))
-        if search_name:
-            raise ValueError('amenity with that name already exists')
+    @classmethod
+    def validate_name_is_unique(cls, name, id=None):
+        cls.validate_unique('name', name, id,
+                            'amenity with that name already exists')
+
+    @classmethod
+    def validate_many(cls, inputs):
+        cls.validate_unique_many('name', inputs,
+                                 'amenity with that name already exists')
 
     @classmethod
     def create(cls, **inputs):
-        if 'name' in inputs.keys():
-            cls.validate_name_is_unique(inputs['name'])
-        return cls.create_base(**inputs)
+        with cls.transaction():
+            if 'name' in inputs.keys():
+                cls.validate_name_is_unique(inputs['name'])
+            return cls.create_base(**inputs)
 
     @classmethod
     def update(cls, id, **inputs):
-        if 'name' in inputs.keys():
-            cls.validate_name_is_unique(inputs['name'])
-        return cls.update_base(id, **inputs)
+        with cls.transaction():
+            if 'name' in inputs.keys():
+                cls.validate_name_is_unique(inputs['name'], id)
+            return cls.update_base(id, **inputs)
@@ -15,6 +15,10 @@ class CityService(ServiceBase):
     """
     __service_class = City
 
+    @classmethod
+    def by_country(cls, country_id):
+        return cls.find('country', country_id)
+
     @staticmethod
     def country_is_valid(country_id):
         from service.country_service import CountryService
@@ -29,23 +33,50 @@ class CityService(ServiceBase):
         if 'country' in inputs.keys():
             CityService.country_is_valid(inputs['country'])
 
-        # Create new city
-        new_city = CityService.create_base(**inputs)
+        # Both saves are written at once, and the city is removed again
+        # if the country can't be updated
+        with cls.transaction():
+            # Create new city
+            new_city = CityService.create_base(**inputs)
 
-        # Add city to the list of cities of the country
-        country = CountryService.get(inputs.get('country'))
+            # Add city to the list of cities of the country
+            country = CountryService.get(inputs.get('country'))
 
-        # Sanity check. But this is checked in create_base
-        if not country:
-            raise AttributeError('country not found')
+            # Sanity check. But this is checked in create_base
+            if not country:
+                raise AttributeError('country not found')
 
-        updated_cities = country.cities
-        updated_cities.append(new_city.id)
+            # A new list, so the country's list is only changed through
+            # the update (and restored if the transaction is undone)
+            updated_cities = country.cities + [new_city.id]
 
-        CountryService.update(country.id, **{'cities': updated_cities})
+            CountryService.update(country.id, **{'cities': updated_cities})
 
         return new_city
 
+    @classmethod
+    def validate_many(cls, inputs):
+        countries = [item['country'] for item in inputs if 'country' in item]
+        if not cls.references_exist('Country', countries):
+            raise ValueError('country id not found in storage')
+
+    @classmethod
+    def create_many(cls, inputs):
+        from service.country_service import CountryService
+
+        with cls.transaction():
+            new_cities = super().create_many(inputs)
+
+            # Each country is updated once, with all of its new cities
+            added = {}
+            for city in new_cities:
+                added.setdefault(city.country, []).append(city.id)
+            for country in CountryService.get_many_or_raise(added):
+                updated_cities = country.cities + added[country.id]
+                CountryService.update(country.id, **{'cities': updated_cities})
+
+        return new_cities
+
     @classmethod
     def update(cls, id, **inputs):
         if 'country' in inputs.keys():
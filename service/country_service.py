@@ -15,12 +15,37 @@ class CountryService(ServiceBase):
     """
     __service_class = Country
 
+    @classmethod
+    def get_by_iso(cls, iso):
+        return cls.get_by('iso', iso)
+
+    @classmethod
+    def validate_iso_is_unique(cls, iso, id=None):
+        # ISO codes are compared regardless of case
+        cls.validate_unique('iso', iso, id,
+                            'country with that iso code already exists')
+
+    @classmethod
+    def validate_many(cls, inputs):
+        cls.validate_unique_many('iso', inputs,
+                                 'country with that iso code already exists')
+
     @classmethod
     def create(cls, **inputs):
         # Ensure countries have 0 cities at creation
         inputs['cities'] = []
-        return cls.create_base(**inputs)
+        with cls.transaction():
+            if 'iso' in inputs.keys():
+                cls.validate_iso_is_unique(inputs['iso'])
+            return cls.create_base(**inputs)
+
+    @classmethod
+    def create_many(cls, inputs):
+        return super().create_many({**item, 'cities': []} for item in inputs)
 
     @classmethod
     def update(cls, id, **inputs):
-        return cls.update_base(id, **inputs)
+        with cls.transaction():
+            if 'iso' in inputs.keys():
+                cls.validate_iso_is_unique(inputs['iso'], id)
+            return cls.update_base(id, **inputs)
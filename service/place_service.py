@@ -6,7 +6,9 @@
 """
 
 from model.place import Place
+from model import ratings
 from service.service import ServiceBase
+import model
 
 
 class PlaceService(ServiceBase):
@@ -14,6 +16,63 @@ class PlaceService(ServiceBase):
         Place service class for Place business logic
     """
     __service_class = Place
+    __columns = None
+
+    @classmethod
+    def by_host(cls, host_id):
+        return cls.find('host', host_id)
+
+    @classmethod
+    def by_city(cls, city_id):
+        return cls.find('city', city_id)
+
+    @classmethod
+    def by_country(cls, country_id):
+        return cls.find('country', country_id)
+
+    @staticmethod
+    def near(latitude, longitude, km):
+        # (place, distance in km), nearest first
+        return model.storage.near('Place', latitude, longitude, km)
+
+    @staticmethod
+    def nearest(latitude, longitude, k=10):
+        return model.storage.nearest('Place', latitude, longitude, k)
+
+    @staticmethod
+    def within(south, west, north, east):
+        return model.storage.within('Place', south, west, north, east)
+
+    @classmethod
+    def columns(cls):
+        # Columnar view of the places in storage for analytics (needs
+        # numpy), rebuilt when the places change
+        from persistance.columns import Columns
+
+        columns = cls.__columns
+        if columns is None or columns.storage is not model.storage:
+            columns = cls.__columns = Columns(model.storage, 'Place')
+        return columns
+
+    @classmethod
+    def rating(cls, place_id):
+        # Count, sum, mean and histogram of the ratings of its reviews
+        place = cls.get(place_id)
+        return ratings.summary(place.ratings) if place else None
+
+    @staticmethod
+    def move_ratings(place, old_host, new_host):
+        """
+            Moves the ratings of a place from the aggregates of its old
+            host to the ones of the new host (either may be None)
+        """
+        from service.user_service import UserService
+
+        for host_id, sign in ((old_host, -1), (new_host, 1)):
+            host = UserService.get(host_id) if host_id else None
+            if host is not None:
+                host.ratings = ratings.merged(
+                    host.ratings, place.ratings, sign)
 
     @staticmethod
     def host_is_valid(host_id):
@@ -89,11 +148,81 @@ class PlaceService(ServiceBase):
 
         # When a place is created, it has no reviews
         inputs['reviews'] = []
+        inputs['ratings'] = ratings.empty()
 
         return cls.create_base(**inputs)
 
+    @classmethod
+    def validate_many(cls, inputs):
+        # Every reference of the batch is checked with one lookup per class
+        hosts = [item['host'] for item in inputs if 'host' in item]
+        if not cls.references_exist('User', hosts):
+            raise ValueError('user id not found in storage')
+
+        countries = [item['country'] for item in inputs if 'country' in item]
+        if not cls.references_exist('Country', countries):
+            raise ValueError('country id not found in storage')
+
+        cities = [item['city'] for item in inputs if 'city' in item]
+        if not cls.references_exist('City', cities):
+            raise ValueError('city id not found in storage')
+
+        amenities = []
+        for item in inputs:
+            if 'amenities' not in item:
+                continue
+            amenity_array = item['amenities']
+            if type(amenity_array) is not list or \
+                    not all(type(amenity) is str for amenity in amenity_array):
+                raise TypeError('amenities must be a list of amenity ids')
+            amenities.extend(amenity_array)
+        if not cls.references_exist('Amenity', amenities):
+            raise ValueError('some of the selected amenities were not found')
+
+    @classmethod
+    def create_many(cls, inputs):
+        # When a place is created, it has no reviews
+        return super().create_many(
+            {**item, 'reviews': [], 'ratings': ratings.empty()}
+            for item in inputs)
+
+    @classmethod
+    def update_many(cls, updates):
+        # Ratings are only changed by ReviewService
+        updates = {
+            id: {key: value for key, value in inputs.items()
+                 if key != 'ratings'}
+            for id, inputs in updates.items()
+        }
+        places = cls.get_many_or_raise(updates.keys())
+        with cls.transaction():
+            cls.validate_many(list(updates.values()))
+
+            reviews = []
+            for inputs in updates.values():
+                if 'reviews' not in inputs:
+                    continue
+                review_array = inputs['reviews']
+                if type(review_array) is not list or \
+                        not all(type(review) is str
+                                for review in review_array):
+                    raise TypeError('reviews must be a list of review ids')
+                reviews.extend(review_array)
+            if not cls.references_exist('Review', reviews):
+                raise ValueError('some of the selected reviews were not found')
+
+            for place, inputs in zip(places, updates.values()):
+                if inputs.get('host', place.host) != place.host:
+                    cls.move_ratings(place, place.host, inputs['host'])
+
+            # Already validated: update the objects directly
+            return [cls.update_base(id, **inputs)
+                    for id, inputs in updates.items()]
+
     @classmethod
     def update(cls, id, **inputs):
+        # Ratings are only changed by ReviewService
+        inputs.pop('ratings', None)
         input_keys = inputs.keys()
 
         if 'host' in input_keys:
@@ -111,4 +240,26 @@ class PlaceService(ServiceBase):
         if 'reviews' in input_keys:
             cls.reviews_are_valid(inputs['reviews'])
 
-        return cls.update_base(id, **inputs)
+        with cls.transaction():
+            place = cls.get(id)
+            if place and inputs.get('host', place.host) != place.host:
+                cls.move_ratings(place, place.host, inputs['host'])
+            return cls.update_base(id, **inputs)
+
+    @classmethod
+    def delete(cls, id):
+        with cls.transaction():
+            place = super().delete(id)
+            # Its host stops counting its ratings
+            cls.move_ratings(place, place.host, None)
+            model.storage.save()
+        return place
+
+    @classmethod
+    def delete_many(cls, ids):
+        with cls.transaction():
+            places = super().delete_many(ids)
+            for place in places:
+                cls.move_ratings(place, place.host, None)
+            model.storage.save()
+        return places
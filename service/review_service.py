@@ -6,8 +6,9 @@
 """
 
 from model.review import Review
+from model import ratings
 from service.service import ServiceBase
-from model import storage
+import model
 from datetime import datetime
 
 
@@ -17,6 +18,27 @@ class ReviewService(ServiceBase):
     """
     __service_class = Review
 
+    @classmethod
+    def by_user(cls, user_id):
+        return cls.find('user', user_id)
+
+    @classmethod
+    def by_place(cls, place_id):
+        return cls.find('place', place_id)
+
+    @staticmethod
+    def rate(place, added=(), removed=()):
+        """
+            Adds and removes ratings from the aggregates of a place and of
+            its host: O(1), no other review is read (see model.ratings)
+        """
+        from service.user_service import UserService
+
+        place.ratings = ratings.changed(place.ratings, added, removed)
+        host = UserService.get(place.host)
+        if host is not None:
+            host.ratings = ratings.changed(host.ratings, added, removed)
+
     @staticmethod
     def user_is_valid(user_id):
         from service.user_service import UserService
@@ -39,41 +61,145 @@ class ReviewService(ServiceBase):
         if 'place' in inputs.keys():
             cls.place_is_valid(inputs['place'])
 
-        new_review = cls.create_base(**inputs)
+        # Both saves are written at once, and the review is removed again
+        # if the place can't be updated
+        with cls.transaction():
+            new_review = cls.create_base(**inputs)
 
-        # When a review is created, add to the list of reviews of that place
-        place = PlaceService.get(inputs.get('place'))
+            # When a review is created, add to the list of reviews of that
+            # place (a new list, so the place only changes through update)
+            place = PlaceService.get(inputs.get('place'))
+            cls.rate(place, added=[new_review.rating])
 
-        updated_reviews = place.reviews
-        updated_reviews.append(new_review.id)
+            updated_reviews = place.reviews + [new_review.id]
 
-        PlaceService.update(place.id, **{'reviews': updated_reviews})
+            PlaceService.update(place.id, **{'reviews': updated_reviews})
 
         return new_review
 
+    @classmethod
+    def validate_many(cls, inputs):
+        users = [item['user'] for item in inputs if 'user' in item]
+        if not cls.references_exist('User', users):
+            raise ValueError('user id not found in storage')
+
+        places = [item['place'] for item in inputs if 'place' in item]
+        if not cls.references_exist('Place', places):
+            raise ValueError('place id not found in storage')
+
+    @classmethod
+    def create_many(cls, inputs):
+        from service.place_service import PlaceService
+
+        with cls.transaction():
+            new_reviews = super().create_many(inputs)
+
+            # Each place is updated once, with all of its new reviews
+            added = {}
+            for review in new_reviews:
+                added.setdefault(review.place, []).append(review)
+            for place in PlaceService.get_many_or_raise(added):
+                place.updated_at = datetime.now()
+                place.reviews = place.reviews + [
+                    review.id for review in added[place.id]]
+                cls.rate(place, added=[
+                    review.rating for review in added[place.id]])
+            model.storage.save()
+
+        return new_reviews
+
     @classmethod
     def update(cls, id, **inputs):
         # Modified this method so that only comment and rating can be updated
         # but not the place id not the user id
 
+        from service.place_service import PlaceService
+
         srvc_cls = cls.service_class()
         key = f"{srvc_cls.__name__}_{id}"
 
-        object = storage.get(key)
-        if not object:
-            raise KeyError(f'{srvc_cls.__name__} was not found')
+        with cls.transaction():
+            object = model.storage.get(key)
+            if not object:
+                raise KeyError(f'{srvc_cls.__name__} was not found')
+
+            required = ('comment', 'rating')
+            intersection = list(set(required).intersection(inputs.keys()))
+
+            subset = {key: inputs[key] for key in intersection}
+
+            object.updated_at = datetime.now()
+            rating = object.rating
+
+            # Assigning the values like so ensures we don't skip the
+            # validations established in the setter methods
+            for key, value in subset.items():
+                setattr(object, key, value)
 
-        required = ('comment', 'rating')
-        intersection = list(set(required).intersection(inputs.keys()))
+            # The new rating replaces the old one in the aggregates
+            place = PlaceService.get(object.place)
+            if place is not None and object.rating != rating:
+                cls.rate(place, added=[object.rating], removed=[rating])
 
-        subset = {key: inputs[key] for key in intersection}
+            model.storage.save()
+            return object
 
-        object.updated_at = datetime.now()
+    @classmethod
+    def delete(cls, id):
+        with cls.transaction():
+            review = super().delete(id)
+            cls.unlink([review])
+            model.storage.save()
+        return review
+
+    @classmethod
+    def delete_many(cls, ids):
+        with cls.transaction():
+            reviews = super().delete_many(ids)
+            cls.unlink(reviews)
+            model.storage.save()
+        return reviews
+
+    @classmethod
+    def unlink(cls, reviews):
+        """
+            Removes deleted reviews from the reviews and the ratings of
+            their places (and of their hosts)
+        """
+        removed = {}
+        for review in reviews:
+            removed.setdefault(f"Place_{review.place}", []).append(review)
+        for place in model.storage.get_many(removed).values():
+            ids = {review.id for review in removed[place.key]}
+            place.updated_at = datetime.now()
+            place.reviews = [id for id in place.reviews if id not in ids]
+            cls.rate(place, removed=[
+                review.rating for review in removed[place.key]])
 
-        # Assigning the values like so ensures we don't skip the
-        # validations established in the setter methods
-        for key, value in subset.items():
-            setattr(object, key, value)
+    @classmethod
+    def rebuild_ratings(cls):
+        """
+            Recomputes the rating aggregates of every place and host from
+            the reviews in storage (for storages written before the
+            aggregates were kept). Reads every review once.
+        """
+        from service.place_service import PlaceService
+        from service.user_service import UserService
 
-        storage.save()
-        return object
+        with cls.transaction():
+            places = PlaceService.all()
+            users = UserService.all()
+            histograms = {key: ratings.empty() for key in (*places, *users)}
+            for review in cls.iter(batch=1000):
+                place = places.get(f"Place_{review.place}")
+                if place is None:
+                    continue
+                histograms[place.key][review.rating] += 1
+                host = histograms.get(f"User_{place.host}")
+                if host is not None:
+                    host[review.rating] += 1
+
+            for key, obj in (*places.items(), *users.items()):
+                if obj.ratings != histograms[key]:
+                    obj.ratings = histograms[key]
+            model.storage.save()
@@ -5,7 +5,7 @@
 """
 
 from abc import ABC, abstractclassmethod
-from model import storage
+import model
 from datetime import datetime
 
 
@@ -22,8 +22,31 @@ class ServiceBase(ABC):
             - update_base: Base for update functionality. Updates the fields
             of an object in storage. Made so that update mathod extends this
             core functionality.
+            - build: Builds a new instance from the inputs, without adding
+            it to storage
+            - create_many / update_many / delete_many: Bulk versions of
+            create, update and delete, saved once for the whole batch. If
+            any item fails, none of them is applied.
+            - validate_many: Validates the inputs of a whole batch in one
+            pass, before create_many builds any object
             - get: Gets an item from the storage with a given key
+            - get_by: Gets the item whose unique field holds a value
+            (ex: the user with a given email), using the storage's index
+            - find: Gets the items whose field holds a value (ex: the places
+            of a city), using the storage's index for references
+            - query: Gets the items matching some conditions, sorted and
+            limited (see persistance.query.Query for the conditions)
+            - search: Gets the (item, score) of the items whose text fields
+            best match some words, using the storage's full-text index
             - delete: Deletes an item from the storage
+            - all: Dict of the items of the service class in storage, or
+            only a page of them: the first `limit` by key after the key
+            `after` (the last key of the previous page)
+            - iter: Yields the items by key, reading them from storage a
+            page at a time
+            - count: Number of items of the service class in storage
+            - transaction: Context in which the saves of several service
+            calls are committed once, and undone if an exception is raised
     """
     __service_class = None
 
@@ -36,69 +59,195 @@ class ServiceBase(ABC):
         pass
 
     @classmethod
-    def create_base(cls, **inputs):
+    def build(cls, **inputs):
         service_cls = cls.service_class()
         required_inputs = service_cls.required()
 
         # Get only relevant information
         subset = {key: inputs[key] for key in required_inputs}
 
-        new_instance = service_cls(**subset)
-        storage.add(new_instance)
-        storage.save()
+        return service_cls(**subset)
+
+    @classmethod
+    def create_base(cls, **inputs):
+        new_instance = cls.build(**inputs)
+        with cls.transaction():
+            model.storage.add(new_instance)
+            model.storage.save()
 
         return new_instance
 
+    @classmethod
+    def create_many(cls, inputs):
+        inputs = [dict(item) for item in inputs]
+        # Validated and built before taking the storage lock: building can
+        # be slow (ex: hashing passwords) and would block every other thread
+        cls.validate_many(inputs)
+        new_instances = [cls.build(**item) for item in inputs]
+
+        with cls.transaction():
+            # Unique fields are checked again under the lock, held until
+            # the batch is added: another thread may have taken a value
+            for field in cls.service_class().unique():
+                cls.validate_unique_many(field, inputs)
+            model.storage.add_many(new_instances)
+            model.storage.save()
+
+        return new_instances
+
+    @classmethod
+    def validate_many(cls, inputs):
+        # Nothing to validate by default: services override this
+        # with batch versions of the validations done by create
+        pass
+
+    @classmethod
+    def update_many(cls, updates):
+        # `updates` maps the ID of each object to its inputs
+        cls.get_many_or_raise(updates.keys())
+        with cls.transaction():
+            return [cls.update(id, **inputs) for id, inputs in updates.items()]
+
     @classmethod
     def update_base(cls, id, **inputs):
         srvc_cls = cls.service_class()
 
         key = f"{srvc_cls.__name__}_{id}"
 
-        object = storage.get(key)
-        if not object:
-            raise KeyError(f'{srvc_cls.__name__} was not found')
+        # Read, changed and saved without other threads changing storage
+        # in between
+        with cls.transaction():
+            object = model.storage.get(key)
+            if not object:
+                raise KeyError(f'{srvc_cls.__name__} was not found')
 
-        required = srvc_cls.required()
+            required = srvc_cls.required()
 
-        intersection = list(set(required).intersection(inputs.keys()))
+            intersection = list(set(required).intersection(inputs.keys()))
 
-        subset = {key: inputs[key] for key in intersection}
+            subset = {key: inputs[key] for key in intersection}
 
-        object.updated_at = datetime.now()
+            object.updated_at = datetime.now()
 
-        # Assigning the values like so ensures we don't skip the
-        # validations established in the setter methods
-        for key, value in subset.items():
-            setattr(object, key, value)
+            # Assigning the values like so ensures we don't skip the
+            # validations established in the setter methods
+            for key, value in subset.items():
+                setattr(object, key, value)
 
-        storage.save()
-        return object
+            model.storage.save()
+            return object
 
     @classmethod
     def delete(cls, id):
         srvc_cls = cls.service_class()
         key = f"{srvc_cls.__name__}_{id}"
 
-        object = storage.get(key)
-        if not object:
-            raise KeyError(f'{srvc_cls.__name__} was not found')
+        with cls.transaction():
+            object = model.storage.get(key)
+            if not object:
+                raise KeyError(f'{srvc_cls.__name__} was not found')
+
+            model.storage.remove(object)
+            model.storage.save()
+
+            return object
 
-        storage.remove(object)
-        storage.save()
+    @classmethod
+    def delete_many(cls, ids):
+        objects = cls.get_many_or_raise(ids)
+        with cls.transaction():
+            model.storage.remove_many(objects)
+            model.storage.save()
 
-        return object
+        return objects
+
+    @classmethod
+    def get_many_or_raise(cls, ids):
+        """ Objects with the given IDs. KeyError if any of them is missing """
+        srvc_cls = cls.service_class()
+        keys = [f"{srvc_cls.__name__}_{id}" for id in ids]
+
+        found = model.storage.get_many(keys)
+        if len(found) != len(set(keys)):
+            raise KeyError(f'{srvc_cls.__name__} was not found')
+        return [found[key] for key in keys]
+
+    @staticmethod
+    def references_exist(classname, ids):
+        """ Whether all the IDs belong to objects of a class in storage """
+        keys = {f"{classname}_{id}" for id in ids}
+        return len(model.storage.get_many(keys)) == len(keys)
 
     @classmethod
     def get(cls, id):
         srvc_cls = cls.service_class()
         key = f"{srvc_cls.__name__}_{id}"
-        return storage.get(key)
+        return model.storage.get(key)
+
+    @classmethod
+    def get_by(cls, field, value):
+        srvc_cls = cls.service_class()
+        return model.storage.get_by(srvc_cls.__name__, field, value)
+
+    @classmethod
+    def find(cls, field, value):
+        srvc_cls = cls.service_class()
+        return model.storage.find(srvc_cls.__name__, field, value)
+
+    @classmethod
+    def query(cls, where=None, order_by=None, limit=None):
+        srvc_cls = cls.service_class()
+        return model.storage.query(srvc_cls.__name__, where, order_by, limit)
 
     @classmethod
-    def all(cls):
+    def search(cls, text, mode='and', limit=10):
         srvc_cls = cls.service_class()
-        return storage.all(srvc_cls.__name__)
+        return model.storage.search(srvc_cls.__name__, text, mode, limit)
+
+    @classmethod
+    def validate_unique(cls, field, value, id=None, message=None):
+        """
+            Raises ValueError if another object (than the one with the
+            given ID) holds `value` in a unique field
+        """
+        found = cls.get_by(field, value)
+        if found is not None and found.id != id:
+            raise ValueError(message or f'{field} is not unique')
+
+    @classmethod
+    def validate_unique_many(cls, field, inputs, message=None):
+        """
+            Raises ValueError if two items of a batch, or an item and an
+            object in storage, hold the same value in a unique field
+        """
+        srvc_cls = cls.service_class()
+        values = [srvc_cls.normalize(field, item[field])
+                  for item in inputs if field in item]
+        if len(set(values)) != len(values):
+            raise ValueError(message or f'{field} is not unique')
+        for value in values:
+            cls.validate_unique(field, value, message=message)
+
+    @classmethod
+    def all(cls, limit=None, after=None):
+        srvc_cls = cls.service_class()
+        if limit is None and after is None:
+            return model.storage.all(srvc_cls.__name__)
+        return model.storage.all(srvc_cls.__name__, limit, after)
+
+    @classmethod
+    def iter(cls, batch=100):
+        srvc_cls = cls.service_class()
+        return model.storage.iter(srvc_cls.__name__, batch)
+
+    @classmethod
+    def count(cls):
+        srvc_cls = cls.service_class()
+        return model.storage.count(srvc_cls.__name__)
+
+    @staticmethod
+    def transaction():
+        return model.storage.transaction()
 
     @classmethod
     def service_class(cls):
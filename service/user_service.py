@@ -5,7 +5,8 @@
 """
 from service.service import ServiceBase
 from model.user import User
-from model import storage
+from model import ratings
+import model
 import os
 from hashlib import pbkdf2_hmac
 # Implementing simple proof od concept for password hashing
@@ -26,43 +27,61 @@ class UserService(ServiceBase):
     __service_class = User
 
     @classmethod
-    def validate_mail_is_unique(cls, email):
-        users = cls.all().values()
+    def get_by_email(cls, email):
+        return cls.get_by('email', email)
 
-        search_email = list(filter(lambda x: x.email == email, users))
-        if search_email:
-            raise ValueError('email is not unique')
+    @classmethod
+    def host_rating(cls, user_id):
+        # Count, sum, mean and histogram of the ratings of their places
+        user = cls.get(user_id)
+        return ratings.summary(user.ratings) if user else None
+
+    @classmethod
+    def validate_mail_is_unique(cls, email, id=None):
+        # Emails are compared regardless of case
+        cls.validate_unique('email', email, id, 'email is not unique')
 
     @classmethod
     def create(cls, **inputs):
-        if 'email' in inputs.keys():
-            cls.validate_mail_is_unique(inputs.get('email'))
+        # Hashing the password is slow: done before taking the storage
+        # lock, which is held from the email check until the user is added
+        new_instance = cls.build(**inputs)
+        with cls.transaction():
+            if 'email' in inputs.keys():
+                cls.validate_mail_is_unique(inputs.get('email'))
 
-        service_cls = cls.service_class()
-        required_inputs = service_cls.required()
+            model.storage.add(new_instance)
+            model.storage.save()
 
-        # Get only relevant information
-        subset = {key: inputs[key] for key in required_inputs}
+        return new_instance
 
-        new_instance = service_cls(**subset)
+    @classmethod
+    def build(cls, **inputs):
+        # When a user is created, their places have no reviews
+        inputs['ratings'] = ratings.empty()
+        new_instance = super().build(**inputs)
         new_instance.password = cls.pswd_hash(
             new_instance.id, new_instance.password
         )
-
-        storage.add(new_instance)
-        storage.save()
-
         return new_instance
 
+    @classmethod
+    def validate_many(cls, inputs):
+        cls.validate_unique_many('email', inputs, 'email is not unique')
+
     @classmethod
     def update(cls, id, **inputs):
-        if 'email' in inputs.keys():
-            cls.validate_mail_is_unique(inputs.get('email'))
-        
+        # Ratings are only changed by ReviewService
+        inputs.pop('ratings', None)
+
         if 'password' in inputs.keys():
             inputs['password'] = cls.pswd_hash(id, inputs['password'])
 
-        return cls.update_base(id, **inputs)
+        with cls.transaction():
+            if 'email' in inputs.keys():
+                cls.validate_mail_is_unique(inputs.get('email'), id)
+
+            return cls.update_base(id, **inputs)
 
     @staticmethod
     def pswd_hash(user_id, pswd):
@@ -3,7 +3,7 @@
     Tests for the Abstract class
 """
 
-from model.base import BaseModel
+from model.base import BaseModel, MISSING
 from abc import ABC
 import unittest
 from datetime import datetime
@@ -57,5 +57,97 @@ class TestBaseModel(unittest.TestCase):
         self.tmp2.updated_at = datetime.now()
         self.assertFalse(self.tmp == self.tmp2)
 
-        self.tmp2.__dict__ = self.tmp.__dict__
+        self.tmp2.updated_at = self.tmp.updated_at
+        self.assertTrue(self.tmp == self.tmp2)
+
+        # Attributes of subclasses without __slots__ are compared too
+        self.tmp2.extra = 1
+        self.assertFalse(self.tmp == self.tmp2)
+        self.assertEqual(self.tmp2.to_dict()['extra'], 1)
+
+    def test_slots(self):
+        class Slotted(BaseModel):
+            __slots__ = ('__value', )
+
+            def __init__(self, value):
+                BaseModel.__init__(self)
+                self.__value = value
+
+        obj = Slotted(1)
+        self.assertFalse(hasattr(obj, '__dict__'))
+        with self.assertRaises(AttributeError):
+            obj.extra = 1
+        self.assertEqual(Slotted.attribute_names(),
+                         ('id', 'created_at', 'updated_at', '_Slotted__value'))
+        self.assertEqual(obj.to_dict()['value'], 1)
+
+        other = Slotted(1)
+        other.id, other.created_at = obj.id, obj.created_at
+        other.updated_at = obj.updated_at
+        self.assertTrue(obj == other)
+        other._Slotted__value = 2
+        self.assertFalse(obj == other)
+        self.assertEqual(other.record['value'], 2)
+
+        # Unset slots aren't part of the object's data
+        del other._Slotted__value
+        self.assertNotIn('value', other.to_dict())
+
+    def test_record_cache(self):
+        record = self.tmp.record
+        self.assertIs(self.tmp.record, record)
+        self.assertEqual(self.tmp.to_dict(), record)
+        self.assertIsNot(self.tmp.to_dict(), record)
+
+        # Setting an attribute invalidates the cached record
+        self.tmp.updated_at = datetime.now()
+        self.assertIsNot(self.tmp.record, record)
+        self.assertEqual(self.tmp.record.get('updated_at'),
+                         str(self.tmp.updated_at))
+
+        # The cache isn't taken into account when comparing objects
+        self.tmp2.id = self.tmp.id
+        self.tmp2.created_at = self.tmp.created_at
+        self.tmp2.updated_at = self.tmp.updated_at
+        self.tmp.record
         self.assertTrue(self.tmp == self.tmp2)
+        self.assertNotIn('_BaseModel__record', self.tmp.to_dict())
+
+    def test_record_list_changed(self):
+        self.tmp.items = []
+        record = self.tmp.record
+        self.assertIs(self.tmp.record, record)
+
+        # Lists changed in place invalidate the cached record too
+        self.tmp.items.append(1)
+        self.assertIsNot(self.tmp.record, record)
+        self.assertEqual(self.tmp.record['items'], [1])
+
+        # Lists of to_dict() can be changed without changing the record
+        self.tmp.to_dict()['items'].append(2)
+        self.assertEqual(self.tmp.record['items'], [1])
+        self.assertEqual(self.tmp.items, [1])
+
+    def test_observe(self):
+        changes = []
+
+        def observer(obj, name, old):
+            changes.append((obj, name, old))
+
+        self.tmp.observe(observer)
+        old = self.tmp.updated_at
+        self.tmp.updated_at = datetime.now()
+        self.tmp.name = 'tmp'
+        self.assertEqual(changes, [(self.tmp, 'updated_at', old),
+                                   (self.tmp, 'name', MISSING)])
+
+        # The observer isn't part of the object's data
+        self.assertNotIn('_BaseModel__observer', self.tmp.to_dict())
+
+        # Only the object's observer can be unregistered
+        self.tmp.unobserve(lambda obj, name, old: None)
+        self.tmp.id = 'id'
+        self.assertEqual(len(changes), 3)
+        self.tmp.unobserve(observer)
+        self.tmp.id = 'other id'
+        self.assertEqual(len(changes), 3)
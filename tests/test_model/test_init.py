@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""
+    Tests for the creation of the storage in the model package
+"""
+
+import unittest
+import subprocess
+import sys
+import os
+import model
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def run(code):
+    """ Runs `code` in a new interpreter. Returns its output """
+    env = dict(os.environ, PYTHONPATH=root)
+    env.pop('DB_STORAGE', None)
+    return subprocess.run([sys.executable, '-c', code], cwd=root, env=env,
+                          capture_output=True, text=True, check=True).stdout
+
+
+class TestStorageInit(unittest.TestCase):
+    """ Tests for the lazy creation of model.storage """
+
+    def test_single_storage(self):
+        self.assertIs(model.storage, model.get_storage())
+
+    def test_lazy(self):
+        # Importing the model and the services doesn't create the storage
+        output = run('import sys, model, service.place_service\n'
+                     'print("persistance.file_storage" in sys.modules)')
+        self.assertEqual(output.strip(), 'False')
+
+    def test_loaded_once(self):
+        output = run('from persistance.file_storage import FileStorage\n'
+                     'from unittest.mock import patch\n'
+                     'import model\n'
+                     'reload = FileStorage.reload\n'
+                     'with patch.object(FileStorage, "reload", autospec=True,'
+                     ' side_effect=reload) as mock:\n'
+                     '    model.storage.count()\n'
+                     '    model.storage.all()\n'
+                     'print(mock.call_count)')
+        self.assertEqual(output.strip(), '1')
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            model.unknown
@@ -91,6 +91,9 @@ class TestPlace(unittest.TestCase):
         with self.assertRaises(TypeError):
             self.place.reviews = ('string', 'tuple')
 
+        with self.assertRaises(TypeError):
+            self.place.ratings = [1, 2, 3]
+
     def test_inherited_methods(self):
         place = self.place
         place_dict = place.to_dict()
@@ -101,3 +104,8 @@ class TestPlace(unittest.TestCase):
         place = self.place
         new = Place.constructor(place.to_dict())
         self.assertEqual(place, new)
+
+        # Records saved before ratings were aggregated have none
+        record = place.to_dict()
+        del record['ratings']
+        self.assertEqual(Place.constructor(record).ratings, [0] * 11)
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+"""
+    Tests for the rating aggregates
+"""
+
+import unittest
+from model import ratings
+
+
+class TestRatings(unittest.TestCase):
+    """ Tests for the rating aggregates """
+
+    def test_changed(self):
+        histogram = ratings.changed(ratings.empty(), added=[7, 9, 9])
+        self.assertEqual(histogram, [0] * 7 + [1, 0, 2, 0])
+        self.assertEqual(ratings.changed(histogram, [10], [9]),
+                         [0] * 7 + [1, 0, 1, 1])
+        # Copies: the histogram changed isn't modified
+        self.assertEqual(histogram, [0] * 7 + [1, 0, 2, 0])
+
+        self.assertEqual(ratings.merged(histogram, histogram),
+                         [0] * 7 + [2, 0, 4, 0])
+        self.assertEqual(ratings.merged(histogram, histogram, -1),
+                         ratings.empty())
+
+    def test_summary(self):
+        summary = ratings.summary(ratings.changed(ratings.empty(), [4, 9]))
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['sum'], 13)
+        self.assertEqual(summary['mean'], 6.5)
+        self.assertEqual(ratings.summary(ratings.empty())['mean'], None)
+
+    def test_check(self):
+        ratings.check(ratings.empty())
+        for histogram in ([0] * 10, [0] * 10 + [-1], [0] * 10 + [1.0],
+                          tuple(ratings.empty())):
+            with self.assertRaises(TypeError):
+                ratings.check(histogram)
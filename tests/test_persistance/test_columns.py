@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+"""
+    Tests for the Columns class
+"""
+
+from persistance.columns import Columns, np
+from persistance.file_storage import FileStorage
+from model.place import Place
+from unittest.mock import patch
+import threading
+import unittest
+import os
+
+filename = "test_storage.json"
+
+
+@unittest.skipUnless(np, 'numpy is not installed')
+class TestColumns(unittest.TestCase):
+    """ Tests for Columns """
+
+    def setUp(self):
+        self.storage = FileStorage(filename)
+        self.places = [Place(f'Inn {i}', 'Street 1', f'host_{i % 3}',
+                             50 + 10 * i, i % 4, 1, f'city_{i % 2}',
+                             'country_id', i % 5, latitude=float(i),
+                             longitude=-float(i)) for i in range(10)]
+        self.storage.add_many(self.places)
+        self.columns = Columns(self.storage, 'Place')
+
+    def tearDown(self):
+        if os.access(filename, os.F_OK):
+            os.remove(filename)
+
+    def expected(self, check):
+        return sorted(place.key for place in self.places if check(place))
+
+    def test_columns(self):
+        self.assertEqual(len(self.columns), 10)
+        keys = self.columns.keys()
+        prices = self.columns.column('price_per_night')
+        self.assertEqual(prices.dtype, np.float64)
+        self.assertEqual(
+            dict(zip(keys, prices.tolist())),
+            {place.key: place.price_per_night for place in self.places})
+
+        codes = self.columns.column('city')
+        labels = self.columns.labels('city')
+        self.assertEqual(sorted(labels), ['city_0', 'city_1'])
+        self.assertEqual(
+            dict(zip(keys, (labels[code] for code in codes))),
+            {place.key: place.city for place in self.places})
+
+        with self.assertRaises(ValueError):
+            self.columns.column('name')
+        with self.assertRaises(ValueError):
+            self.columns.labels('price_per_night')
+
+    def test_select(self):
+        found = self.columns.select({'city': 'city_0',
+                                     'price_per_night': {'>=': 60, '<': 120},
+                                     'host': {'in': ['host_0', 'host_1']}})
+        self.assertEqual(sorted(found), self.expected(
+            lambda p: p.city == 'city_0' and 60 <= p.price_per_night < 120
+            and p.host in ('host_0', 'host_1')))
+        self.assertEqual(self.columns.select({'city': 'unknown'}), [])
+        self.assertEqual(self.columns.mask().sum(), 10)
+
+        with self.assertRaises(ValueError):
+            self.columns.select({'city': {'<': 'city_1'}})
+        with self.assertRaises(ValueError):
+            self.columns.select({'name': 'Inn 1'})
+
+    def test_group_by_and_stats(self):
+        self.assertEqual(self.columns.group_by('city'),
+                         {'city_0': 5, 'city_1': 5})
+        self.assertEqual(
+            self.columns.group_by('city', 'price_per_night', 'mean'),
+            {'city_0': 90.0, 'city_1': 100.0})
+        self.assertEqual(
+            self.columns.group_by('host', 'max_guests', 'max',
+                                  where={'city': 'city_1'}),
+            {'host_0': 4.0, 'host_1': 2.0, 'host_2': 0.0})
+
+        stats = self.columns.stats('price_per_night',
+                                   where={'max_guests': {'>=': 3}})
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['mean'], 110.0)
+        self.assertEqual((stats['min'], stats['max']), (80.0, 140.0))
+        self.assertEqual(self.columns.stats(
+            'latitude', where={'city': 'unknown'})['mean'], None)
+
+        with self.assertRaises(ValueError):
+            self.columns.group_by('price_per_night')
+        with self.assertRaises(ValueError):
+            self.columns.group_by('city', 'price_per_night', 'median')
+
+    def test_rebuild(self):
+        prices = self.columns.column('price_per_night')
+        # Not rebuilt while the places don't change
+        self.assertIs(self.columns.column('price_per_night'), prices)
+
+        self.places[0].price_per_night = 1000
+        self.assertEqual(self.columns.stats('price_per_night')['max'], 1000)
+
+        self.storage.remove(self.places[1])
+        new = Place('New Inn', 'Street 1', 'host_9', 10, 2, 1, 'city_9',
+                    'country_id', 4)
+        self.storage.add(new)
+        self.assertEqual(len(self.columns), 10)
+        self.assertEqual(self.columns.select({'city': 'city_9'}), [new.key])
+
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                new.city = 'city_0'
+                raise ValueError
+        self.assertEqual(self.columns.select({'city': 'city_9'}), [new.key])
+
+    def test_inside_transaction(self):
+        # A thread rebuilding the view waits for the storage lock held by
+        # a transaction, which uses the view too: it must not wait for
+        # that thread in turn
+        reading = threading.Event()
+        read = self.storage.all
+        prices = []
+
+        def all(*args):
+            reading.set()
+            return read(*args)
+
+        reader = threading.Thread(target=self.columns.keys, daemon=True)
+
+        def transaction():
+            with self.storage.transaction():
+                self.places[0].price_per_night = 500
+                reader.start()
+                reading.wait(5)
+                prices.append(self.columns.column('price_per_night').max())
+
+        with patch.object(self.storage, 'all', side_effect=all):
+            thread = threading.Thread(target=transaction, daemon=True)
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            reader.join(5)
+        self.assertEqual(prices, [500])
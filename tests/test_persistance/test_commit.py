@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""
+    Tests for the GroupCommit and WriteBehind classes
+"""
+
+from persistance.commit import GroupCommit, WriteBehind
+from unittest.mock import patch
+import threading
+import time
+import unittest
+
+
+class TestGroupCommit(unittest.TestCase):
+    """ Tests for GroupCommit """
+
+    def test_save(self):
+        commits = []
+        group = GroupCommit(lambda: commits.append(True), 0.05)
+        threads = [threading.Thread(target=group.save) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The saves that came during the wait joined the first write
+        self.assertGreaterEqual(len(commits), 1)
+        self.assertLess(len(commits), 8)
+
+        # A lone save is written by its own commit
+        count = len(commits)
+        group.save()
+        self.assertEqual(len(commits), count + 1)
+
+
+class TestWriteBehind(unittest.TestCase):
+    """ Tests for WriteBehind """
+
+    def test_save(self):
+        commits = []
+        writer = WriteBehind(lambda: commits.append(True), 60)
+        for i in range(5):
+            self.assertTrue(writer.save())
+        self.assertEqual(commits, [])
+
+        # flush() doesn't wait for the delay
+        start = time.monotonic()
+        writer.flush()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(len(commits), 1)
+
+        writer.save()
+        writer.close()
+        self.assertEqual(len(commits), 2)
+        # Closed: saves must be written by the caller
+        self.assertFalse(writer.save())
+
+    def test_failed_commit(self):
+        commits = []
+
+        def commit():
+            commits.append(True)
+            if len(commits) == 1:
+                raise OSError('disk full')
+
+        writer = WriteBehind(commit, 0, max_pending=1)
+        with patch('sys.stderr') as stderr:
+            writer.save()
+            writer.flush()
+            self.assertTrue(stderr.write.called)
+        # The writer survived: saves are still written
+        for i in range(3):
+            writer.save()
+        writer.flush()
+        writer.close()
+        self.assertGreater(len(commits), 1)
+
+    def test_max_pending(self):
+        release = threading.Event()
+        blocked = threading.Event()
+        writer = WriteBehind(release.wait, 0, max_pending=2)
+        saved = []
+
+        def save():
+            for i in range(5):
+                writer.save()
+                saved.append(i)
+
+        thread = threading.Thread(target=save)
+
+        class Condition(threading.Condition):
+            """ Tells when the saving thread waits (only on backpressure) """
+
+            def wait(self, timeout=None):
+                if threading.current_thread() is thread:
+                    blocked.set()
+                return super().wait(timeout)
+
+        writer._WriteBehind__cond = Condition()
+        thread.start()
+        # Blocked while the writer is stuck on a commit
+        self.assertTrue(blocked.wait(5))
+        self.assertEqual(saved, [0, 1])
+        release.set()
+        thread.join()
+        writer.close()
+        self.assertEqual(saved, [0, 1, 2, 3, 4])
@@ -0,0 +1,396 @@
+#!/usr/bin/python3
+"""
+    Tests for the DataBaseStorage class
+"""
+
+from persistance.db_storage import DataBaseStorage
+from persistance.persistance import Persistance
+from model.user import User
+from model.place import Place
+import unittest
+import threading
+import sqlite3
+import gc
+import os
+
+filename = "test_storage.db"
+
+
+class TestDataBaseStorage(unittest.TestCase):
+    """ Tests for DataBaseStorage """
+
+    def setUp(self):
+        self.storage = DataBaseStorage(filename)
+
+    def tearDown(self):
+        self.storage.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.access(filename + suffix, os.F_OK):
+                os.remove(filename + suffix)
+
+    def test_inheritance(self):
+        self.assertTrue(isinstance(self.storage, Persistance))
+        self.assertEqual(type(self.storage), DataBaseStorage)
+
+    def test_add_and_save(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.assertEqual(self.storage.get(usr.key), usr)
+        self.storage.save()
+
+        conn = sqlite3.connect(filename)
+        rows = conn.execute('SELECT id, email FROM "User"').fetchall()
+        conn.close()
+        self.assertEqual(rows, [(usr.id, usr.email)])
+
+    def test_wal_mode(self):
+        conn = sqlite3.connect(filename)
+        mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.close()
+        self.assertEqual(mode, 'wal')
+
+    def test_reload(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.storage.save()
+
+        # Uncommitted changes are discarded by reload
+        usr.first_name = 'Johnny'
+        self.storage.reload()
+        retrieved = self.storage.get(usr.key)
+        self.assertIsNot(retrieved, usr)
+        self.assertEqual(retrieved.first_name, 'John')
+        self.assertEqual(retrieved.created_at, usr.created_at)
+
+        # A new storage on the same file sees the saved objects
+        other = DataBaseStorage(filename)
+        self.assertEqual(other.get(usr.key).email, usr.email)
+        other.close()
+
+    def test_update(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.storage.save()
+
+        self.storage.get(usr.key).first_name = 'Johnny'
+        self.storage.save()
+
+        other = DataBaseStorage(filename)
+        self.assertEqual(other.get(usr.key).first_name, 'Johnny')
+        other.close()
+
+    def test_list_fields(self):
+        place = Place('Inn', 'Street 1', 'host_id', 100, 2, 1, 'city_id',
+                      'country_id', 4, amenities=['wifi', 'garage'])
+        self.storage.add(place)
+        self.storage.save()
+        self.storage.reload()
+
+        retrieved = self.storage.get(place.key)
+        self.assertEqual(retrieved.amenities, ['wifi', 'garage'])
+        self.assertEqual(retrieved, place)
+
+    def test_remove(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.storage.save()
+
+        self.storage.remove(usr)
+        self.assertIsNone(self.storage.get(usr.key))
+        self.assertEqual(self.storage.all('User'), {})
+        self.storage.save()
+
+        self.storage.reload()
+        self.assertIsNone(self.storage.get(usr.key))
+
+    def test_get(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.assertIsNone(self.storage.get(usr.key))
+        self.assertIsNone(self.storage.get('Unknown_id'))
+        self.storage.add(usr)
+        self.storage.save()
+        self.storage.reload()
+
+        # Same object is returned while it's loaded
+        self.assertIs(self.storage.get(usr.key), self.storage.get(usr.key))
+
+    def test_all(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.storage.save()
+
+        new_user = User('janedoe@mail.com', '654321', 'Jane', 'Doe')
+        self.storage.add(new_user)
+
+        all = self.storage.all()
+        self.assertEqual(len(all), 2)
+        self.assertEqual(all.get(new_user.key), new_user)
+        self.assertEqual(all, self.storage.all('User'))
+        self.assertEqual(self.storage.all('Place'), {})
+
+    def test_get_many(self):
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(5)]
+        self.storage.add_many(users)
+        self.storage.save()
+        self.storage.reload()
+
+        keys = [usr.key for usr in users[:3]] + ['User_unknown', 'Unknown_id']
+        found = self.storage.get_many(keys)
+        self.assertEqual(sorted(found), sorted(usr.key for usr in users[:3]))
+        self.assertEqual(found[users[0].key], users[0])
+
+        self.storage.remove_many(users[:2])
+        self.assertEqual(list(self.storage.get_many(keys)), [users[2].key])
+
+    def test_find(self):
+        places = [Place(f'Inn {i}', 'Street 1', 'host_id', 100, 2, 1,
+                        f'city_{i % 2}', 'country_id', 4) for i in range(4)]
+        self.storage.add_many(places)
+        self.storage.save()
+
+        # References are indexed in the database
+        conn = sqlite3.connect(filename)
+        indexes = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")]
+        conn.close()
+        self.assertIn('Place_city', indexes)
+
+        self.assertEqual(sorted(self.storage.find('Place', 'city', 'city_0')),
+                         sorted(place.key for place in places[::2]))
+
+        # Changes not saved yet are seen
+        places[0].city = 'city_1'
+        self.assertEqual(list(self.storage.find('Place', 'city', 'city_0')),
+                         [places[2].key])
+        self.assertEqual(len(self.storage.find('Place', 'city', 'city_1')), 3)
+
+    def test_new_fields(self):
+        # A table created before User had ratings
+        self.storage.close()
+        conn = sqlite3.connect(filename)
+        conn.execute('CREATE TABLE "User" (id TEXT PRIMARY KEY, '
+                     'created_at TEXT, updated_at TEXT, email TEXT, '
+                     'password TEXT, first_name TEXT, last_name TEXT)')
+        old = User("old@mail.com", "123456", "Old", "User")
+        conn.execute('INSERT INTO "User" VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (old.id, str(old.created_at), str(old.updated_at),
+                      old.email, old.password, old.first_name,
+                      old.last_name))
+        conn.commit()
+        conn.close()
+
+        storage = DataBaseStorage(filename)
+        self.assertEqual(storage.get(old.key).ratings, [0] * 11)
+        new = User("new@mail.com", "123456", "New", "User",
+                   ratings=[0] * 10 + [2])
+        storage.add(new)
+        storage.get(old.key).ratings = [1] + [0] * 10
+        storage.save()
+        storage.close()
+
+        # The column was added, and both users' ratings written
+        storage = DataBaseStorage(filename)
+        self.assertEqual(storage.get(new.key).ratings, [0] * 10 + [2])
+        self.assertEqual(storage.get(old.key).ratings, [1] + [0] * 10)
+        conn = sqlite3.connect(filename)
+        types = {row[1]: row[2] for row in conn.execute(
+            'PRAGMA table_info("User")')}
+        conn.close()
+        self.assertEqual(types.get('ratings'), 'JSON')
+        storage.close()
+        self.storage = DataBaseStorage(filename)
+
+    def test_get_by(self):
+        from model.country import Country
+
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(20)]
+        self.storage.add_many(users + [Country('Uruguay', 'UY')])
+        self.storage.save()
+
+        # Unique fields are indexed by their normalized value
+        conn = sqlite3.connect(filename)
+        plan = conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM "User" '
+            'WHERE lower("email") = ?', ('user3@mail.com', )).fetchall()
+        conn.close()
+        self.assertIn('User_email', str(plan))
+
+        # Only the rows selected are read
+        storage = DataBaseStorage(filename)
+        found = storage.get_by('User', 'email', 'USER3@mail.com')
+        self.assertEqual(found, users[3])
+        self.assertEqual(len(storage._DataBaseStorage__objects), 1)
+        country = storage.get_by('Country', 'iso', 'uy')
+        self.assertEqual(country.name, 'Uruguay')
+        self.assertIsNone(storage.get_by('User', 'email', 'none@mail.com'))
+        self.assertEqual(list(storage.find('User', 'email', 'User5@Mail.com')),
+                         [users[5].key])
+        # The objects read are kept while they're in use
+        user5 = storage.get(users[5].key)
+        self.assertEqual(len(storage._DataBaseStorage__objects), 3)
+
+        # Changes not saved yet are seen
+        storage.get(users[3].key).email = 'new@mail.com'
+        self.assertIsNone(storage.get_by('User', 'email', 'user3@mail.com'))
+        self.assertEqual(storage.get_by('User', 'email', 'NEW@mail.com').id,
+                         users[3].id)
+        new = User("Ünïcode@mail.com", "123456", "John", "Doe")
+        storage.add(new)
+        self.assertIs(storage.get_by('User', 'email', 'ünïcode@mail.com'),
+                      new)
+        storage.close()
+
+    def saved_names(self):
+        conn = sqlite3.connect(filename)
+        rows = conn.execute('SELECT first_name FROM "User"').fetchall()
+        conn.close()
+        return sorted(name for (name, ) in rows)
+
+    def test_transaction(self):
+        john = User("john@mail.com", "123456", "John", "Doe")
+        jane = User('janedoe@mail.com', '654321', 'Jane', 'Doe')
+        self.storage.add_many([john, jane])
+        self.storage.save()
+
+        new = User('new@mail.com', '123456', 'New', 'User')
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                john.first_name = 'Johnny'
+                self.storage.add(new)
+                self.storage.remove(jane)
+                self.storage.save()
+                # Saves are deferred until the block ends
+                self.assertEqual(self.saved_names(), ['Jane', 'John'])
+                raise ValueError
+
+        # Everything done inside the block is undone
+        self.assertEqual(john.first_name, 'John')
+        self.assertIsNone(self.storage.get(new.key))
+        self.assertIs(self.storage.get(jane.key), jane)
+        self.storage.save()
+        self.assertEqual(self.saved_names(), ['Jane', 'John'])
+
+        # A failing inner block only undoes its own changes
+        with self.storage.transaction():
+            john.first_name = 'Johnny'
+            self.storage.save()
+            with self.assertRaises(ValueError):
+                with self.storage.transaction():
+                    jane.first_name = 'Janet'
+                    self.storage.remove(john)
+                    raise ValueError
+            self.assertEqual(self.saved_names(), ['Jane', 'John'])
+        self.assertEqual(jane.first_name, 'Jane')
+        self.assertEqual(self.saved_names(), ['Jane', 'Johnny'])
+
+    def test_pages(self):
+        places = [Place(f'Inn {i}', 'Street 1', 'host_id', 100, 2, 1,
+                        'city_id', 'country_id', 4) for i in range(8)]
+        self.storage.add_many(places)
+        self.storage.save()
+        keys = sorted(place.key for place in places)
+
+        storage = DataBaseStorage(filename)
+        self.assertEqual(list(storage.all('Place', limit=3)), keys[:3])
+        self.assertEqual(list(storage.all('Place', limit=3, after=keys[2])),
+                         keys[3:6])
+
+        # Objects added or removed but not saved yet are seen
+        new = Place('New Inn', 'Street 1', 'host_id', 100, 2, 1,
+                    'city_id', 'country_id', 4)
+        storage.add(new)
+        for key in keys[3:5]:
+            storage.remove(storage.get(key))
+        expected = sorted(keys[:3] + keys[5:] + [new.key])
+        self.assertEqual(list(storage.all('Place', limit=3, after=keys[2])),
+                         [key for key in expected if key > keys[2]][:3])
+        self.assertEqual([place.key for place in storage.iter('Place', 2)],
+                         expected)
+        storage.close()
+
+    def test_threads(self):
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(8)]
+
+        def worker(usr):
+            self.storage.add(usr)
+            self.storage.save()
+
+        threads = [threading.Thread(target=worker, args=(usr, ))
+                   for usr in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        other = DataBaseStorage(filename)
+        self.assertEqual(len(other.all('User')), len(users))
+        other.close()
+
+    def test_list_changed(self):
+        place = Place('Inn', 'Street 1', 'host_id', 100, 2, 1, 'city_id',
+                      'country_id', 4, amenities=[])
+        self.storage.add(place)
+        self.storage.save()
+
+        # Same pattern as the services: change the list, then set it
+        amenities = place.amenities
+        amenities.append('wifi')
+        place.amenities = amenities
+        self.storage.save()
+
+        other = DataBaseStorage(filename)
+        self.assertEqual(other.get(place.key).amenities, ['wifi'])
+        other.close()
+
+    def test_objects_released(self):
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(5)]
+        self.storage.add_many(users)
+        self.storage.save()
+        del users
+        self.storage.reload()
+
+        # Objects read are let go once nobody holds them...
+        objects = self.storage._DataBaseStorage__objects
+        loaded = self.storage.all('User')
+        self.assertEqual(len(objects), 5)
+        del loaded
+        gc.collect()
+        self.assertEqual(len(objects), 0)
+
+        # ...unless they changed and weren't saved yet
+        user = next(iter(self.storage.all('User').values()))
+        key = user.key
+        user.first_name = 'Johnny'
+        del user
+        gc.collect()
+        self.assertEqual(len(objects), 1)
+        self.storage.save()
+        self.assertEqual(len(objects), 0)
+
+        other = DataBaseStorage(filename)
+        self.assertEqual(other.get(key).first_name, 'Johnny')
+        other.close()
+
+    def test_save_changed_only(self):
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(5)]
+        self.storage.add_many(users)
+        self.storage.save()
+
+        conn = self.storage._DataBaseStorage__connection()
+        changes = conn.total_changes
+        users[2].first_name = 'Johnny'
+        self.storage.save()
+        self.assertEqual(conn.total_changes - changes, 1)
+
+        changes = conn.total_changes
+        self.storage.save()
+        self.assertEqual(conn.total_changes, changes)
+
+    def test_no_global_converter(self):
+        # Other sqlite3 users in the process aren't affected by storage
+        self.assertNotIn('JSON', sqlite3.converters)
@@ -6,13 +6,29 @@
 from persistance.file_storage import FileStorage
 from persistance.persistance import Persistance
 from model.user import User
+from model.country import Country
+from model.place import Place
 import unittest
+import threading
+from unittest.mock import patch
 import json
 import os
+import sys
+import time
 
 filename = "test_storage.json"
 
 
+def wait_until(condition, timeout=10):
+    """ Polls `condition` until it's true or `timeout` seconds pass """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
 class TestFileStorage(unittest.TestCase):
     """ Tests for FileStorage """
 
@@ -53,6 +69,51 @@ class TestFileStorage(unittest.TestCase):
         self.assertTrue(retrieved)
         self.assertEqual(retrieved, usr.to_dict())
 
+    def test_save_list_changed_in_place(self):
+        from model.country import Country
+
+        country = Country('Uruguay', 'UY', [])
+        self.storage.add(country)
+        self.storage.save()
+
+        country.cities.append('city_id')
+        self.storage.save()
+        with open(filename, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        self.assertEqual(loaded[country.key]['cities'], ['city_id'])
+
+    def test_save_format(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        new_user = User('janedoe@mail.com', '654321', 'Jane', 'Doe')
+        self.storage.add(usr)
+        self.storage.add(new_user)
+        self.storage.save()
+
+        expected = json.dumps(
+            {usr.key: usr.to_dict(), new_user.key: new_user.to_dict()},
+            indent=2)
+        with open(filename, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), expected)
+
+    def test_save_encodes_changed_objects(self):
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(10)]
+        for usr in users:
+            self.storage.add(usr)
+        self.storage.save()
+
+        users[3].first_name = 'Johnny'
+        with patch('persistance.serializers.json.dumps',
+                   wraps=json.dumps) as mock:
+            self.storage.save()
+        # One call for the record and one for its key
+        self.assertEqual(mock.call_count, 2)
+
+        with open(filename, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        self.assertEqual(loaded[users[3].key]['first_name'], 'Johnny')
+        self.assertEqual(len(loaded), 10)
+
     def test_reload(self):
         usr = User("john@mail.com", "123456", "John", "Doe")
 
@@ -76,6 +137,20 @@ class TestFileStorage(unittest.TestCase):
         self.assertTrue(type(retrieved) is User)
         self.assertEqual(retrieved.id, usr.id)
 
+    def test_reload_drops_stale_objects(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.storage.save()
+        self.storage.reload()
+
+        # The object replaced by the reload no longer moves the index
+        # entries of the one loaded
+        usr.email = 'jane@mail.com'
+        self.assertIsNone(self.storage.get_by('User', 'email',
+                                              'jane@mail.com'))
+        self.assertEqual(len(self.storage.find('User', 'email',
+                                               'john@mail.com')), 1)
+
     def test_remove(self):
         usr = User("john@mail.com", "123456", "John", "Doe")
         self.storage.add(usr)
@@ -105,3 +180,1212 @@ class TestFileStorage(unittest.TestCase):
         self.assertEqual(len(all), 2)
         self.assertEqual(all.get(usr.key), usr)
         self.assertEqual(all, self.storage.all('User'))
+
+    def test_all_by_class(self):
+        from model.amenity import Amenity
+
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        wifi = Amenity("WiFi")
+        self.storage.add(usr)
+        self.storage.add(wifi)
+
+        self.assertEqual(self.storage.all('User'), {usr.key: usr})
+        self.assertEqual(self.storage.all('Amenity'), {wifi.key: wifi})
+        self.assertEqual(self.storage.all('Place'), {})
+
+        # Returned dicts are copies: changing them doesn't change storage
+        self.storage.all('User').clear()
+        self.assertEqual(self.storage.all('User'), {usr.key: usr})
+
+        self.storage.remove(wifi)
+        self.assertEqual(self.storage.all('Amenity'), {})
+        self.assertEqual(self.storage.all(), {usr.key: usr})
+
+        self.storage.add(wifi)
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all('Amenity')), [wifi.key])
+        self.assertEqual(list(self.storage.all('User')), [usr.key])
+
+    def test_count(self):
+        self.assertEqual(self.storage.count(), 0)
+        self.assertEqual(self.storage.count('User'), 0)
+
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        new_user = User('janedoe@mail.com', '654321', 'Jane', 'Doe')
+        self.storage.add(usr)
+        self.storage.add(new_user)
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(self.storage.count('User'), 2)
+        self.assertEqual(self.storage.count('Place'), 0)
+
+        self.storage.remove(usr)
+        self.assertEqual(self.storage.count('User'), 1)
+
+    def test_bulk(self):
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(5)]
+        self.storage.add_many(users)
+        self.assertEqual(self.storage.count('User'), 5)
+
+        keys = [usr.key for usr in users[:3]] + ['User_unknown']
+        self.assertEqual(self.storage.get_many(keys),
+                         {usr.key: usr for usr in users[:3]})
+
+        self.storage.remove_many(users[1:])
+        self.assertEqual(self.storage.all('User'), {users[0].key: users[0]})
+
+        # Nothing is added unless every object can be
+        with self.assertRaises(TypeError):
+            self.storage.add_many([users[1], 'not a model'])
+        self.assertEqual(self.storage.count('User'), 1)
+
+    def test_get_many_lazy(self):
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(5)]
+        self.storage.add_many(users)
+        self.storage.save()
+
+        storage = FileStorage(filename, lazy=True)
+        found = storage.get_many([usr.key for usr in users[:2]])
+        self.assertEqual(list(found.values()), users[:2])
+        self.assertEqual(len(storage._FileStorage__objects), 2)
+
+    def test_get_by(self):
+        usr = User("John@Mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        # Emails are normalized to lower case
+        self.assertIs(self.storage.get_by('User', 'email', 'john@mail.com'),
+                      usr)
+
+        # The index follows the changes made to the object
+        usr.email = "johnny@mail.com"
+        self.assertIsNone(self.storage.get_by('User', 'email',
+                                              'john@mail.com'))
+        self.assertIs(self.storage.get_by('User', 'email',
+                                          'JOHNNY@mail.com'), usr)
+
+        uy = Country("Uruguay", "uy")
+        self.storage.add(uy)
+        self.assertIs(self.storage.get_by('Country', 'iso', 'UY'), uy)
+
+        self.storage.remove(usr)
+        self.assertIsNone(self.storage.get_by('User', 'email',
+                                              'johnny@mail.com'))
+        # Fields without index are looked up by scanning the class
+        self.assertIs(self.storage.get_by('Country', 'name', 'Uruguay'), uy)
+
+    def test_get_by_lazy(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.storage.save()
+
+        storage = FileStorage(filename, lazy=True)
+        # Raw records are indexed too: only the object found is built
+        self.assertEqual(storage.get_by('User', 'email', 'john@mail.com'),
+                         usr)
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+
+    def test_get_by_rollback(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                usr.email = "johnny@mail.com"
+                self.storage.add(User("jane@mail.com", "1", "Jane", "Doe"))
+                raise ValueError
+        self.assertIs(self.storage.get_by('User', 'email', 'john@mail.com'),
+                      usr)
+        self.assertIsNone(self.storage.get_by('User', 'email',
+                                              'johnny@mail.com'))
+        self.assertIsNone(self.storage.get_by('User', 'email',
+                                              'jane@mail.com'))
+
+    def test_find(self):
+        places = [Place(f'Inn {i}', 'Street 1', 'host_id', 100, 2, 1,
+                        f'city_{i % 2}', 'country_id', 4) for i in range(4)]
+        self.storage.add_many(places)
+        self.assertEqual(self.storage.find('Place', 'city', 'city_0'),
+                         {place.key: place for place in places[::2]})
+
+        places[0].city = 'city_1'
+        self.storage.remove(places[1])
+        self.assertEqual(list(self.storage.find('Place', 'city', 'city_1')),
+                         [places[3].key, places[0].key])
+        self.assertEqual(self.storage.find('Place', 'city', 'unknown'), {})
+        self.storage.save()
+
+        # Only the objects found are built
+        storage = FileStorage(filename, lazy=True)
+        found = storage.find('Place', 'city', 'city_0')
+        self.assertEqual(list(found), [places[2].key])
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+        self.assertEqual(len(storage.find('Place', 'host', 'host_id')), 3)
+
+    def test_query(self):
+        places = [Place(f'Inn {i}', 'Street 1', f'host_{i % 2}', 50 + i,
+                        2, 1, f'city_{i % 5}', 'country_id', 4)
+                  for i in range(20)]
+        self.storage.add_many(places)
+        where = {'city': 'city_1', 'host': {'in': ['host_0', 'host_1']},
+                 'price_per_night': {'>': 55}}
+
+        # The most selective index is used
+        plan = self.storage.explain('Place', where=where)
+        self.assertEqual(plan['access'], 'hash index')
+        self.assertEqual(plan['index'], [('city', '==', 'city_1')])
+        self.assertEqual(plan['rows'], 4)
+        self.assertEqual(plan['filters'], [
+            ('host', 'in', ('host_0', 'host_1')),
+            ('price_per_night', '>', 55)])
+        self.assertEqual(
+            self.storage.query('Place', where, '-price_per_night', 2),
+            [places[16], places[11]])
+
+        plan = self.storage.explain('Place', {'id': places[3].id})
+        self.assertEqual((plan['access'], plan['rows']), ('key', 1))
+        self.assertEqual(self.storage.query('Place', {'id': places[3].id}),
+                         [places[3]])
+
+        # Scan when no index applies
+        plan = self.storage.explain('Place', {'name': 'Inn 5'})
+        self.assertEqual((plan['access'], plan['rows']), ('scan', 20))
+        self.assertEqual(self.storage.query('Place', {'name': 'Inn 5'}),
+                         [places[5]])
+        self.storage.save()
+
+        # Only the objects selected by the index are built
+        storage = FileStorage(filename, lazy=True)
+        self.assertEqual(len(storage.query('Place', where)), 3)
+        self.assertEqual(len(storage._FileStorage__objects), 4)
+
+    def test_query_range(self):
+        places = [Place(f'Inn {i}', 'Street 1', 'host_id', 50 + i % 10,
+                        i % 4, 1, 'city_id', 'country_id', i % 7)
+                  for i in range(40)]
+        self.storage.add_many(places)
+
+        def keys(where):
+            return sorted(place.key for place in
+                          self.storage.query('Place', where))
+
+        def expected(check):
+            return sorted(place.key for place in places if check(place))
+
+        where = {'price_per_night': {'>': 52, '<=': 55, '>=': 50},
+                 'max_guests': {'>=': 4}}
+        plan = self.storage.explain('Place', where)
+        self.assertEqual(plan['access'], 'range index')
+        self.assertEqual(plan['index'], [('price_per_night', '>', 52),
+                                         ('price_per_night', '<=', 55),
+                                         ('price_per_night', '>=', 50)])
+        self.assertEqual(plan['rows'], 12)
+        self.assertEqual(plan['filters'], [('max_guests', '>=', 4)])
+        self.assertEqual(keys(where), expected(
+            lambda p: 52 < p.price_per_night <= 55 and p.max_guests >= 4))
+
+        plan = self.storage.explain('Place', {'price_per_night': 53,
+                                              'number_rooms': {'<': 3}})
+        self.assertEqual(plan['index'], [('price_per_night', '==', 53)])
+        self.assertEqual(plan['rows'], 4)
+
+        # The indexes follow the setters, rollbacks and removals
+        places[0].price_per_night = 200
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                places[1].price_per_night = 300
+                raise ValueError
+        self.storage.remove(places[10])
+        self.assertEqual(keys({'price_per_night': {'>': 100}}),
+                         [places[0].key])
+        self.assertEqual(keys({'price_per_night': 50}),
+                         expected(lambda p: p.price_per_night == 50 and
+                                  p is not places[10]))
+        self.assertEqual(
+            [place.price_per_night for place in self.storage.query(
+                'Place', {'price_per_night': {'<': 52}})],
+            [50] * 2 + [51] * 4)
+
+        # Raw records are indexed too
+        self.storage.save()
+        storage = FileStorage(filename, lazy=True)
+        self.assertEqual(len(storage.query('Place', {'max_guests': 6})), 5)
+        self.assertEqual(len(storage._FileStorage__objects), 5)
+
+        # Batches (even repeating an object) leave one entry per object
+        places[2].price_per_night = 400
+        self.storage.add_many(places[2:] + places[2:4])
+        self.assertEqual(keys({'price_per_night': {'>': 100}}),
+                         sorted([places[0].key, places[2].key]))
+        self.storage.remove_many(places[20:])
+        self.assertEqual(keys({'price_per_night': {'>=': 50}}),
+                         sorted(place.key for place in places[:20]))
+
+    def test_pages(self):
+        places = [Place(f'Inn {i}', 'Street 1', 'host_id', 100, 2, 1,
+                        'city_id', 'country_id', 4) for i in range(10)]
+        users = [User(f'user{i}@mail.com', '123456', 'John', 'Doe')
+                 for i in range(3)]
+        self.storage.add_many(places + users)
+        keys = sorted(place.key for place in places)
+
+        page = self.storage.all('Place', limit=4)
+        self.assertEqual(list(page), keys[:4])
+        page = self.storage.all('Place', limit=4, after=keys[3])
+        self.assertEqual(list(page), keys[4:8])
+        self.assertEqual(list(self.storage.all('Place', after=keys[7])),
+                         keys[8:])
+        self.assertEqual(self.storage.all('Place', limit=0), {})
+
+        # Cursors stay valid when objects are added or removed
+        new = Place('New Inn', 'Street 1', 'host_id', 100, 2, 1,
+                    'city_id', 'country_id', 4)
+        self.storage.add(new)
+        self.storage.remove(places[0])
+        expected = sorted(set(keys) - {places[0].key} | {new.key})
+        self.assertEqual(
+            list(self.storage.all('Place', limit=3, after=keys[3])),
+            [key for key in expected if key > keys[3]][:3])
+        self.assertEqual(
+            [place.key for place in self.storage.iter('Place', batch=3)],
+            expected)
+
+        # Pages of every class follow the order of the keys
+        self.assertEqual([obj.key for obj in self.storage.iter(batch=4)],
+                         sorted(self.storage.all()))
+
+        # Only the objects of a page are built in lazy mode
+        self.storage.save()
+        storage = FileStorage(filename, lazy=True)
+        self.assertEqual(list(storage.all('Place', limit=2)), expected[:2])
+        self.assertEqual(len(storage._FileStorage__objects), 2)
+
+        with self.assertRaises(ValueError):
+            self.storage.all('Place', limit=-1)
+        with self.assertRaises(TypeError):
+            self.storage.all('Place', after=1)
+        with self.assertRaises(ValueError):
+            list(self.storage.iter('Place', batch=0))
+
+    def test_version(self):
+        self.assertEqual(self.storage.version('Place'), 0)
+        place = Place('Inn', 'Street 1', 'host_id', 100, 2, 1, 'city_id',
+                      'country_id', 4)
+        versions = []
+        for change in (lambda: self.storage.add(place),
+                       lambda: setattr(place, 'max_guests', 3),
+                       lambda: self.storage.remove(place)):
+            change()
+            versions.append(self.storage.version('Place'))
+        self.assertEqual(len(set(versions)), 3)
+        self.assertEqual(self.storage.version('User'), 0)
+
+        # Versions aren't repeated after a reload
+        self.storage.add(place)
+        self.storage.save()
+        version = self.storage.version('Place')
+        self.storage.reload()
+        self.assertNotIn(self.storage.version('Place'), versions + [version])
+
+    def test_geo(self):
+        places = [Place(f'Inn {i}', 'Street 1', 'host_id', 100, 2, 1,
+                        'city_id', 'country_id', 4,
+                        latitude=-34.9 + i / 10, longitude=-56.2 + i / 10)
+                  for i in range(20)]
+        self.storage.add_many(places)
+
+        def names(found):
+            return [place.name for place, distance in found]
+
+        # Same results as a scan of the class
+        for km in (0, 20, 100, 1000):
+            self.assertEqual(
+                self.storage.near('Place', -34.9, -56.2, km),
+                Persistance.near(self.storage, 'Place', -34.9, -56.2, km))
+        self.assertEqual(names(self.storage.near('Place', -34.9, -56.2, 30)),
+                         ['Inn 0', 'Inn 1', 'Inn 2'])
+        self.assertEqual(names(self.storage.nearest('Place', -33.9, -55.2,
+                                                    3)),
+                         ['Inn 10', 'Inn 9', 'Inn 11'])
+        self.assertEqual(
+            sorted(self.storage.within('Place', -34.85, -56.15, -34.45,
+                                       -55.75)),
+            sorted(place.key for place in places[1:5]))
+
+        # The index follows the setters and removals
+        places[19].latitude = -34.91
+        places[19].longitude = -56.21
+        self.storage.remove(places[0])
+        self.assertEqual(names(self.storage.nearest('Place', -34.9, -56.2,
+                                                    1)), ['Inn 19'])
+        self.storage.save()
+
+        storage = FileStorage(filename, lazy=True)
+        self.assertEqual(names(storage.near('Place', -34.9, -56.2, 30)),
+                         ['Inn 19', 'Inn 1', 'Inn 2'])
+        self.assertEqual(len(storage._FileStorage__objects), 3)
+        with self.assertRaises(ValueError):
+            storage.within('User', -90, -180, 90, 180)
+
+    def test_search(self):
+        texts = ['Cozy loft near the beach', 'Beach house with pool',
+                 'Downtown loft', 'Quiet cabin']
+        places = [Place(f'Place {i}', 'Street 1', 'host_id', 100, 2, 1,
+                        'city_id', 'country_id', 4, description=text)
+                  for i, text in enumerate(texts)]
+        self.storage.add_many(places)
+
+        def names(found):
+            return [place.name for place, score in found]
+
+        self.assertEqual(names(self.storage.search('Place', 'LOFT beach')),
+                         ['Place 0'])
+        self.assertEqual(
+            self.storage.search('Place', 'beach loft', 'or'),
+            Persistance.search(self.storage, 'Place', 'beach loft', 'or'))
+        # Names are searched too
+        self.assertEqual(len(self.storage.search('Place', 'place')), 4)
+
+        # The index follows the setters and removals
+        places[3].description = 'Quiet loft'
+        self.storage.remove(places[0])
+        self.assertEqual(sorted(names(self.storage.search('Place', 'loft'))),
+                         ['Place 2', 'Place 3'])
+        self.storage.save()
+
+        # Only the objects returned are built
+        storage = FileStorage(filename, lazy=True)
+        self.assertEqual(names(storage.search('Place', 'pool')), ['Place 1'])
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+        with self.assertRaises(ValueError):
+            storage.search('User', 'john')
+
+
+class TestFileStorageJournal(unittest.TestCase):
+    """ Tests for FileStorage in journal mode """
+
+    def setUp(self):
+        self.storage = FileStorage(filename, journal=True)
+
+    def tearDown(self):
+        for name in (filename, f"{filename}.journal"):
+            if os.access(name, os.F_OK):
+                os.remove(name)
+
+    def journal_lines(self):
+        with open(f"{filename}.journal", "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_save_appends_only_changes(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        jane = User('janedoe@mail.com', '654321', 'Jane', 'Doe')
+        self.storage.add(usr)
+        self.storage.add(jane)
+        self.storage.save()
+
+        # Snapshot isn't written, only the journal
+        self.assertFalse(os.access(filename, os.F_OK))
+        self.assertEqual(len(self.journal_lines()[0]['set']), 2)
+
+        usr.first_name = 'Johnny'
+        self.storage.save()
+        last = self.journal_lines()[-1]
+        self.assertEqual(list(last['set'].keys()), [usr.key])
+        self.assertEqual(last['del'], [])
+
+        self.storage.remove(jane)
+        self.storage.save()
+        last = self.journal_lines()[-1]
+        self.assertEqual(last['set'], {})
+        self.assertEqual(last['del'], [jane.key])
+
+        # Nothing changed: nothing is appended
+        self.storage.save()
+        self.assertEqual(len(self.journal_lines()), 3)
+
+    def test_list_changed_in_place(self):
+        from model.country import Country
+
+        country = Country('Uruguay', 'UY', [])
+        self.storage.add(country)
+        self.storage.save()
+        self.storage.compact()
+
+        country.cities.append('city_id')
+        self.storage.save()
+        reloaded = FileStorage(filename, journal=True)
+        self.assertEqual(reloaded.get(country.key).cities, ['city_id'])
+
+        # Same for objects that were built by reload()
+        reloaded.get(country.key).cities.append('other_id')
+        reloaded.save()
+        reloaded = FileStorage(filename, journal=True)
+        self.assertEqual(reloaded.get(country.key).cities,
+                         ['city_id', 'other_id'])
+
+    def test_reload_replays_journal(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        jane = User('janedoe@mail.com', '654321', 'Jane', 'Doe')
+        self.storage.add(usr)
+        self.storage.add(jane)
+        self.storage.save()
+        self.storage.compact()
+
+        usr.first_name = 'Johnny'
+        self.storage.remove(jane)
+        self.storage.save()
+
+        reloaded = FileStorage(filename, journal=True)
+        self.assertEqual(len(reloaded.all()), 1)
+        self.assertEqual(reloaded.get(usr.key).first_name, 'Johnny')
+        self.assertEqual(reloaded.get(usr.key), usr)
+
+    def test_reload_ignores_torn_entry(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(usr)
+        self.storage.save()
+        with open(f"{filename}.journal", "a", encoding="utf-8") as f:
+            f.write('{"set": {"User_')
+
+        reloaded = FileStorage(filename, journal=True)
+        self.assertEqual(reloaded.all(), {usr.key: usr})
+
+    def test_compact(self):
+        storage = FileStorage(filename, journal=True, compact_after=2)
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        storage.add(usr)
+        storage.save()
+        usr.last_name = 'Smith'
+        storage.save()
+
+        # Second save reached compact_after: journal folded into snapshot
+        self.assertFalse(os.access(f"{filename}.journal", os.F_OK))
+        with open(filename, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {usr.key: usr.to_dict()})
+
+        reloaded = FileStorage(filename, journal=True)
+        self.assertEqual(reloaded.get(usr.key).last_name, 'Smith')
+
+    def test_fsync_modes(self):
+        with self.assertRaises(ValueError):
+            FileStorage(filename, journal=True, fsync='sometimes')
+
+        for mode in FileStorage.fsync_modes:
+            storage = FileStorage(filename, journal=True, fsync=mode)
+            usr = User(f"{mode}@mail.com", "123456", "John", "Doe")
+            storage.add(usr)
+            storage.save()
+            self.assertEqual(
+                FileStorage(filename, journal=True).get(usr.key), usr)
+
+    def test_fsync_batch_idle(self):
+        storage = FileStorage(filename, journal=True, fsync='batch',
+                              fsync_batch=100, fsync_interval=0.5)
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        storage.add(usr)
+        with patch('persistance.journal.os.fsync',
+                   wraps=os.fsync) as mock:
+            storage.save()
+            storage.save()
+            usr.first_name = 'Johnny'
+            storage.save()
+            self.assertFalse(mock.called)
+            # No save follows: the appends are synced once the interval
+            # has passed anyway
+            self.assertTrue(wait_until(lambda: mock.called))
+            self.assertEqual(mock.call_count, 1)
+
+        # flush() and close() sync them right away
+        storage = FileStorage(filename, journal=True, fsync='batch',
+                              fsync_batch=100, fsync_interval=60)
+        for method in (storage.flush, storage.close):
+            storage.get(usr.key).first_name = method.__name__
+            with patch('persistance.journal.os.fsync',
+                       wraps=os.fsync) as mock:
+                storage.save()
+                self.assertFalse(mock.called)
+                method()
+                self.assertEqual(mock.call_count, 1)
+
+
+class TestFileStorageLazy(unittest.TestCase):
+    """ Tests for FileStorage with lazy hydration """
+
+    def setUp(self):
+        storage = FileStorage(filename)
+        self.users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                      for i in range(5)]
+        for usr in self.users:
+            storage.add(usr)
+        self.country = Country('Uruguay', 'UY')
+        storage.add(self.country)
+        storage.save()
+
+    def tearDown(self):
+        for name in (filename, f"{filename}.journal"):
+            if os.access(name, os.F_OK):
+                os.remove(name)
+
+    def built(self, storage):
+        return storage._FileStorage__objects
+
+    def test_reload_builds_nothing(self):
+        with patch.object(User, 'constructor') as mock:
+            storage = FileStorage(filename, lazy=True)
+            mock.assert_not_called()
+        self.assertEqual(self.built(storage), {})
+        self.assertEqual(storage.count(), 6)
+        self.assertEqual(storage.count('User'), 5)
+
+    def test_get(self):
+        storage = FileStorage(filename, lazy=True)
+        usr = storage.get(self.users[2].key)
+        self.assertEqual(usr, self.users[2])
+        self.assertIs(storage.get(usr.key), usr)
+        self.assertEqual(list(self.built(storage)), [usr.key])
+        self.assertIsNone(storage.get('User_wrong'))
+
+    def test_all(self):
+        storage = FileStorage(filename, lazy=True)
+        self.assertEqual(storage.all('Country'),
+                         {self.country.key: self.country})
+        self.assertEqual(list(self.built(storage)), [self.country.key])
+
+        self.assertEqual(len(storage.all('User')), 5)
+        self.assertEqual(len(storage.all()), 6)
+        self.assertEqual(storage.count(), 6)
+
+    def test_add_remove(self):
+        storage = FileStorage(filename, lazy=True)
+        storage.remove(self.users[0])
+        self.assertIsNone(storage.get(self.users[0].key))
+        self.assertEqual(storage.count('User'), 4)
+
+        replacement = User("new@mail.com", "123456", "John", "Doe")
+        replacement.id = self.users[1].id
+        storage.add(replacement)
+        self.assertIs(storage.get(replacement.key), replacement)
+        self.assertEqual(storage.count('User'), 4)
+
+    def test_save(self):
+        storage = FileStorage(filename, lazy=True)
+        storage.get(self.users[0].key).first_name = 'Johnny'
+        storage.save()
+
+        # Objects that were never built are still saved
+        reloaded = FileStorage(filename)
+        self.assertEqual(len(reloaded.all()), 6)
+        self.assertEqual(reloaded.get(self.users[0].key).first_name,
+                         'Johnny')
+        self.assertEqual(reloaded.get(self.users[1].key), self.users[1])
+
+    def test_journal(self):
+        FileStorage(filename, journal=True).compact()
+        storage = FileStorage(filename, journal=True, lazy=True)
+        storage.get(self.users[0].key)
+        storage.remove(self.users[1])
+        storage.save()
+
+        with open(f"{filename}.journal", "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        # Building an object doesn't make it look changed
+        self.assertEqual(entries, [{'set': {}, 'del': [self.users[1].key]}])
+
+    def test_warm_up(self):
+        storage = FileStorage(filename, lazy=True)
+        storage.warm_up(['Country'], background=False)
+        self.assertEqual(list(self.built(storage)), [self.country.key])
+
+        thread = storage.warm_up()
+        thread.join()
+        self.assertEqual(len(self.built(storage)), 6)
+        self.assertEqual(storage.get(self.users[4].key), self.users[4])
+
+
+class TestFileStorageShards(unittest.TestCase):
+    """ Tests for FileStorage with one file (or more) per class """
+
+    def setUp(self):
+        self.users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                      for i in range(20)]
+        self.country = Country('Uruguay', 'UY')
+
+    def tearDown(self):
+        for name in os.listdir('.'):
+            if name.startswith('test_storage.') and name.endswith('.json'):
+                os.remove(name)
+        if os.access(f"{filename}.journal", os.F_OK):
+            os.remove(f"{filename}.journal")
+
+    def fill(self, storage):
+        for usr in self.users:
+            storage.add(usr)
+        storage.add(self.country)
+        storage.save()
+
+    def test_filenames(self):
+        storage = FileStorage(filename, shards=1)
+        self.assertEqual(storage.shard_filename(self.users[0].key),
+                         'test_storage.User.json')
+        self.assertIn('test_storage.Place.json',
+                      storage.snapshot_filenames())
+
+        storage = FileStorage(filename, shards=4)
+        self.assertRegex(storage.shard_filename(self.users[0].key),
+                         r'^test_storage\.User\.[0-3]\.json$')
+        self.assertEqual(len(storage.snapshot_filenames()), 6 * 4)
+
+        with self.assertRaises(ValueError):
+            FileStorage(filename, shards=0)
+
+    def test_one_file_per_class(self):
+        storage = FileStorage(filename, shards=1)
+        self.fill(storage)
+
+        self.assertFalse(os.access(filename, os.F_OK))
+        with open('test_storage.User.json', "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 20)
+        with open('test_storage.Country.json', "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f),
+                             {self.country.key: self.country.to_dict()})
+        self.assertFalse(os.access('test_storage.Place.json', os.F_OK))
+
+        reloaded = FileStorage(filename, shards=1)
+        self.assertEqual(len(reloaded.all()), 21)
+        self.assertEqual(reloaded.get(self.users[3].key), self.users[3])
+
+    def test_only_dirty_shards_are_written(self):
+        storage = FileStorage(filename, shards=4)
+        self.fill(storage)
+        shards = [name for name in storage.snapshot_filenames()
+                  if os.access(name, os.F_OK)]
+        self.assertGreater(len(shards), 2)
+
+        # Files that are rewritten show up again once deleted
+        for name in shards:
+            os.remove(name)
+        self.users[0].first_name = 'Johnny'
+        storage.save()
+        written = [name for name in storage.snapshot_filenames()
+                   if os.access(name, os.F_OK)]
+        self.assertEqual(written, [storage.shard_filename(self.users[0].key)])
+
+        # Saving without changes writes nothing
+        os.remove(written[0])
+        storage.save()
+        self.assertFalse(os.access(written[0], os.F_OK))
+
+    def test_remove(self):
+        storage = FileStorage(filename, shards=1)
+        self.fill(storage)
+
+        storage.remove(self.country)
+        storage.remove(self.users[0])
+        storage.save()
+        self.assertFalse(os.access('test_storage.Country.json', os.F_OK))
+
+        reloaded = FileStorage(filename, shards=1)
+        self.assertEqual(len(reloaded.all()), 19)
+        self.assertIsNone(reloaded.get(self.users[0].key))
+
+    def test_lazy_and_journal(self):
+        self.fill(FileStorage(filename, shards=4))
+
+        storage = FileStorage(filename, shards=4, lazy=True, journal=True)
+        self.assertEqual(storage.count('User'), 20)
+        storage.get(self.users[1].key).last_name = 'Smith'
+        storage.save()
+        storage.compact()
+
+        reloaded = FileStorage(filename, shards=4)
+        self.assertEqual(reloaded.get(self.users[1].key).last_name, 'Smith')
+        self.assertEqual(len(reloaded.all()), 21)
+
+
+class TestFileStorageCommit(unittest.TestCase):
+    """ Tests for atomic saves and group commit """
+
+    def tearDown(self):
+        for name in os.listdir('.'):
+            if name.startswith(filename):
+                os.remove(name)
+
+    def test_atomic_save(self):
+        storage = FileStorage(filename)
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        storage.add(usr)
+        storage.save()
+        with open(filename, "r", encoding="utf-8") as f:
+            saved = f.read()
+
+        # The process dies before the new version replaces the old one
+        usr.first_name = 'Johnny'
+        with patch('persistance.files.os.replace',
+                   side_effect=OSError('crash')), \
+                patch('sys.stderr'):
+            storage.save()
+
+        with open(filename, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), saved)
+        self.assertEqual([name for name in os.listdir('.')
+                          if name.startswith(filename)], [filename])
+
+        storage.save()
+        self.assertEqual(
+            FileStorage(filename).get(usr.key).first_name, 'Johnny')
+
+    def test_fsync(self):
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        for mode, expected in (('always', True), ('none', False)):
+            storage = FileStorage(filename, fsync=mode)
+            storage.add(usr)
+            usr.first_name = mode
+            with patch('persistance.files.os.fsync') as mock:
+                storage.save()
+            self.assertEqual(mock.called, expected)
+
+    def test_group_commit(self):
+        storage = FileStorage(filename, group_commit=0.05)
+        users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                 for i in range(8)]
+        barrier = threading.Barrier(len(users))
+        missing = []
+
+        def worker(usr):
+            barrier.wait()
+            storage.add(usr)
+            storage.save()
+            # save() only returns once the write covering it is done
+            with open(filename, "r", encoding="utf-8") as f:
+                if usr.key not in json.load(f):
+                    missing.append(usr.key)
+
+        threads = [threading.Thread(target=worker, args=(usr, ))
+                   for usr in users]
+        with patch('persistance.files.os.replace',
+                   wraps=os.replace) as mock:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(missing, [])
+        self.assertLess(mock.call_count, len(users))
+        self.assertEqual(len(FileStorage(filename).all('User')), len(users))
+
+
+class TestFileStorageTransaction(unittest.TestCase):
+    """ Tests for FileStorage transactions """
+
+    def setUp(self):
+        self.storage = FileStorage(filename)
+        self.usr = User("john@mail.com", "123456", "John", "Doe")
+        self.storage.add(self.usr)
+        self.storage.save()
+
+    def tearDown(self):
+        if os.access(filename, os.F_OK):
+            os.remove(filename)
+
+    def test_deferred_save(self):
+        country = Country('Uruguay', 'UY')
+        with patch('persistance.files.os.replace',
+                   wraps=os.replace) as mock:
+            with self.storage.transaction():
+                self.storage.add(country)
+                self.storage.save()
+                self.usr.first_name = 'Johnny'
+                self.storage.save()
+                self.assertEqual(mock.call_count, 0)
+            self.assertEqual(mock.call_count, 1)
+
+        storage = FileStorage(filename)
+        self.assertIsNotNone(storage.get(country.key))
+        self.assertEqual(storage.get(self.usr.key).first_name, 'Johnny')
+
+    def test_change_waits_for_transaction(self):
+        # Changes made outside a transaction update the indexes under the
+        # storage's lock: they wait for the transactions of other threads
+        started = threading.Event()
+        release = threading.Event()
+
+        def transaction():
+            with self.storage.transaction():
+                started.set()
+                release.wait(5)
+
+        other = threading.Thread(target=transaction)
+        other.start()
+        started.wait(5)
+        change = threading.Thread(
+            target=setattr, args=(self.usr, 'email', 'new@mail.com'))
+        change.start()
+        change.join(0.1)
+        self.assertTrue(change.is_alive())
+
+        release.set()
+        other.join(5)
+        change.join(5)
+        self.assertFalse(change.is_alive())
+        self.assertIs(self.storage.get_by('User', 'email', 'new@mail.com'),
+                      self.usr)
+
+    def test_rollback(self):
+        country = Country('Uruguay', 'UY')
+        record = self.usr.to_dict()
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                self.storage.add(country)
+                self.usr.first_name = 'Johnny'
+                self.storage.remove(self.usr)
+                self.storage.save()
+                raise ValueError('failed')
+
+        self.assertIsNone(self.storage.get(country.key))
+        self.assertIs(self.storage.get(self.usr.key), self.usr)
+        self.assertEqual(self.usr.to_dict(), record)
+        self.assertEqual(self.storage.count(), 1)
+
+        # Nothing was written
+        self.assertEqual(FileStorage(filename).get(self.usr.key), self.usr)
+        self.assertIsNone(FileStorage(filename).get(country.key))
+
+        # Changes made after the rollback are saved as usual
+        self.usr.last_name = 'Smith'
+        self.storage.save()
+        self.assertEqual(
+            FileStorage(filename).get(self.usr.key).last_name, 'Smith')
+
+    def test_nested(self):
+        country = Country('Uruguay', 'UY')
+        with self.storage.transaction():
+            self.usr.first_name = 'Johnny'
+            try:
+                with self.storage.transaction():
+                    self.storage.add(country)
+                    self.usr.first_name = 'Jack'
+                    self.storage.save()
+                    raise ValueError('failed')
+            except ValueError:
+                pass
+
+            # Only the inner block was undone
+            self.assertEqual(self.usr.first_name, 'Johnny')
+            self.assertIsNone(self.storage.get(country.key))
+
+        storage = FileStorage(filename)
+        self.assertEqual(storage.get(self.usr.key).first_name, 'Johnny')
+        self.assertIsNone(storage.get(country.key))
+
+    def test_rollback_lazy(self):
+        storage = FileStorage(filename, lazy=True)
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        usr.id = self.usr.id
+        with self.assertRaises(ValueError):
+            with storage.transaction():
+                # Replaces the raw record without building its object
+                storage.add(usr)
+                raise ValueError('failed')
+
+        self.assertEqual(storage.count(), 1)
+        self.assertIsNot(storage.get(self.usr.key), usr)
+        self.assertEqual(storage.get(self.usr.key), self.usr)
+
+
+class TestFileStorageWriteBehind(unittest.TestCase):
+    """ Tests for FileStorage with a write-behind writer thread """
+
+    def setUp(self):
+        self.users = [User(f"user{i}@mail.com", "123456", "John", "Doe")
+                      for i in range(10)]
+
+    def tearDown(self):
+        for name in os.listdir('.'):
+            if name.startswith(filename):
+                os.remove(name)
+
+    def test_save_returns_before_write(self):
+        storage = FileStorage(filename, write_behind=60)
+        storage.add(self.users[0])
+        storage.save()
+        self.assertFalse(os.access(filename, os.F_OK))
+
+        storage.flush()
+        self.assertIn(self.users[0].key, FileStorage(filename).all())
+        storage.close()
+
+    def test_debounce(self):
+        storage = FileStorage(filename, write_behind=60)
+        with patch('persistance.files.os.replace',
+                   wraps=os.replace) as mock:
+            for usr in self.users:
+                storage.add(usr)
+                storage.save()
+            storage.flush()
+        # All the saves are coalesced into a single write
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(FileStorage(filename).count('User'), 10)
+        storage.close()
+
+    def test_backpressure(self):
+        storage = FileStorage(filename, write_behind=0, max_pending=2)
+        writing = threading.Event()
+        release = threading.Event()
+        replace = os.replace
+
+        def slow_replace(*args):
+            writing.set()
+            release.wait()
+            replace(*args)
+
+        def worker():
+            for usr in self.users[:5]:
+                storage.add(usr)
+                storage.save()
+
+        with patch('persistance.files.os.replace',
+                   side_effect=slow_replace):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            writing.wait()
+            # The writer is stuck: saves block once 2 are pending
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+
+            release.set()
+            thread.join()
+            storage.flush()
+
+        self.assertEqual(FileStorage(filename).count('User'), 5)
+        storage.close()
+
+    def test_close(self):
+        storage = FileStorage(filename, write_behind=60)
+        storage.add(self.users[0])
+        storage.save()
+        storage.close()
+        self.assertIn(self.users[0].key, FileStorage(filename).all())
+
+        # Saves made after closing are written right away
+        storage.add(self.users[1])
+        storage.save()
+        self.assertIn(self.users[1].key, FileStorage(filename).all())
+
+
+class TestFileStorageThreads(unittest.TestCase):
+    """ Stress tests for FileStorage shared by many threads """
+
+    def tearDown(self):
+        for name in os.listdir('.'):
+            if name.startswith(filename):
+                os.remove(name)
+
+    def test_stress(self):
+        storage = FileStorage(filename)
+        errors = []
+        workers = 8
+        rounds = 30
+        barrier = threading.Barrier(workers)
+
+        def worker(n):
+            try:
+                barrier.wait()
+                mine = []
+                for i in range(rounds):
+                    usr = User(f"user{n}_{i}@mail.com", "123456", "J", "D")
+                    storage.add(usr)
+                    mine.append(usr)
+                    if i % 3 == 0:
+                        storage.remove(mine.pop(0))
+                    # Readers iterate while other threads add and remove
+                    for key, obj in storage.all().items():
+                        obj.record
+                    storage.all('User')
+                    storage.count()
+                    storage.get(usr.key)
+                    if i % 5 == 0:
+                        storage.save()
+                storage.save()
+            except Exception as error:
+                errors.append(error)
+
+        interval = sys.getswitchinterval()
+        # Switch threads much more often to make races likely
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=worker, args=(n, ))
+                       for n in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        expected = workers * (rounds - rounds // 3)
+        self.assertEqual(storage.count('User'), expected)
+        self.assertEqual(FileStorage(filename).count('User'), expected)
+
+    def test_transactions_are_serialized(self):
+        storage = FileStorage(filename)
+        country = Country('Uruguay', 'UY')
+        storage.add(country)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(20):
+                    # Read-modify-write: no update may be lost
+                    with storage.transaction():
+                        country.cities = country.cities + [f"{n}_{i}"]
+                        storage.save()
+            except Exception as error:
+                errors.append(error)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=worker, args=(n, ))
+                       for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(country.cities), 8 * 20)
+        self.assertEqual(
+            len(FileStorage(filename).get(country.key).cities), 8 * 20)
+
+
+def add_users(n, count):
+    """ Adds users from another process, saving after each one """
+    storage = FileStorage(filename, shared=True)
+    for i in range(count):
+        storage.add(User(f"user{n}_{i}@mail.com", "123456", "John", "Doe"))
+        storage.save()
+
+
+class TestFileStorageShared(unittest.TestCase):
+    """ Tests for FileStorage shared by several processes """
+
+    def setUp(self):
+        # Two storages on the same files behave like two processes:
+        # flock() locks are held by each open lock file
+        self.usr = User("john@mail.com", "123456", "John", "Doe")
+        self.other = User("jane@mail.com", "654321", "Jane", "Doe")
+
+    def tearDown(self):
+        for name in os.listdir('.'):
+            if name.startswith(filename):
+                os.remove(name)
+
+    def test_save_merges(self):
+        first = FileStorage(filename, shared=True)
+        second = FileStorage(filename, shared=True)
+
+        first.add(self.usr)
+        first.save()
+        second.add(self.other)
+        second.save()
+
+        # The second save didn't overwrite the first one
+        self.assertEqual(FileStorage(filename).count('User'), 2)
+        self.assertIsNotNone(second.get(self.usr.key))
+        # Unsaved objects keep their identity
+        self.assertIs(second.get(self.other.key), self.other)
+
+    def test_stale(self):
+        first = FileStorage(filename, shared=True)
+        second = FileStorage(filename, shared=True)
+        self.assertFalse(second.is_stale())
+        self.assertFalse(second.refresh())
+
+        first.add(self.usr)
+        first.save()
+        self.assertFalse(first.is_stale())
+        self.assertTrue(second.is_stale())
+
+        # Unsaved changes survive the refresh
+        second.add(self.other)
+        with patch('persistance.file_storage.open', wraps=open) as mock:
+            self.assertTrue(second.refresh())
+            self.assertFalse(second.refresh())
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(second.count('User'), 2)
+        self.assertIs(second.get(self.other.key), self.other)
+
+    def test_changes_and_removals(self):
+        first = FileStorage(filename, shared=True)
+        first.add(self.usr)
+        first.add(self.other)
+        first.save()
+
+        second = FileStorage(filename, shared=True)
+        first.get(self.usr.key).first_name = 'Johnny'
+        first.save()
+
+        # Stale: the change made by the first storage isn't lost, and the
+        # removal is applied on top
+        second.remove(second.get(self.other.key))
+        second.save()
+
+        storage = FileStorage(filename)
+        self.assertEqual(storage.get(self.usr.key).first_name, 'Johnny')
+        self.assertIsNone(storage.get(self.other.key))
+
+        first.refresh()
+        self.assertIsNone(first.get(self.other.key))
+
+    def test_refresh_drops_stale_objects(self):
+        first = FileStorage(filename, shared=True)
+        first.add(self.usr)
+        first.add(self.other)
+        first.save()
+        second = FileStorage(filename, shared=True)
+        stale = second.get(self.usr.key)
+        kept = second.get(self.other.key)
+
+        first.get(self.usr.key).email = 'johnny@mail.com'
+        first.save()
+        self.assertTrue(second.refresh())
+        self.assertIsNot(second.get(self.usr.key), stale)
+        self.assertIs(second.get(self.other.key), kept)
+
+        # Only the objects kept by the refresh still report their changes
+        stale.email = 'stale@mail.com'
+        self.assertIsNone(second.get_by('User', 'email', 'stale@mail.com'))
+        self.assertEqual(len(second.find('User', 'email',
+                                         'johnny@mail.com')), 1)
+        kept.email = 'janet@mail.com'
+        self.assertIs(second.get_by('User', 'email', 'janet@mail.com'),
+                      kept)
+
+    def test_journal(self):
+        first = FileStorage(filename, shared=True, journal=True)
+        second = FileStorage(filename, shared=True, journal=True)
+        first.add(self.usr)
+        first.save()
+        second.add(self.other)
+        second.save()
+        second.remove(second.get(self.usr.key))
+        second.save()
+
+        storage = FileStorage(filename, journal=True)
+        self.assertEqual(list(storage.all()), [self.other.key])
+
+    def test_processes(self):
+        import multiprocessing
+
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=add_users, args=(n, 10))
+                     for n in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual(FileStorage(filename).count('User'), 40)
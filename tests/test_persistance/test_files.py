@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""
+    Tests for the file helpers of FileStorage
+"""
+
+from persistance.files import FileLock, write_atomically
+from unittest.mock import patch
+import os
+import unittest
+
+filename = "test_storage.json"
+
+
+@unittest.skipUnless(FileLock.available, 'needs fcntl file locking')
+class TestFileLock(unittest.TestCase):
+    """ Tests for FileLock """
+
+    def tearDown(self):
+        if os.access(f"{filename}.lock", os.F_OK):
+            os.remove(f"{filename}.lock")
+
+    def test_generation(self):
+        lock = FileLock(f"{filename}.lock")
+        self.assertEqual(lock.generation(), 0)
+        with lock.hold(exclusive=True):
+            # Reentrant
+            with lock.hold():
+                lock.set_generation(3)
+        self.assertEqual(FileLock(f"{filename}.lock").generation(), 3)
+
+
+class TestWriteAtomically(unittest.TestCase):
+    """ Tests for write_atomically """
+
+    def tearDown(self):
+        if os.access(filename, os.F_OK):
+            os.remove(filename)
+
+    def test_write(self):
+        write_atomically(filename, '{"a": 1}', fsync=True)
+        write_atomically(filename, b'\x00\x01', binary=True)
+        with open(filename, "rb") as f:
+            self.assertEqual(f.read(), b'\x00\x01')
+
+    def test_failed_write(self):
+        write_atomically(filename, 'old')
+        with patch('persistance.files.os.replace', side_effect=OSError), \
+                self.assertRaises(OSError):
+            write_atomically(filename, 'new')
+        with open(filename, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), 'old')
+        # No temporary file left behind
+        self.assertEqual([name for name in os.listdir('.')
+                          if name.endswith('.tmp')], [])
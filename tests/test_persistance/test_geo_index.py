@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""
+    Tests for the GeoIndex class
+"""
+
+from persistance.geo_index import GeoIndex, haversine
+import unittest
+import random
+
+
+class TestGeoIndex(unittest.TestCase):
+    """ Tests for GeoIndex """
+
+    def setUp(self):
+        self.index = GeoIndex()
+        rand = random.Random(0)
+        self.points = {
+            f'key_{i}': (rand.uniform(-60, 60), rand.uniform(-180, 180))
+            for i in range(2000)
+        }
+        for key, point in self.points.items():
+            self.index.add(key, *point)
+
+    def test_haversine(self):
+        # Montevideo - Buenos Aires
+        self.assertAlmostEqual(
+            haversine(-34.9011, -56.1645, -34.6037, -58.3816), 205, delta=1)
+        self.assertEqual(haversine(10, 20, 10, 20), 0)
+
+    def test_radius(self):
+        for lat, lon, km in ((0, 0, 1500), (50, 179, 800), (-59, -10, 3000)):
+            expected = sorted(
+                (haversine(lat, lon, *point), key)
+                for key, point in self.points.items()
+                if haversine(lat, lon, *point) <= km)
+            self.assertEqual(self.index.radius(lat, lon, km), expected)
+            self.assertTrue(expected)
+
+    def test_nearest(self):
+        for lat, lon in ((0, 0), (89, 0), (10, -180)):
+            expected = sorted(
+                (haversine(lat, lon, *point), key)
+                for key, point in self.points.items())[:5]
+            self.assertEqual(self.index.nearest(lat, lon, 5), expected)
+        self.assertEqual(len(self.index.nearest(0, 0, 5000)), 2000)
+
+    def test_box(self):
+        def expected(south, west, north, east):
+            return sorted(
+                key for key, (lat, lon) in self.points.items()
+                if south <= lat <= north and
+                (west <= lon <= east if west <= east else
+                 lon >= west or lon <= east))
+
+        for box in ((-10, -10, 10, 10), (20, 170, 40, -170),
+                    (-90, -180, 90, 180)):
+            self.assertEqual(sorted(self.index.box(*box)), expected(*box))
+
+    def test_add_remove(self):
+        self.index.add('key_0', 1.0, 1.0)
+        self.assertEqual(self.index.box(0.5, 0.5, 1.5, 1.5), ['key_0'])
+        self.index.remove('key_0')
+        self.index.remove('key_0')
+        self.assertEqual(self.index.box(0.5, 0.5, 1.5, 1.5), [])
+        self.assertEqual(len(self.index), 1999)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.index.radius(91, 0, 10)
+        with self.assertRaises(ValueError):
+            self.index.radius(0, 0, -1)
+        with self.assertRaises(TypeError):
+            self.index.box('0', 0, 1, 1)
+        with self.assertRaises(ValueError):
+            self.index.nearest(0, 0, 0)
@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+"""
+    Tests for the Indexes class
+"""
+
+from model.base import MISSING
+from model.place import Place
+from model.user import User
+from persistance.indexes import Indexes, indexed_values
+from persistance.query import Query
+from unittest.mock import ANY
+import unittest
+
+
+class TestIndexes(unittest.TestCase):
+    """ Tests for Indexes """
+
+    def setUp(self):
+        self.indexes = Indexes()
+        self.usr = User("John@mail.com", "123456", "John", "Doe")
+        self.places = [
+            Place(f'Place {i}', 'Street', self.usr.id, 100 * i, 2, 1,
+                  'city_id', 'country_id', 4,
+                  latitude=10.0 + i, longitude=20.0)
+            for i in range(3)
+        ]
+        self.indexes.add(self.usr.key, self.usr)
+        for place in self.places:
+            self.indexes.add(place.key, place)
+        self.indexes.build_ranges(
+            (obj.key, obj) for obj in [self.usr, *self.places])
+
+    def test_indexed_values(self):
+        indexed = indexed_values(self.usr)
+        self.assertEqual(indexed.classname, 'User')
+        self.assertEqual(indexed.values, [('email', 'john@mail.com')])
+        self.assertEqual(indexed.ranges, [('id', self.usr.id)])
+        # Raw records hold the same values
+        self.assertEqual(indexed_values(self.usr.to_dict()), indexed)
+
+    def test_keys(self):
+        self.assertEqual(list(self.indexes.keys(User, 'email',
+                                                'JOHN@mail.com')),
+                         [self.usr.key])
+        self.assertEqual(len(self.indexes.keys(Place, 'host', self.usr.id)),
+                         3)
+
+        self.indexes.remove(self.places[0].key, self.places[0])
+        self.assertEqual(len(self.indexes.keys(Place, 'host', self.usr.id)),
+                         2)
+        self.assertEqual(self.indexes.sorted('Place', 'price_per_night')
+                         .keys(), [self.places[1].key, self.places[2].key])
+        self.assertEqual(self.indexes.geo('Place').box(0, 0, 50, 50),
+                         [self.places[1].key, self.places[2].key])
+
+    def test_changed(self):
+        old = self.usr.email
+        self.usr.email = 'jane@mail.com'
+        self.indexes.changed(self.usr, '_User__email', old)
+        self.assertEqual(self.indexes.keys(User, 'email', old), {})
+        self.assertIn(self.usr.key,
+                      self.indexes.keys(User, 'email', 'jane@mail.com'))
+
+        place = self.places[0]
+        place.price_per_night = 1000
+        self.indexes.changed(place, '_Place__price_per_night', 0)
+        self.assertEqual(
+            self.indexes.sorted('Place', 'price_per_night').keys(low=500),
+            [place.key])
+
+        place.description = 'A cosy cabin'
+        self.indexes.changed(place, '_Place__description', MISSING)
+        self.assertEqual(self.indexes.text('Place').search('cabin'),
+                         [(ANY, place.key)])
+
+    def test_batch(self):
+        batch = {}
+        for place in self.places:
+            self.indexes.remove(place.key, place, batch)
+        # Sorted entries wait for the batch to be applied
+        self.assertEqual(
+            len(self.indexes.sorted('Place', 'price_per_night').keys()), 3)
+        self.indexes.apply(batch)
+        self.assertEqual(
+            self.indexes.sorted('Place', 'price_per_night').keys(), [])
+
+    def test_versions(self):
+        version = self.indexes.version('Place')
+        self.assertGreater(version, 0)
+        self.indexes.touch('Place')
+        self.assertGreater(self.indexes.version('Place'), version)
+        self.assertEqual(self.indexes.version('City'), 0)
+
+        # Never repeated after clear()
+        self.indexes.clear()
+        self.assertEqual(self.indexes.version('Place'), 0)
+        self.indexes.touch('Place')
+        self.assertGreater(self.indexes.version('Place'), version)
+
+    def test_accesses(self):
+        query = Query(Place, {
+            'price_per_night': {'>': 50},
+            'host': self.usr.id,
+            'id': {'in': [self.places[0].id, 'missing']},
+        })
+        accesses = {
+            access: (rows, fetch()) for access, predicates, rows, fetch
+            in self.indexes.accesses(query, lambda key: key != 'Place_missing')
+        }
+        self.assertEqual(accesses['key'], (1, [self.places[0].key]))
+        self.assertEqual(accesses['hash index'][0], 3)
+        self.assertEqual(accesses['range index'],
+                         (2, [self.places[1].key, self.places[2].key]))
+
+    def test_range_bounds(self):
+        self.assertEqual(
+            Indexes.range_bounds([('a', '>', 1), ('a', '>=', 1),
+                                  ('a', '<', 5), ('a', '<=', 3)]),
+            {'low': 1, 'high': 3, 'low_inclusive': False,
+             'high_inclusive': True})
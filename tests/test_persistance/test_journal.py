@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""
+    Tests for the Journal class
+"""
+
+from persistance.journal import Journal
+from unittest.mock import patch
+import os
+import time
+import unittest
+
+filename = "test_storage.json.journal"
+
+
+def wait_until(condition, timeout=10):
+    """ Polls `condition` until it's true or `timeout` seconds pass """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestJournal(unittest.TestCase):
+    """ Tests for Journal """
+
+    def tearDown(self):
+        if os.access(filename, os.F_OK):
+            os.remove(filename)
+
+    def replay(self, journal):
+        loaded = {}
+        entries = journal.replay(loaded.__setitem__, loaded.pop)
+        return entries, loaded
+
+    def test_replay(self):
+        journal = Journal(filename)
+        self.assertEqual(self.replay(journal), (0, {}))
+        journal.append({'User_1': {'id': '1'}, 'User_2': {'id': '2'}}, [])
+        journal.append({'User_1': {'id': '1', 'a': 1}}, ['User_2'])
+        self.assertEqual(self.replay(journal),
+                         (2, {'User_1': {'id': '1', 'a': 1}}))
+
+        # A torn last line is ignored
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write('{"set": {"User_3"')
+        self.assertEqual(self.replay(journal)[0], 2)
+
+        journal.remove()
+        self.assertFalse(os.access(filename, os.F_OK))
+        self.assertEqual(self.replay(journal), (0, {}))
+
+    def test_fsync(self):
+        for mode, calls in (('always', 3), ('batch', 1), ('none', 0)):
+            journal = Journal(filename, mode, batch=2, interval=60)
+            with patch('persistance.journal.os.fsync',
+                       wraps=os.fsync) as mock:
+                for i in range(3):
+                    journal.append({f'User_{i}': {'id': str(i)}}, [])
+                self.assertEqual(mock.call_count, calls)
+                # Only the append left by the batch is synced
+                journal.sync()
+                self.assertEqual(mock.call_count, calls + (mode == 'batch'))
+                journal.sync()
+                self.assertEqual(mock.call_count, calls + (mode == 'batch'))
+
+    def test_sync_timer(self):
+        journal = Journal(filename, 'batch', batch=100, interval=0.5)
+        with patch('persistance.journal.os.fsync', wraps=os.fsync) as mock:
+            journal.append({'User_1': {'id': '1'}}, [])
+            self.assertFalse(mock.called)
+            # No append follows: synced once the interval has passed
+            self.assertTrue(wait_until(lambda: mock.called))
+            self.assertEqual(mock.call_count, 1)
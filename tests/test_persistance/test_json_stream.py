@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+"""
+    Tests for the incremental JSON parser used to reload storage files.
+
+    The memory tests generate a storage file of STREAM_TEST_MB MB (4 by
+    default, to keep the suite fast). A 4 MB file can't show that memory
+    stays flat as files grow: the realistic check runs them on a file of
+    a few hundred MB, e.g. STREAM_TEST_MB=300.
+"""
+
+from persistance.json_stream import iter_items
+from persistance.file_storage import FileStorage
+from datetime import datetime
+from uuid import uuid4
+import tracemalloc
+import unittest
+import json
+import io
+import os
+
+filename = "test_stream_storage.json"
+size_mb = float(os.environ.get('STREAM_TEST_MB', 4))
+
+
+def generate(filename, size_mb):
+    """
+        Writes a storage file of about `size_mb` MB of User records,
+        formatted like FileStorage does, one record at a time
+    """
+    size = 0
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write('{')
+        separator = '\n  '
+        while size < size_mb * 1_000_000:
+            id = str(uuid4())
+            now = str(datetime.now())
+            record = {
+                'id': id, 'created_at': now, 'updated_at': now,
+                'email': f'{id}@mail.com', 'password': id * 2,
+                'first_name': 'John', 'last_name': 'Doe',
+                '__class__': 'User'
+            }
+            text = json.dumps(record, indent=2).replace('\n', '\n  ')
+            entry = f'{separator}"User_{id}": {text}'
+            size += f.write(entry)
+            separator = ',\n  '
+        f.write('\n}')
+
+
+class TestIterItems(unittest.TestCase):
+    """ Tests for iter_items """
+
+    def test_items(self):
+        documents = (
+            '{}', ' {\n} ', '{"a": 1}',
+            '{"a": 1, "b": [1, 2.5], "c": {"x": "}{"}, "d": null,'
+            ' "e": true, "f": "\\"quoted\\"", "g": 12345678}',
+            json.dumps({f"key{i}": {"value": i} for i in range(100)},
+                       indent=2)
+        )
+        # Chunks as small as one character must give the same result
+        for document in documents:
+            for chunk_size in (1, 2, 3, 7, 64, 1 << 16):
+                items = iter_items(io.StringIO(document), chunk_size)
+                self.assertEqual(dict(items), json.loads(document))
+
+    def test_empty_file(self):
+        self.assertEqual(list(iter_items(io.StringIO(''))), [])
+
+    def test_is_incremental(self):
+        items = iter_items(io.StringIO('{"a": 1, "b": oops}'), 4)
+        self.assertEqual(next(items), ('a', 1))
+        with self.assertRaises(json.JSONDecodeError):
+            next(items)
+
+    def test_malformed(self):
+        for document in ('{"a": 1', '{"a" 1}', '[1, 2]', '{"a": 1,}',
+                         '{"a": 1 "b": 2}'):
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_items(io.StringIO(document), 2))
+
+
+class TestStreamingMemory(unittest.TestCase):
+    """
+        Peak memory of reloading a large storage file (see STREAM_TEST_MB
+        above). The parser's peak has an absolute bound, whatever the size
+        of the file. Reloads retain the objects (or records) and their
+        indexes, so their peak is bounded by that plus a constant
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        generate(filename, size_mb)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.access(filename, os.F_OK):
+            os.remove(filename)
+
+    def setUp(self):
+        tracemalloc.start()
+
+    def tearDown(self):
+        tracemalloc.stop()
+
+    def test_parser_memory_is_constant(self):
+        count = 0
+        with open(filename, "r", encoding="utf-8") as f:
+            for key, value in iter_items(f):
+                count += 1
+        peak = tracemalloc.get_traced_memory()[1]
+
+        self.assertGreater(count, 0)
+        # A few chunks and a record, however big the file is
+        self.assertLess(peak, 1_000_000)
+
+    def test_lazy_reload_peak(self):
+        start = tracemalloc.get_traced_memory()[0]
+        storage = FileStorage(filename, lazy=True)
+        current, peak = tracemalloc.get_traced_memory()
+
+        graph = current - start
+        self.assertGreater(storage.count('User'), 0)
+        self.assertLess(peak - start, graph * 1.05 + 2_000_000)
+
+    @unittest.skipIf(size_mb > 16, "building every object takes too long")
+    def test_reload_peak(self):
+        start = tracemalloc.get_traced_memory()[0]
+        storage = FileStorage(filename)
+        current, peak = tracemalloc.get_traced_memory()
+
+        # Peak memory is about the size of the objects built, without
+        # the text of the file or a dict of every record on top of them
+        graph = current - start
+        self.assertGreater(storage.count('User'), 0)
+        self.assertLess(peak - start, graph * 1.05 + 2_000_000)
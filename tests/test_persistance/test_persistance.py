@@ -3,6 +3,7 @@
     This module tests the Persistance Abstract class.
 """
 
+from contextlib import contextmanager
 from persistance.persistance import Persistance
 import unittest
 
@@ -27,6 +28,10 @@ class TestPersistance(unittest.TestCase):
             def reload(self):
                 pass
 
+            @contextmanager
+            def transaction(self):
+                yield self
+
             def get(self, classname, id):
                 return self.__objects.get(f"{str(classname)}_{id}")
 
@@ -43,3 +48,11 @@ class TestPersistance(unittest.TestCase):
     def test_cant_instantiate_base(self):
         with self.assertRaises(TypeError):
             Persistance()
+
+    def test_transaction_required(self):
+        # Storages must implement transactions, never just run the block
+        class NoTransactions(type(self.test)):
+            transaction = Persistance.transaction
+
+        with self.assertRaises(TypeError):
+            NoTransactions()
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""
+    Tests for the Query class
+"""
+
+from persistance.query import Query
+from model.place import Place
+from model.user import User
+import unittest
+
+
+class TestQuery(unittest.TestCase):
+    """ Tests for Query """
+
+    def setUp(self):
+        self.places = [Place(f'Inn {i}', 'Street 1', f'host_{i % 3}',
+                             50 + 10 * i, i % 4, 1, f'city_{i % 2}',
+                             'country_id', i % 5) for i in range(10)]
+
+    def test_predicates(self):
+        query = Query(Place, where={
+            'city': 'city_0',
+            'price_per_night': {'>=': 60, '<': 120},
+            'host': {'in': ['host_0', 'host_1']}
+        })
+        self.assertEqual(query.predicates, [
+            ('city', '==', 'city_0'),
+            ('price_per_night', '>=', 60),
+            ('price_per_night', '<', 120),
+            ('host', 'in', ('host_0', 'host_1'))
+        ])
+        self.assertEqual(
+            [place.name for place in query.select(self.places)],
+            ['Inn 4', 'Inn 6'])
+
+    def test_normalized(self):
+        query = Query(User, where={'email': 'John@Mail.com'})
+        self.assertTrue(query.matches(
+            User('john@mail.com', '123456', 'John', 'Doe')))
+
+    def test_order_and_limit(self):
+        query = Query(Place, order_by='-price_per_night', limit=3)
+        self.assertEqual(
+            [place.price_per_night for place in query.select(self.places)],
+            [140, 130, 120])
+
+        query = Query(Place, order_by=['city', '-max_guests'], limit=4)
+        self.assertEqual(
+            [(place.city, place.max_guests)
+             for place in query.select(self.places)],
+            [('city_0', 4), ('city_0', 3), ('city_0', 2), ('city_0', 1)])
+
+        query = Query(Place, where={'city': 'city_1'}, limit=2)
+        self.assertEqual(
+            [place.name for place in query.select(self.places)],
+            ['Inn 1', 'Inn 3'])
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            Query(Place, where={'unknown': 1})
+        with self.assertRaises(ValueError):
+            Query(Place, where={'max_guests': {'~': 1}})
+        with self.assertRaises(TypeError):
+            Query(Place, where={'host': {'in': 'host_0'}})
+        with self.assertRaises(ValueError):
+            Query(Place, order_by='unknown')
+        with self.assertRaises(ValueError):
+            Query(Place, limit=-1)
+        with self.assertRaises(TypeError):
+            Query(Place, where=[('max_guests', 1)])
+
+    def test_plan(self):
+        query = Query(Place, where={'city': 'city_0', 'max_guests': 2},
+                      order_by='name', limit=5)
+        plan = query.plan('hash index', 5, query.predicates[:1])
+        self.assertEqual(plan, {
+            'class': 'Place',
+            'access': 'hash index',
+            'index': [('city', '==', 'city_0')],
+            'rows': 5,
+            'filters': [('max_guests', '==', 2)],
+            'order_by': ['name'],
+            'limit': 5
+        })
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""
+    Tests for the RWLock class
+"""
+
+from persistance.rwlock import RWLock
+import unittest
+import threading
+
+
+class TestRWLock(unittest.TestCase):
+    """ Tests for RWLock """
+
+    def setUp(self):
+        self.lock = RWLock()
+
+    def test_concurrent_readers(self):
+        readers = 4
+        barrier = threading.Barrier(readers, timeout=5)
+        broken = []
+
+        def reader():
+            with self.lock.read():
+                # Only passes if every reader holds the lock at once
+                try:
+                    barrier.wait()
+                except threading.BrokenBarrierError:
+                    broken.append(True)
+
+        threads = [threading.Thread(target=reader) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(broken, [])
+
+    def test_writer_excludes_readers(self):
+        events = []
+        writing = threading.Event()
+
+        def reader():
+            writing.wait()
+            with self.lock.read():
+                events.append('read')
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        with self.lock.write():
+            writing.set()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            events.append('write')
+        thread.join()
+        self.assertEqual(events, ['write', 'read'])
+
+    def test_waiting_writer_blocks_new_readers(self):
+        events = []
+        self.lock.acquire_read()
+
+        def writer():
+            with self.lock.write():
+                events.append('write')
+
+        def reader():
+            with self.lock.read():
+                events.append('read')
+
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.start()
+        while not self.lock._RWLock__waiting_writers:
+            pass
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+        reader_thread.join(0.1)
+        self.assertEqual(events, [])
+
+        self.lock.release_read()
+        writer_thread.join()
+        reader_thread.join()
+        self.assertEqual(events, ['write', 'read'])
+
+    def test_reentrant(self):
+        with self.lock.write():
+            with self.lock.write():
+                with self.lock.read():
+                    pass
+        with self.lock.read():
+            with self.lock.read():
+                # Can't upgrade
+                with self.assertRaises(RuntimeError):
+                    self.lock.acquire_write()
+
+        # Released: another thread can write
+        done = []
+
+        def writer():
+            with self.lock.write():
+                done.append(True)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        thread.join(1)
+        self.assertEqual(done, [True])
+
+    def test_release_unacquired(self):
+        with self.assertRaises(RuntimeError):
+            self.lock.release_read()
+        with self.assertRaises(RuntimeError):
+            self.lock.release_write()
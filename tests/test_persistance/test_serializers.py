@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+"""
+    Tests for the FileStorage serializers
+"""
+
+from persistance.serializers import JSONSerializer, BinarySerializer, \
+    convert, serializer_for
+from persistance.file_storage import FileStorage
+from model.user import User
+from model.place import Place
+from model.country import Country
+from model.review import Review
+import unittest
+import json
+import os
+
+json_file = "test_storage.json"
+binary_file = "test_storage.bin"
+
+
+def sample_objects():
+    """ Objects of every kind of field """
+    usr = User("john@mail.com", "123456", "John", "Doe")
+    country = Country('Uruguay', 'UY', [])
+    place = Place('Inn', 'Street 1', usr.id, 100, 2, 1, 'city_id',
+                  country.id, 4, amenities=[usr.id, 'not-a-uuid'],
+                  description='Lovely ✓ place', latitude=-34.9,
+                  longitude=-56.16)
+    review = Review(usr.id, place.id, 9, 'Great')
+    return [usr, country, place, review]
+
+
+class TestSerializers(unittest.TestCase):
+    """ Tests for JSONSerializer and BinarySerializer """
+
+    def tearDown(self):
+        for name in (json_file, binary_file):
+            if os.access(name, os.F_OK):
+                os.remove(name)
+
+    def roundtrip(self, serializer, records):
+        parts = [serializer.encode(key, record)
+                 for key, record in records.items()]
+        mode = 'wb' if serializer.binary else 'w'
+        with open(binary_file, mode) as f:
+            f.write(serializer.document(parts))
+        with open(binary_file, 'rb' if serializer.binary else 'r') as f:
+            return dict(serializer.load(f))
+
+    def test_roundtrip(self):
+        records = {obj.key: obj.to_dict() for obj in sample_objects()}
+        for serializer in (JSONSerializer(), BinarySerializer()):
+            self.assertEqual(self.roundtrip(serializer, records), records)
+            self.assertEqual(self.roundtrip(serializer, {}), {})
+
+    def test_json_format(self):
+        records = {obj.key: obj.to_dict() for obj in sample_objects()}
+        serializer = JSONSerializer()
+        document = serializer.document([
+            serializer.encode(key, record) for key, record in records.items()
+        ])
+        self.assertEqual(document, json.dumps(records, indent=2))
+
+    def test_binary_values(self):
+        serializer = BinarySerializer()
+        values = (
+            None, True, False, 0, -1, 2 ** 63 - 1, 1 << 70, 1.5, '', 'text',
+            '5f1a3a50-8e53-4d3a-9a4b-0c0d1e2f3a4b',
+            '5F1A3A50-8E53-4D3A-9A4B-0C0D1E2F3A4B',
+            '2024-02-29 13:45:01.000123', '2024-02-29 13:45:01',
+            '2024-02-29T13:45:01', '1969-07-20 20:17:00',
+            ['a', 1, ['b']], {'a': 1}
+        )
+        for value in values:
+            encoded = serializer.encode_value(value)
+            self.assertEqual(serializer.decode_value(encoded, 0),
+                             (value, len(encoded)))
+
+        # UUIDs take 16 bytes and datetimes 8, plus the type tag
+        usr = User("john@mail.com", "123456", "John", "Doe")
+        self.assertEqual(len(serializer.encode_value(usr.id)), 17)
+        self.assertEqual(
+            len(serializer.encode_value(str(usr.created_at))), 9)
+
+    def test_binary_is_smaller(self):
+        objects = [obj for i in range(50) for obj in sample_objects()]
+        records = {obj.key: obj.to_dict() for obj in objects}
+        sizes = {}
+        for serializer in (JSONSerializer(), BinarySerializer()):
+            document = serializer.document([
+                serializer.encode(key, record)
+                for key, record in records.items()
+            ])
+            sizes[serializer.binary] = len(document)
+        self.assertLess(sizes[True], sizes[False] / 2)
+
+    def test_binary_errors(self):
+        serializer = BinarySerializer()
+        with self.assertRaises(ValueError):
+            list(serializer.loads(b'{"not": "binary"}'))
+        record = User("john@mail.com", "123456", "John", "Doe").to_dict()
+        with self.assertRaises(ValueError):
+            serializer.encode('User_wrong', record)
+
+    def test_file_storage(self):
+        objects = sample_objects()
+        for shards in (None, 2):
+            storage = FileStorage(binary_file, shards=shards,
+                                  serializer=BinarySerializer())
+            for obj in objects:
+                storage.add(obj)
+            storage.save()
+            objects[0].first_name = 'Johnny'
+            storage.save()
+
+            reloaded = FileStorage(binary_file, shards=shards,
+                                   serializer=BinarySerializer())
+            self.assertEqual(reloaded.all(),
+                             {obj.key: obj for obj in objects})
+            for name in storage.snapshot_filenames():
+                if os.access(name, os.F_OK):
+                    os.remove(name)
+
+    def test_convert(self):
+        objects = sample_objects()
+        storage = FileStorage(json_file)
+        for obj in objects:
+            storage.add(obj)
+        storage.save()
+
+        self.assertIsInstance(serializer_for(json_file), JSONSerializer)
+        self.assertIsInstance(serializer_for(binary_file), BinarySerializer)
+
+        self.assertEqual(convert(json_file, binary_file), len(objects))
+        reloaded = FileStorage(binary_file, serializer=BinarySerializer())
+        self.assertEqual(reloaded.all(), storage.all())
+
+        with open(json_file, 'r', encoding='utf-8') as f:
+            original = f.read()
+        os.remove(json_file)
+        convert(binary_file, json_file)
+        with open(json_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.loads(f.read()), json.loads(original))
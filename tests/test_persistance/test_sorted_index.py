@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""
+    Tests for the SortedIndex class
+"""
+
+from persistance.sorted_index import SortedIndex
+import unittest
+
+
+class TestSortedIndex(unittest.TestCase):
+    """ Tests for SortedIndex """
+
+    def setUp(self):
+        self.index = SortedIndex(
+            (value, f'key_{i}') for i, value in enumerate([5, 3, 5, 1, 8]))
+
+    def test_keys(self):
+        self.assertEqual(self.index.keys(), ['key_3', 'key_1', 'key_0',
+                                             'key_2', 'key_4'])
+        self.assertEqual(self.index.keys(3, 5), ['key_1', 'key_0', 'key_2'])
+        self.assertEqual(self.index.keys(3, 5, low_inclusive=False),
+                         ['key_0', 'key_2'])
+        self.assertEqual(self.index.keys(high=5, high_inclusive=False),
+                         ['key_3', 'key_1'])
+        self.assertEqual(self.index.keys(low=6), ['key_4'])
+        self.assertEqual(self.index.keys(6, 7), [])
+        self.assertEqual(self.index.keys(5, 3), [])
+        self.assertEqual(self.index.count(5, 5), 2)
+        self.assertEqual(self.index.keys(3, limit=2), ['key_1', 'key_0'])
+
+    def test_add_remove(self):
+        self.index.add(5, 'key_5')
+        self.index.remove(5, 'key_0')
+        # Removing an entry that isn't there does nothing
+        self.index.remove(5, 'key_0')
+        self.index.remove(4, 'key_1')
+        self.assertEqual(self.index.keys(5, 5), ['key_2', 'key_5'])
+        self.assertEqual(len(self.index), 5)
+
+    def test_batches(self):
+        self.index.batch = 2
+        self.index.add_many([(4, 'key_6'), (9, 'key_5'), (0, 'key_7')])
+        self.assertEqual(self.index.keys(3, 5),
+                         ['key_1', 'key_6', 'key_0', 'key_2'])
+        self.index.remove_many([(4, 'key_6'), (5, 'key_0'), (5, 'key_9')])
+        self.assertEqual(self.index.keys(), ['key_7', 'key_3', 'key_1',
+                                             'key_2', 'key_4', 'key_5'])
+        # Small batches are inserted one by one
+        self.index.add_many([(2, 'key_8')])
+        self.index.remove_many([(9, 'key_5')])
+        self.assertEqual(self.index.keys(2, 9), ['key_8', 'key_1', 'key_2',
+                                                 'key_4'])
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""
+    Tests for the TextIndex class
+"""
+
+from persistance.text_index import TextIndex, tokenize
+import unittest
+
+
+class TestTextIndex(unittest.TestCase):
+    """ Tests for TextIndex """
+
+    def setUp(self):
+        self.index = TextIndex()
+        texts = [
+            'Cozy loft near the beach',
+            'Beach house, beach views and a pool',
+            'Downtown loft',
+            'Quiet cabin in the woods',
+        ]
+        for i, text in enumerate(texts):
+            self.index.add(f'key_{i}', text)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Café au lait, CAFE!'),
+                         ['cafe', 'au', 'lait', 'cafe'])
+        self.assertEqual(tokenize(None), [])
+
+    def test_and(self):
+        self.assertEqual([key for score, key in
+                          self.index.search('loft beach')], ['key_0'])
+        self.assertEqual(self.index.search('loft castle'), [])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_or(self):
+        found = [key for score, key in
+                 self.index.search('beach loft', mode='or')]
+        # key_0 holds both terms, then the shorter document first
+        self.assertEqual(found, ['key_0', 'key_2', 'key_1'])
+        self.assertEqual(len(self.index.search('beach loft', 'or', 1)), 1)
+
+    def test_ranking(self):
+        scores = dict((key, score) for score, key in
+                      self.index.search('beach', limit=None))
+        # Repeated terms weigh more
+        self.assertGreater(scores['key_1'], scores['key_0'])
+        # Rare terms weigh more than frequent ones
+        cabin = self.index.search('cabin')[0][0]
+        self.assertGreater(cabin, scores['key_0'])
+
+    def test_add_remove(self):
+        self.index.add('key_2', 'Downtown studio')
+        self.assertEqual([key for score, key in self.index.search('loft')],
+                         ['key_0'])
+        self.index.remove('key_0')
+        self.index.remove('key_0')
+        self.assertEqual(self.index.search('loft'), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.index.search('beach', mode='xor')
+        with self.assertRaises(ValueError):
+            self.index.search('beach', limit=-1)
@@ -33,21 +33,25 @@ class TestAmenityService(unittest.TestCase):
         srvc = AmenityService
         wifi = Amenity(**{'name': 'WiFi'})
 
-        mock_all_return = {wifi.key: wifi}
+        def mock_get_by(classname, field, value):
+            return wifi if value == wifi.name else None
 
         # Mock the storage object so this test doesn't depend
         # on the success of another class
-        with patch.object(storage, "all", return_value=mock_all_return) \
+        with patch.object(storage, "get_by", side_effect=mock_get_by) \
                 as mock:
             # Test that no exception is raised with new name
             srvc.validate_name_is_unique('Garage')
 
-            # Ensure the get method was called once
-            mock.assert_called_once()
+            # Ensure the index was looked up once
+            mock.assert_called_once_with('Amenity', 'name', 'Garage')
 
             with self.assertRaises(ValueError):
                 srvc.validate_name_is_unique('WiFi')
 
+            # Unless it's the amenity's own name
+            srvc.validate_name_is_unique('WiFi', wifi.id)
+
     def test_create(self):
         am1 = {'name': 'WiFi'}
 
@@ -12,6 +12,7 @@ from model import storage
 from persistance.file_storage import FileStorage
 from datetime import datetime
 import os
+import threading
 
 
 original_filename = storage._FileStorage__filename
@@ -91,6 +92,60 @@ class TestCityService(unittest.TestCase):
         self.assertEqual(len(storage.all('City')), 2)
         self.assertIn(city2.key, storage.all('City'))
 
+    def test_create_single_save(self):
+        if type(storage) is not FileStorage:
+            return
+
+        # The city and the updated country are written at once
+        data = {'name': 'Montevideo', 'country': self.uruguay.id}
+        with patch('persistance.files.os.replace',
+                   wraps=os.replace) as mock:
+            city = CityService.create(**data)
+        self.assertEqual(mock.call_count, 1)
+
+        storage.reload()
+        self.assertEqual(storage.get(self.uruguay.key).cities, [city.id])
+
+    def test_create_many(self):
+        argentina = CountryService.create(**{'name': 'Argentina', 'iso': 'AR'})
+        data = [{'name': 'Montevideo', 'country': self.uruguay.id},
+                {'name': 'Rosario', 'country': argentina.id},
+                {'name': 'Colonia', 'country': self.uruguay.id}]
+        cities = CityService.create_many(data)
+
+        self.assertEqual(CountryService.get(self.uruguay.id).cities,
+                         [cities[0].id, cities[2].id])
+        self.assertEqual(CountryService.get(argentina.id).cities,
+                         [cities[1].id])
+
+        with self.assertRaises(ValueError):
+            CityService.create_many([{'name': 'Lima', 'country': 'wrong'}])
+        self.assertEqual(CityService.count(), 3)
+
+    def test_create_threads(self):
+        # Concurrent creates all update the same country: none is lost
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(10):
+                    CityService.create(**{'name': f'City {n} {i}',
+                                          'country': self.uruguay.id})
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=worker, args=(n, ))
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(CountryService.get(self.uruguay.id).cities), 80)
+        storage.reload()
+        self.assertEqual(len(storage.get(self.uruguay.key).cities), 80)
+
     def test_update(self):
         srvc = CityService
 
@@ -156,3 +211,16 @@ class TestCityService(unittest.TestCase):
         self.assertEqual(len(all), 2)
         self.assertEqual(all.get(city.key), city)
         self.assertEqual(all.get(city2.key), city2)
+
+    def test_by_country(self):
+        montevideo = CityService.create(
+            **{'name': 'Montevideo', 'country': self.uruguay.id})
+        argentina = CountryService.create(**{'name': 'Argentina', 'iso': 'AR'})
+        rosario = CityService.create(
+            **{'name': 'Rosario', 'country': argentina.id})
+
+        self.assertEqual(CityService.by_country(self.uruguay.id),
+                         {montevideo.key: montevideo})
+        CityService.update(rosario.id, **{'country': self.uruguay.id})
+        self.assertEqual(len(CityService.by_country(self.uruguay.id)), 2)
+        self.assertEqual(CityService.by_country(argentina.id), {})
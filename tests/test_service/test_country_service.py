@@ -97,6 +97,27 @@ class TestCountryService(unittest.TestCase):
         # Note: in storage, datetime objects are saved as str for serialization
         self.assertEqual(storage_uru.updated_at, updated.updated_at)
 
+    def test_unique_iso(self):
+        srvc = CountryService
+        uru = srvc.create(**{'name': 'Uruguay', 'iso': 'UY'})
+        arg = srvc.create(**{'name': 'Argentina', 'iso': 'AR'})
+
+        # ISO codes are unique regardless of case
+        with self.assertRaises(ValueError):
+            srvc.create(**{'name': 'Uruguay', 'iso': 'uy'})
+        with self.assertRaises(ValueError):
+            srvc.update(arg.id, **{'iso': 'UY'})
+        with self.assertRaises(ValueError):
+            srvc.create_many([{'name': 'Chile', 'iso': 'CL'},
+                              {'name': 'Chile', 'iso': 'cl'}])
+        self.assertEqual(srvc.count(), 2)
+
+        # A country can keep its own code
+        srvc.update(uru.id, **{'name': 'Uruguay', 'iso': 'UY'})
+        self.assertEqual(srvc.get_by_iso('uy'), uru)
+        self.assertEqual(srvc.get_by_iso('AR'), arg)
+        self.assertIsNone(srvc.get_by_iso('CL'))
+
     def test_delete(self):
         srvc = CountryService
         data = {'name': 'Uruguay', 'iso': 'UR'}
@@ -6,10 +6,12 @@
 import unittest
 import os
 from datetime import datetime
+from unittest.mock import patch
 from model import storage
 from persistance.file_storage import FileStorage
 from model.place import Place
 from service.place_service import PlaceService
+from persistance.columns import np
 from service.amenity_service import AmenityService
 from service.city_service import CityService
 from service.country_service import CountryService
@@ -251,6 +253,182 @@ class TestPlaceService(unittest.TestCase):
         self.assertEqual(len(storage.all('Place')), 1)
         self.assertEqual(storage.get(place.key), place)
 
+    def test_create_many(self):
+        data = [{
+            'name': f'Travellers Inn {i}',
+            'description': 'Lovely atmosphere',
+            'address': '18 de Julio 2233',
+            'host': self.user.id,
+            'latitude': 37.2456,
+            'longitude': 33.4455,
+            'city': self.city.id,
+            'country': self.country.id,
+            'price_per_night': 130,
+            'max_guests': 6,
+            'number_rooms': 3,
+            'number_bathrooms': 2,
+            'amenities': [self.wifi.id]
+        } for i in range(20)]
+
+        # References are checked with one lookup per class, and the
+        # whole batch is written at once
+        with patch.object(storage, 'get_many',
+                          wraps=storage.get_many) as lookups, \
+                patch('persistance.files.os.replace',
+                      wraps=os.replace) as writes:
+            places = PlaceService.create_many(data)
+        self.assertEqual(lookups.call_count, 4)
+        if type(storage) is FileStorage:
+            self.assertEqual(writes.call_count, 1)
+
+        self.assertEqual(len(places), 20)
+        self.assertTrue(all(place.reviews == [] for place in places))
+        storage.reload()
+        self.assertEqual(len(storage.all('Place')), 20)
+
+        # A wrong reference fails the whole batch
+        data[5]['city'] = 'wrong'
+        with self.assertRaises(ValueError):
+            PlaceService.create_many(data)
+        data[5]['city'] = self.city.id
+        data[7]['amenities'] = ['wrong']
+        with self.assertRaises(ValueError):
+            PlaceService.create_many(data)
+        self.assertEqual(PlaceService.count(), 20)
+
+    def test_update_many(self):
+        data = [{
+            'name': f'Travellers Inn {i}',
+            'description': 'Lovely atmosphere',
+            'address': '18 de Julio 2233',
+            'host': self.user.id,
+            'latitude': 37.2456,
+            'longitude': 33.4455,
+            'city': self.city.id,
+            'country': self.country.id,
+            'price_per_night': 130,
+            'max_guests': 6,
+            'number_rooms': 3,
+            'number_bathrooms': 2,
+            'amenities': []
+        } for i in range(3)]
+        places = PlaceService.create_many(data)
+
+        updated = PlaceService.update_many({
+            place.id: {'price_per_night': 100 + i}
+            for i, place in enumerate(places)
+        })
+        self.assertEqual([place.price_per_night for place in updated],
+                         [100, 101, 102])
+
+        # Nothing is updated if one of the updates is wrong
+        with self.assertRaises(ValueError):
+            PlaceService.update_many({
+                places[0].id: {'price_per_night': 90},
+                places[1].id: {'host': 'wrong'}
+            })
+        with self.assertRaises(KeyError):
+            PlaceService.update_many({'wrong': {'price_per_night': 90}})
+        self.assertEqual(places[0].price_per_night, 100)
+
+        PlaceService.delete_many([place.id for place in places[:2]])
+        self.assertEqual(list(PlaceService.all()), [places[2].key])
+
+    def test_by_reference(self):
+        data = [{
+            'name': f'Travellers Inn {i}',
+            'description': 'Lovely atmosphere',
+            'address': '18 de Julio 2233',
+            'host': self.user.id,
+            'latitude': 37.2456,
+            'longitude': 33.4455,
+            'city': self.city.id,
+            'country': self.country.id,
+            'price_per_night': 130,
+            'max_guests': 6,
+            'number_rooms': 3,
+            'number_bathrooms': 2,
+            'amenities': []
+        } for i in range(3)]
+        places = PlaceService.create_many(data)
+        colonia = CityService.create(**{
+            'name': 'Colonia',
+            'country': self.country.id
+        })
+
+        # Answered from the storage's indexes, without a scan
+        with patch.object(storage, 'all') as scan:
+            self.assertEqual(PlaceService.by_host(self.user.id),
+                             {place.key: place for place in places})
+            PlaceService.update(places[0].id, **{'city': colonia.id})
+            self.assertEqual(PlaceService.by_city(colonia.id),
+                             {places[0].key: places[0]})
+            self.assertEqual(len(PlaceService.by_city(self.city.id)), 2)
+            self.assertEqual(len(PlaceService.by_country(self.country.id)),
+                             3)
+        if type(storage) is FileStorage:
+            scan.assert_not_called()
+
+        PlaceService.delete(places[1].id)
+        self.assertEqual(list(PlaceService.by_city(self.city.id)),
+                         [places[2].key])
+
+    def test_near(self):
+        data = [{
+            'name': f'Travellers Inn {i}',
+            'description': 'Lovely atmosphere',
+            'address': '18 de Julio 2233',
+            'host': self.user.id,
+            'latitude': -34.9 + i / 100,
+            'longitude': -56.16,
+            'city': self.city.id,
+            'country': self.country.id,
+            'price_per_night': 130,
+            'max_guests': 6,
+            'number_rooms': 3,
+            'number_bathrooms': 2,
+            'amenities': []
+        } for i in range(5)]
+        places = PlaceService.create_many(data)
+
+        found = PlaceService.near(-34.9, -56.16, 2.5)
+        self.assertEqual([place for place, km in found], places[:3])
+        self.assertAlmostEqual(found[1][1], 1.11, places=2)
+
+        PlaceService.update(places[4].id, **{'latitude': -34.905})
+        self.assertEqual(PlaceService.nearest(-34.91, -56.16, 1)[0][0],
+                         places[4])
+        self.assertEqual(sorted(PlaceService.within(-34.91, -56.2, -34.88,
+                                                    -56.1)),
+                         sorted([places[0].key, places[1].key,
+                                 places[4].key]))
+
+    @unittest.skipUnless(np, 'numpy is not installed')
+    def test_columns(self):
+        data = [{
+            'name': f'Travellers Inn {i}',
+            'description': 'Lovely atmosphere',
+            'address': '18 de Julio 2233',
+            'host': self.user.id,
+            'latitude': -34.9,
+            'longitude': -56.16,
+            'city': self.city.id,
+            'country': self.country.id,
+            'price_per_night': 100 + 10 * i,
+            'max_guests': 6,
+            'number_rooms': 3,
+            'number_bathrooms': 2,
+            'amenities': []
+        } for i in range(4)]
+        places = PlaceService.create_many(data)
+
+        columns = PlaceService.columns()
+        self.assertIs(PlaceService.columns(), columns)
+        self.assertEqual(columns.group_by('city', 'price_per_night', 'mean'),
+                         {self.city.id: 115.0})
+        PlaceService.update(places[0].id, **{'price_per_night': 500})
+        self.assertEqual(columns.stats('price_per_night')['max'], 500)
+
     def test_update(self):
         data = {
             'name': 'Travellers Inn',
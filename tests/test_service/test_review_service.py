@@ -144,6 +144,26 @@ class TestReviewService(unittest.TestCase):
         # Test that place.reviews is correctly updated
         self.assertEqual(PlaceService.get(self.place.id).reviews, [review.id])
 
+    def test_create_rollback(self):
+        data = {
+            'place': self.place.id,
+            'user': self.user.id,
+            'rating': 7,
+            'comment': "Amazing place"
+        }
+
+        # The place can't be updated: the review isn't created either
+        with patch.object(PlaceService, 'update',
+                          side_effect=ValueError('failed')):
+            with self.assertRaises(ValueError):
+                ReviewService.create(**data)
+
+        self.assertEqual(ReviewService.all(), {})
+        self.assertEqual(PlaceService.get(self.place.id).reviews, [])
+
+        storage.reload()
+        self.assertEqual(len(storage.all('Review')), 0)
+
     def test_update(self):
         with self.assertRaises(KeyError):
             ReviewService.update('inexistent_id', **{'rating': 2})
@@ -246,3 +266,99 @@ class TestReviewService(unittest.TestCase):
         all = ReviewService.all()
         self.assertEqual(len(all), 1)
         self.assertEqual(all.get(review.key), review)
+
+    def test_by_user_and_place(self):
+        gordon = UserService.create(**{
+            'email': 'gramsey@gmail.com',
+            'password': 'xdxdxd',
+            'first_name': 'Gordon',
+            'last_name': 'Ramsey'
+        })
+
+        reviews = [ReviewService.create(**{
+            'place': self.place.id,
+            'user': user.id,
+            'rating': 7,
+            'comment': 'Nice'
+        }) for user in (self.user, gordon)]
+
+        self.assertEqual(ReviewService.by_place(self.place.id),
+                         {review.key: review for review in reviews})
+        self.assertEqual(ReviewService.by_user(gordon.id),
+                         {reviews[1].key: reviews[1]})
+
+        ReviewService.delete(reviews[1].id)
+        self.assertEqual(ReviewService.by_user(gordon.id), {})
+        self.assertEqual(list(ReviewService.by_place(self.place.id)),
+                         [reviews[0].key])
+
+    def test_search(self):
+        comments = ['Amazing place, great views', 'Noisy place',
+                    'Great location and great host']
+        reviews = [ReviewService.create(**{
+            'place': self.place.id,
+            'user': self.user.id,
+            'rating': 7,
+            'comment': comment
+        }) for comment in comments]
+
+        found = ReviewService.search('great')
+        self.assertEqual([review for review, score in found],
+                         [reviews[2], reviews[0]])
+        ReviewService.update(reviews[1].id, **{'comment': 'Great but noisy'})
+        self.assertEqual(len(ReviewService.search('great', limit=5)), 3)
+        self.assertEqual(len(ReviewService.search('noisy views', 'or')), 2)
+
+    def test_ratings(self):
+        guest = UserService.create(**{
+            'email': 'guest@test.com', 'password': '123456',
+            'first_name': 'Jane', 'last_name': 'Doe'})
+        reviews = [ReviewService.create(**{
+            'place': self.place.id, 'user': guest.id,
+            'rating': rating, 'comment': 'Nice'}) for rating in (8, 10)]
+        reviews += ReviewService.create_many([{
+            'place': self.place.id, 'user': guest.id,
+            'rating': rating, 'comment': 'Ok'} for rating in (6, 8)])
+
+        def rating(service, id):
+            found = service(id)
+            return found['count'], found['sum'], found['mean']
+
+        self.assertEqual(rating(PlaceService.rating, self.place.id),
+                         (4, 32, 8))
+        self.assertEqual(rating(UserService.host_rating, self.user.id),
+                         (4, 32, 8))
+        self.assertEqual(PlaceService.rating(self.place.id)['histogram'],
+                         [0] * 6 + [1, 0, 2, 0, 1])
+        self.assertEqual(UserService.host_rating(guest.id)['mean'], None)
+
+        ReviewService.update(reviews[2].id, **{'rating': 10})
+        self.assertEqual(rating(PlaceService.rating, self.place.id),
+                         (4, 36, 9))
+        ReviewService.delete(reviews[0].id)
+        ReviewService.delete_many([reviews[1].id])
+        self.assertEqual(rating(PlaceService.rating, self.place.id),
+                         (2, 18, 9))
+        self.assertEqual(PlaceService.get(self.place.id).reviews,
+                         [review.id for review in reviews[2:]])
+
+        # The ratings of a place follow it to its new host
+        PlaceService.update(self.place.id, **{'host': guest.id,
+                                              'ratings': [1] * 11})
+        self.assertEqual(rating(UserService.host_rating, self.user.id),
+                         (0, 0, None))
+        self.assertEqual(rating(UserService.host_rating, guest.id),
+                         (2, 18, 9))
+
+        # Aggregates can be rebuilt from the reviews
+        place = PlaceService.get(self.place.id)
+        place.ratings = None
+        ReviewService.rebuild_ratings()
+        self.assertEqual(rating(PlaceService.rating, self.place.id),
+                         (2, 18, 9))
+        self.assertEqual(rating(UserService.host_rating, guest.id),
+                         (2, 18, 9))
+
+        PlaceService.delete(self.place.id)
+        self.assertEqual(rating(UserService.host_rating, guest.id),
+                         (0, 0, None))
@@ -12,6 +12,7 @@ from persistance.file_storage import FileStorage
 from datetime import datetime
 from hashlib import pbkdf2_hmac
 import os
+import threading
 
 
 original_filename = storage._FileStorage__filename
@@ -34,18 +35,21 @@ class TestUserService(unittest.TestCase):
         srvc = UserService
 
         usr1 = User("sfreud@gamil.com", "mom", "Sigmund", "Freud")
-        mock_all_return = {usr1.key: usr1}
+
+        def mock_get_by(classname, field, value):
+            return usr1 if value == usr1.email else None
 
         # Mock the storage object so this test doesn't depend
         # on the success of another class
-        with patch.object(storage, "all", return_value=mock_all_return) \
+        with patch.object(storage, "get_by", side_effect=mock_get_by) \
                 as mock:
 
             # Test no exception is raised => mail is valid
             srvc.validate_mail_is_unique("johnstrand@yahoo.com")
 
-            # Ensure the get method was called once
-            mock.assert_called_once()
+            # Ensure the index was looked up once
+            mock.assert_called_once_with(
+                'User', 'email', "johnstrand@yahoo.com")
 
             # Test ValueError raised when mail is not unique
             with self.assertRaises(ValueError):
@@ -104,6 +108,50 @@ class TestUserService(unittest.TestCase):
         with self.assertRaises(ValueError):
             srvc.create(**u3)
 
+        # Emails are unique regardless of case
+        u3['email'] = 'MZuckerberg@fb.com'
+        with self.assertRaises(ValueError):
+            srvc.create(**u3)
+        self.assertEqual(srvc.get_by_email('mzuckerberg@FB.com'), mark)
+
+    def test_create_many(self):
+        data = [{'email': f'user{i}@mail.com', 'password': 'pass',
+                 'first_name': 'John', 'last_name': 'Doe'} for i in range(5)]
+        users = UserService.create_many(data)
+
+        self.assertEqual(len(UserService.all()), 5)
+        for usr in users:
+            self.assertEqual(usr.password,
+                             UserService.pswd_hash(usr.id, 'pass'))
+
+        # Emails must be unique within the batch and with stored users
+        with self.assertRaises(ValueError):
+            UserService.create_many([{'email': 'user0@mail.com',
+                                      'password': 'pass', 'first_name': 'J',
+                                      'last_name': 'D'}])
+        with self.assertRaises(ValueError):
+            UserService.create_many([data[0], data[0]])
+        self.assertEqual(len(UserService.all()), 5)
+
+    def test_create_many_builds_unlocked(self):
+        # Other threads can use storage while the passwords are hashed
+        reads = []
+
+        def pswd_hash(user_id, pswd):
+            thread = threading.Thread(
+                target=lambda: reads.append(storage.get('User_id')))
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            return pswd
+
+        with patch.object(UserService, 'pswd_hash', pswd_hash):
+            UserService.create_many([
+                {'email': f'user{i}@mail.com', 'password': 'pass',
+                 'first_name': 'John', 'last_name': 'Doe'} for i in range(2)])
+        self.assertEqual(reads, [None, None])
+        self.assertEqual(len(UserService.all()), 2)
+
     def test_update(self):
         srvc = UserService()
         u1 = {'email': 'bill@microsoft.com', 'password': 'Windows',
@@ -174,3 +222,16 @@ class TestUserService(unittest.TestCase):
         self.assertEqual(len(all), 2)
         self.assertEqual(all.get(bill.key), bill)
         self.assertEqual(all.get(mark.key), mark)
+
+    def test_pages(self):
+        users = [UserService.create(**{
+            'email': f'user{i}@mail.com', 'password': '123456',
+            'first_name': 'John', 'last_name': 'Doe'}) for i in range(5)]
+        keys = sorted(user.key for user in users)
+
+        page = UserService.all(limit=2)
+        self.assertEqual(list(page), keys[:2])
+        page = UserService.all(limit=2, after=list(page)[-1])
+        self.assertEqual(list(page), keys[2:4])
+        self.assertEqual([user.key for user in UserService.iter(batch=2)],
+                         keys)